@@ -1,47 +1,45 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from typing import Dict, Any
-from config import DEMO_MODE
+from typing import Dict, Any, List
+from utils.llm_client import create_llm
+from utils.llm_resilience import LLMUnavailableError
+from utils.prompt_builder import CompactPrompt
+from utils.text_extraction import InsuranceInfoExtractor
+from utils.lazy_import import lazy_import, lazy_component
+from utils.tracing import span
 
-# Import mock LLM for demo mode
-if DEMO_MODE:
-    from utils.mock_llm import MockChatOpenAI
-import re
+lc_messages = lazy_import("langchain_core.messages")
 
 class InsuranceAgent:
     """Agent responsible for collecting patient insurance information."""
     
-    def __init__(self, llm_model: str = "gpt-3.5-turbo"):
-        if DEMO_MODE:
-            self.llm = MockChatOpenAI(model=llm_model, temperature=0.1)
-        else:
-            self.llm = ChatOpenAI(model=llm_model, temperature=0.1)
-        self.required_fields = ["insurance_carrier", "member_id", "group_number"]
-        
-    def process(self, user_input: str, collected_insurance: Dict[str, Any]) -> Dict[str, Any]:
-        """Process user input to extract insurance information."""
-        
-        system_prompt = f"""
+    prompt = CompactPrompt(
+        agent_name="insurance",
+        instructions="""
         You are a medical receptionist AI collecting insurance information from a patient.
         You need to collect:
         - Insurance carrier/company name
         - Member ID number
         - Group number (if applicable)
         
-        Current collected information: {collected_insurance}
-        
         Be professional and explain why this information is needed.
         Ask for missing information politely and provide guidance on where to find it 
         (insurance card, employer benefits, etc.).
-        """
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_input)
+        """,
+        fields=[
+            ("insurance_carrier", "Insurance carrier"),
+            ("member_id", "Member ID"),
+            ("group_number", "Group number")
         ]
+    )
+    
+    llm = lazy_component(lambda self: create_llm(self.llm_model, temperature=0.1))
+    
+    def __init__(self, llm_model: str = "gpt-3.5-turbo"):
+        self.llm_model = llm_model
+        self.required_fields = ["insurance_carrier", "member_id", "group_number"]
+        self.extractor = InsuranceInfoExtractor()
         
-        response = self.llm(messages)
-        ai_message = response.content
+    def process(self, user_input: str, collected_insurance: Dict[str, Any]) -> Dict[str, Any]:
+        """Process user input to extract insurance information."""
         
         # Extract insurance information from user input
         extracted_insurance = self._extract_insurance_info(user_input, collected_insurance)
@@ -69,6 +67,19 @@ class InsuranceAgent:
                 "next_step": "confirmation"
             }
         
+        messages = [
+            lc_messages.SystemMessage(content=self.prompt.render(extracted_insurance)),
+            lc_messages.HumanMessage(content=user_input)
+        ]
+        
+        # Get LLM response, falling back to a template if the LLM is unavailable
+        try:
+            with span("llm.insurance", "llm"):
+                response = self.llm(messages)
+            ai_message = response.content
+        except LLMUnavailableError:
+            ai_message = self._fallback_message(missing_fields)
+        
         return {
             "message": ai_message,
             "extracted_insurance": extracted_insurance,
@@ -77,64 +88,21 @@ class InsuranceAgent:
             "next_step": "continue_insurance"
         }
     
-    def _extract_insurance_info(self, text: str, existing_data: Dict) -> Dict[str, Any]:
-        """Extract insurance information from text using regex patterns."""
-        data = existing_data.copy()
-        
-        # Common insurance carriers
-        carriers = [
-            "aetna", "anthem", "blue cross", "blue shield", "cigna", "humana", 
-            "kaiser", "united healthcare", "uhc", "medicare", "medicaid"
-        ]
-        
-        text_lower = text.lower()
-        
-        # Extract insurance carrier
-        if not data.get("insurance_carrier"):
-            for carrier in carriers:
-                if carrier in text_lower:
-                    data["insurance_carrier"] = carrier.title()
-                    break
-            
-            # Look for other carrier patterns
-            carrier_patterns = [
-                r"(?:insurance|carrier|company)\s+(?:is\s+)?([a-zA-Z\s&]+)",
-                r"i have\s+([a-zA-Z\s&]+)\s+insurance",
-            ]
-            
-            for pattern in carrier_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match and not data.get("insurance_carrier"):
-                    carrier = match.group(1).strip()
-                    if len(carrier) > 2:  # Avoid capturing single words
-                        data["insurance_carrier"] = carrier.title()
-                        break
-        
-        # Extract member ID (numbers, letters, or combination)
-        member_id_patterns = [
-            r"(?:member\s+id|member\s+number|id\s+number|policy\s+number)[:\s]+([a-zA-Z0-9]+)",
-            r"(?:id|number)[:\s]+([a-zA-Z0-9]{6,})",  # At least 6 characters
-        ]
-        
-        for pattern in member_id_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match and not data.get("member_id"):
-                data["member_id"] = match.group(1)
-                break
-        
-        # Extract group number
-        group_patterns = [
-            r"(?:group\s+number|group\s+id)[:\s]+([a-zA-Z0-9]+)",
-            r"group[:\s]+([a-zA-Z0-9]+)",
-        ]
-        
-        for pattern in group_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match and not data.get("group_number"):
-                data["group_number"] = match.group(1)
-                break
+    def _fallback_message(self, missing_fields: List[str]) -> str:
+        """Template response used when the LLM cannot answer in time."""
+        labels = {
+            "insurance_carrier": "your insurance carrier",
+            "member_id": "your member ID",
+            "group_number": "your group number"
+        }
+        missing_text = " and ".join(labels[field] for field in missing_fields)
         
-        return data
+        return f"To verify your coverage, please provide {missing_text}. " \
+               f"You can find these on the front of your insurance card."
+    
+    def _extract_insurance_info(self, text: str, existing_data: Dict) -> Dict[str, Any]:
+        """Extract insurance information from text with the shared payer matcher and patterns."""
+        return self.extractor.extract(text, existing_data)
     
     def validate_insurance_info(self, insurance_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate insurance information format."""
@@ -1,36 +1,25 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
 from typing import Dict, Any, List
-import pandas as pd
 from utils.database import Database
-from config import DEMO_MODE
-
-# Import mock LLM for demo mode
-if DEMO_MODE:
-    from utils.mock_llm import MockChatOpenAI
+from utils.llm_client import create_llm
+from utils.lazy_import import lazy_component
 
 class LookupAgent:
     """Agent responsible for looking up patients in the EMR system."""
     
+    llm = lazy_component(lambda self: create_llm(self.llm_model, temperature=0.1))
+    db = lazy_component(lambda self: Database())
+    
     def __init__(self, llm_model: str = "gpt-3.5-turbo"):
-        if DEMO_MODE:
-            self.llm = MockChatOpenAI(model=llm_model, temperature=0.1)
-        else:
-            self.llm = ChatOpenAI(model=llm_model, temperature=0.1)
-        self.db = Database()
+        self.llm_model = llm_model
         
     def process(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Look up patient in the database and determine if new or returning."""
         
-        # Search for existing patient
-        search_results = self.db.search_patient(
-            name=patient_data.get("name"),
-            dob=patient_data.get("date_of_birth")
-        )
+        # Search for existing patient, registering a new one in the same locked step
+        patient_record, created = self.db.find_or_create_patient(patient_data)
         
-        if search_results:
+        if not created:
             # Returning patient
-            patient_record = search_results[0]  # Take first match
             
             system_prompt = """
             You are a medical receptionist AI. A returning patient has been found in the system.
@@ -68,13 +57,10 @@ class LookupAgent:
                      f"appointment to allow time for a comprehensive evaluation. You'll also receive intake " \
                      f"forms to complete before your visit. Let's find you an available appointment time."
             
-            # Create new patient record
-            new_patient_id = self.db.create_patient_record(patient_data)
-            
             return {
                 "message": message,
                 "patient_type": "new",
-                "patient_id": new_patient_id,
+                "patient_id": patient_record["patient_id"],
                 "patient_record": patient_data,
                 "appointment_duration": 60,  # 60 minutes for new patients
                 "next_step": "scheduling"
@@ -1,4 +1,7 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+import copy
+from datetime import datetime, timedelta
+import config
 from agents.greeting_agent import GreetingAgent
 from agents.lookup_agent import LookupAgent
 from agents.scheduling_agent import SchedulingAgent
@@ -6,190 +9,272 @@ from agents.insurance_agent import InsuranceAgent
 from agents.reminder_agent import ReminderAgent
 from utils.excel_export import ExcelExporter
 from utils.email_service import EmailService
+from utils.intent_classifier import classify_intent, CANCEL, RESTART, SELECT, CONFIRM
+from utils.job_queue import JobQueue, get_job_queue
+from utils.outbox import get_outbox
+from utils.session_store import ConversationState
+from utils.lazy_import import lazy_component
+from utils.tracing import start_trace, span
+
+# Side effects of a confirmed booking, run by the job queue after the reply is sent
+EXCEL_EXPORT_JOB = "excel_export"
+REMINDERS_JOB = "schedule_reminders"
+CONFIRMATION_EMAIL_JOB = "confirmation_email"
+
+# Dispatcher events: the patient sent a message, or the conversation just entered an automatic step
+MESSAGE = "message"
+ENTERED = "entered"
+ANY_STEP = "*"
+
+# (step, event) -> (handler, step to move to once the handler reports its step complete).
+# Exact steps are matched first, then ANY_STEP.
+TRANSITIONS = {
+    ("greeting", MESSAGE): ("_handle_greeting", "lookup"),
+    ("lookup", MESSAGE): ("_handle_lookup", "scheduling"),
+    ("lookup", ENTERED): ("_handle_lookup", "scheduling"),
+    ("scheduling", MESSAGE): ("_handle_scheduling", "insurance_collection"),
+    ("insurance_collection", MESSAGE): ("_handle_insurance", "confirmation"),
+    ("confirmation", MESSAGE): ("_handle_confirmation", "greeting"),
+    ("confirmation", ENTERED): ("_handle_confirmation", "greeting"),
+    (ANY_STEP, CANCEL): ("_handle_reset", "greeting"),
+    (ANY_STEP, RESTART): ("_handle_reset", "greeting"),
+    (ANY_STEP, MESSAGE): ("_handle_unknown_step", "greeting"),
+}
+
+# Steps that run as soon as they are entered, in the same turn
+AUTOMATIC_STEPS = {"lookup", "confirmation"}
 
 class SchedulingOrchestrator:
     """Main orchestrator that manages the flow between different agents."""
     
-    def __init__(self):
-        self.greeting_agent = GreetingAgent()
-        self.lookup_agent = LookupAgent()
-        self.scheduling_agent = SchedulingAgent()
-        self.insurance_agent = InsuranceAgent()
-        self.reminder_agent = ReminderAgent()
-        self.excel_exporter = ExcelExporter()
-        self.email_service = EmailService()
-        
-        # Track conversation state
-        self.current_step = "greeting"
-        self.collected_data = {
-            "patient_info": {},
-            "insurance_info": {},
-            "appointment_info": {}
+    # Agents and services are built the first time a turn needs them
+    greeting_agent = lazy_component(lambda self: GreetingAgent())
+    lookup_agent = lazy_component(lambda self: LookupAgent())
+    scheduling_agent = lazy_component(lambda self: SchedulingAgent())
+    insurance_agent = lazy_component(lambda self: InsuranceAgent())
+    reminder_agent = lazy_component(lambda self: ReminderAgent())
+    excel_exporter = lazy_component(lambda self: ExcelExporter())
+    email_service = lazy_component(lambda self: EmailService())
+    # Confirmation emails go through the outbox (retries, dead letters) when it is enabled; built at the first booking
+    outbox = lazy_component(lambda self: get_outbox() if config.OUTBOX_ENABLED else None)
+    
+    def __init__(self, job_queue: Optional[JobQueue] = None):
+        # The shared, started queue unless one is passed in
+        if job_queue is None and config.JOB_QUEUE_ENABLED:
+            job_queue = get_job_queue()
+        self.job_queue = job_queue
+        if self.job_queue is not None:
+            self.job_queue.register(EXCEL_EXPORT_JOB, self._run_excel_export_job)
+            self.job_queue.register(REMINDERS_JOB, self._run_reminders_job)
+            self.job_queue.register(CONFIRMATION_EMAIL_JOB, self._run_confirmation_email_job)
+        
+        # Conversation state for callers that use process_message; process_turn is stateless
+        self.state = ConversationState()
+    
+    @property
+    def current_step(self) -> str:
+        return self.state.current_step
+    
+    @property
+    def collected_data(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "patient_info": self.state.patient_info,
+            "insurance_info": self.state.insurance_info,
+            "appointment_info": self.state.appointment_info
         }
     
-    def process_message(self, user_input: str, patient_data: Dict[str, Any], appointment_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process user message and route to appropriate agent."""
+    def process_message(self, user_input: str, patient_data: Dict[str, Any], appointment_data: Dict[str, Any],
+                        turn_id: str = None) -> Dict[str, Any]:
+        """Process user message and route to appropriate agent, keeping state on this orchestrator."""
         
-        # Initialize or update collected data
+        state = self.state.copy()
         if patient_data:
-            self.collected_data["patient_info"].update(patient_data)
+            state.patient_info.update(patient_data)
         if appointment_data:
-            self.collected_data["appointment_info"].update(appointment_data)
+            state.appointment_info.update(appointment_data)
+        
+        self.state, response = self.process_turn(state, user_input, turn_id)
+        return response
+    
+    def process_turn(self, state: ConversationState, user_input: str,
+                     turn_id: str = None) -> Tuple[ConversationState, Dict[str, Any]]:
+        """Process one turn for a session: (state, input) -> (new state, reply).
         
-        # Determine current step if not set
-        if not hasattr(self, 'current_step'):
-            self.current_step = self._determine_current_step()
+        The orchestrator holds no per-session data, so one instance can serve every session.
+        A turn resubmitted with a ``turn_id`` already processed for this session (a client
+        retry or a UI rerun) returns the stored reply, marked ``duplicate``, without running again.
+        """
         
-        # Route to appropriate agent
-        if self.current_step == "greeting":
-            return self._handle_greeting(user_input)
+        if turn_id is not None and turn_id in state.turn_results:
+            return state.copy(), dict(copy.deepcopy(state.turn_results[turn_id]), duplicate=True)
         
-        elif self.current_step == "lookup":
-            return self._handle_lookup()
+        state = state.copy()
         
-        elif self.current_step == "scheduling":
-            return self._handle_scheduling(user_input)
+        with start_trace("turn", step=state.current_step):
+            # Cancel/restart requests are recognized locally without an LLM round trip
+            with span("classify_intent"):
+                intent = classify_intent(user_input)
+            response = self._dispatch(state, user_input, intent)
         
-        elif self.current_step == "insurance_collection":
-            return self._handle_insurance(user_input)
+        if turn_id is not None:
+            state.remember_turn(turn_id, copy.deepcopy(response))
+        return state, response
+    
+    def _dispatch(self, state: ConversationState, user_input: str, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the handler for (step, event) from TRANSITIONS, advancing through automatic steps."""
         
-        elif self.current_step == "confirmation":
-            return self._handle_confirmation()
+        event = intent["intent"] if intent["intent"] in (CANCEL, RESTART) else MESSAGE
+        messages = []
         
-        else:
-            return {
-                "message": "I'm sorry, I'm not sure how to help with that. Let me start over. What's your name?",
-                "patient_data": {},
-                "appointment_data": {}
-            }
+        while True:
+            step = state.current_step
+            handler_name, next_step = TRANSITIONS.get((step, event)) or TRANSITIONS[(ANY_STEP, event)]
+            
+            with span(f"step.{step}", "handler", event=event):
+                response = getattr(self, handler_name)(state, user_input, intent)
+            
+            messages.append(response["message"])
+            if not response.pop("step_complete", False):
+                break
+            
+            state.current_step = next_step
+            # Steps such as lookup and confirmation run in the same turn without waiting for input
+            if next_step not in AUTOMATIC_STEPS:
+                break
+            event = ENTERED
+        
+        response["message"] = "\\n\\n".join(messages)
+        return response
     
-    def _handle_greeting(self, user_input: str) -> Dict[str, Any]:
+    def _handle_greeting(self, state: ConversationState, user_input: str, intent: Dict[str, Any] = None) -> Dict[str, Any]:
         """Handle patient greeting and information collection."""
         
-        result = self.greeting_agent.process(user_input, self.collected_data["patient_info"])
+        result = self.greeting_agent.process(user_input, state.patient_info)
         
         # Update collected data
-        self.collected_data["patient_info"].update(result["extracted_data"])
-        
-        # Check if ready to move to next step
-        if result["is_complete"]:
-            self.current_step = "lookup"
-            
-            # Immediately process lookup
-            lookup_result = self._handle_lookup()
-            return {
-                "message": result["message"] + "\\n\\n" + lookup_result["message"],
-                "patient_data": self.collected_data["patient_info"],
-                "appointment_data": self.collected_data["appointment_info"]
-            }
+        state.patient_info.update(result["extracted_data"])
         
         return {
             "message": result["message"],
-            "patient_data": self.collected_data["patient_info"],
-            "appointment_data": self.collected_data["appointment_info"]
+            "patient_data": state.patient_info,
+            "appointment_data": state.appointment_info,
+            "step_complete": result["is_complete"]
         }
     
-    def _handle_lookup(self) -> Dict[str, Any]:
+    def _handle_lookup(self, state: ConversationState, user_input: str = None, intent: Dict[str, Any] = None) -> Dict[str, Any]:
         """Handle patient lookup in database."""
         
-        result = self.lookup_agent.process(self.collected_data["patient_info"])
+        result = self.lookup_agent.process(state.patient_info)
         
         # Update appointment data with lookup results
-        self.collected_data["appointment_info"].update({
+        state.appointment_info.update({
             "patient_type": result["patient_type"],
             "patient_id": result["patient_id"],
             "appointment_duration": result["appointment_duration"]
         })
         
-        self.current_step = "scheduling"
+        # The next scheduling turn will ask for exactly these slots; start scanning while the patient reads this reply
+        prefetcher = self.scheduling_agent.prefetcher
+        if prefetcher is not None:
+            prefetcher.prefetch(state.patient_info.get("preferred_doctor"), state.patient_info.get("location"),
+                                result["appointment_duration"], days_ahead=14)
         
         return {
             "message": result["message"],
-            "patient_data": self.collected_data["patient_info"],
-            "appointment_data": self.collected_data["appointment_info"]
+            "patient_data": state.patient_info,
+            "appointment_data": state.appointment_info,
+            "step_complete": True
         }
     
-    def _handle_scheduling(self, user_input: str) -> Dict[str, Any]:
+    def _handle_scheduling(self, state: ConversationState, user_input: str, intent: Dict[str, Any] = None) -> Dict[str, Any]:
         """Handle appointment scheduling."""
         
+        # Slot selections and plain confirmations don't need the LLM to re-present slots
+        trivial_turn = intent is not None and intent["intent"] in (SELECT, CONFIRM)
+        
         result = self.scheduling_agent.process(
             user_input, 
-            self.collected_data["patient_info"],
-            self.collected_data["appointment_info"]
+            state.patient_info,
+            state.appointment_info,
+            slot_number=intent["slot_number"] if trivial_turn else None,
+            use_llm=not trivial_turn,
+            slot_offer=state.slot_offer
         )
         
+        # Keep the slots just shown so the patient's pick resolves against the same numbering
+        state.slot_offer = result.get("slot_offer", {})
+        
         # Update appointment data
         if "appointment_details" in result:
-            self.collected_data["appointment_info"].update(result["appointment_details"])
-        
-        # Check if appointment was successfully booked
-        if result.get("booking_successful"):
-            self.current_step = "insurance_collection"
+            state.appointment_info.update(result["appointment_details"])
         
         return {
             "message": result["message"],
-            "patient_data": self.collected_data["patient_info"],
-            "appointment_data": self.collected_data["appointment_info"]
+            "patient_data": state.patient_info,
+            "appointment_data": state.appointment_info,
+            "step_complete": bool(result.get("booking_successful"))
         }
     
-    def _handle_insurance(self, user_input: str) -> Dict[str, Any]:
+    def _handle_insurance(self, state: ConversationState, user_input: str, intent: Dict[str, Any] = None) -> Dict[str, Any]:
         """Handle insurance information collection."""
         
-        result = self.insurance_agent.process(user_input, self.collected_data["insurance_info"])
+        result = self.insurance_agent.process(user_input, state.insurance_info)
         
         # Update insurance data
-        self.collected_data["insurance_info"].update(result["extracted_insurance"])
-        
-        # Check if insurance collection is complete
-        if result["is_complete"]:
-            self.current_step = "confirmation"
-            
-            # Immediately process confirmation
-            confirmation_result = self._handle_confirmation()
-            return {
-                "message": result["message"] + "\\n\\n" + confirmation_result["message"],
-                "patient_data": self.collected_data["patient_info"],
-                "appointment_data": self.collected_data["appointment_info"]
-            }
+        state.insurance_info.update(result["extracted_insurance"])
         
         return {
             "message": result["message"],
-            "patient_data": self.collected_data["patient_info"],
-            "appointment_data": self.collected_data["appointment_info"]
+            "patient_data": state.patient_info,
+            "appointment_data": state.appointment_info,
+            "step_complete": result["is_complete"]
         }
     
-    def _handle_confirmation(self) -> Dict[str, Any]:
+    def _handle_confirmation(self, state: ConversationState, user_input: str = None, intent: Dict[str, Any] = None) -> Dict[str, Any]:
         """Handle final appointment confirmation and setup reminders."""
         
-        # Generate Excel report
-        excel_file = self.excel_exporter.export_appointment(
-            patient_data=self.collected_data["patient_info"],
-            appointment_data=self.collected_data["appointment_info"],
-            insurance_data=self.collected_data["insurance_info"]
-        )
-        
-        # Schedule reminders
-        reminder_result = self.reminder_agent.schedule_reminders(
-            self.collected_data["appointment_info"],
-            self.collected_data["patient_info"]
-        )
+        payload = {
+            "patient_data": state.patient_info,
+            "appointment_data": state.appointment_info,
+            "insurance_data": state.insurance_info
+        }
+        appointment_id = state.appointment_info.get("appointment_id")
+        job_types = (CONFIRMATION_EMAIL_JOB, EXCEL_EXPORT_JOB, REMINDERS_JOB)
+        
+        if self.outbox is not None:
+            with span("outbox.enqueue", "io", kind="confirmation"):
+                self.outbox.enqueue_email("confirmation", payload, idempotency_key=f"{appointment_id}:{CONFIRMATION_EMAIL_JOB}",
+                                          group=appointment_id)
+            job_types = (EXCEL_EXPORT_JOB, REMINDERS_JOB)
+        
+        if self.job_queue is not None:
+            # Excel export and reminders run in the background; the patient gets the reply now
+            for job_type in job_types:
+                with span("job_queue.enqueue", "io", job_type=job_type):
+                    self.job_queue.enqueue(job_type, payload, idempotency_key=f"{appointment_id}:{job_type}", group=appointment_id)
+            
+            excel_status = "in progress ⏳"
+            reminder_count = self._count_upcoming_reminders(state.appointment_info["datetime"])
+        else:
+            excel_file = self._run_excel_export_job(payload, raise_on_failure=False)
+            reminder_count = self._run_reminders_job(payload)["total_reminders"]
+            excel_status = '✅' if excel_file else '❌'
         
-        # Send confirmation email with intake forms
-        email_sent = self.email_service.send_confirmation_email(
-            patient_data=self.collected_data["patient_info"],
-            appointment_data=self.collected_data["appointment_info"],
-            insurance_data=self.collected_data["insurance_info"]
-        )
+        if self.outbox is not None or self.job_queue is not None:
+            email_status = "on its way ⏳"
+        else:
+            email_sent = self._run_confirmation_email_job(payload, raise_on_failure=False)
+            email_status = '✅' if email_sent else '❌'
         
-        appointment_date = self.collected_data["appointment_info"]["datetime"].strftime("%A, %B %d, %Y at %I:%M %p")
+        appointment_date = state.appointment_info["datetime"].strftime("%A, %B %d, %Y at %I:%M %p")
         
         confirmation_message = f"""
         🎉 Your appointment is fully confirmed!
         
         📧 Confirmation Details:
-        • Confirmation email sent: {'✅' if email_sent else '❌'}
-        • Excel report generated: {'✅' if excel_file else '❌'}
-        • Reminders scheduled: {reminder_result.get('total_reminders', 0)} reminders
+        • Confirmation email: {email_status}
+        • Excel report: {excel_status}
+        • Reminders scheduled: {reminder_count} reminders
         
         📋 Next Steps:
         1. Check your email for intake forms
@@ -204,26 +289,85 @@ class SchedulingOrchestrator:
         """
         
         # Reset for next patient
-        self.current_step = "greeting"
-        self.collected_data = {
-            "patient_info": {},
-            "insurance_info": {},
-            "appointment_info": {}
-        }
+        state.reset()
         
         return {
             "message": confirmation_message,
             "patient_data": {},
             "appointment_data": {},
-            "booking_complete": True
+            "booking_complete": True,
+            "booking_jobs": appointment_id if self.job_queue is not None or self.outbox is not None else None,
+            "step_complete": True
+        }
+    
+    def _run_excel_export_job(self, payload: Dict[str, Any], raise_on_failure: bool = True) -> str:
+        """Write the admin Excel report for a confirmed booking."""
+        excel_file = self.excel_exporter.export_appointment(**payload)
+        if not excel_file and raise_on_failure:
+            raise RuntimeError("Excel export failed")
+        return excel_file
+    
+    def _run_reminders_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Schedule the reminder series for a confirmed booking."""
+        reminder_result = self.reminder_agent.schedule_reminders(payload["appointment_data"], payload["patient_data"])
+        return {"total_reminders": reminder_result.get("total_reminders", 0)}
+    
+    def _run_confirmation_email_job(self, payload: Dict[str, Any], raise_on_failure: bool = True) -> bool:
+        """Send the confirmation email with intake forms."""
+        email_sent = self.email_service.send_confirmation_email(**payload)
+        if not email_sent and raise_on_failure:
+            raise RuntimeError("Confirmation email could not be sent")
+        return email_sent
+    
+    def _count_upcoming_reminders(self, appointment_datetime: datetime) -> int:
+        """Number of reminders the reminder job will schedule (those still in the future)."""
+        now = datetime.now()
+        return sum(1 for days_before in self.reminder_agent.reminder_schedule
+                   if appointment_datetime - timedelta(days=days_before) > now)
+    
+    def _handle_reset(self, state: ConversationState, user_input: str, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle cancel/restart requests, releasing any slot already booked."""
+        
+        appointment_id = state.appointment_info.get("appointment_id")
+        if appointment_id:
+            self.scheduling_agent.calendar.cancel_appointment(appointment_id)
+            if self.scheduling_agent.prefetcher is not None:
+                self.scheduling_agent.prefetcher.invalidate(state.appointment_info.get("doctor"),
+                                                            state.appointment_info.get("location"))
+        
+        state.reset()
+        
+        if intent["intent"] == CANCEL:
+            message = "No problem, I've cancelled this booking request. " \
+                      "Just let me know whenever you'd like to schedule an appointment."
+        else:
+            message = "Sure, let's start over. Could you please tell me your full name and date of birth?"
+        
+        return {
+            "message": message,
+            "patient_data": {},
+            "appointment_data": {},
+            "session_reset": True,
+            "step_complete": True
+        }
+    
+    def _handle_unknown_step(self, state: ConversationState, user_input: str, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """Recover from a state whose step is not in the transition table by starting over."""
+        
+        state.reset()
+        return {
+            "message": "I'm sorry, I'm not sure how to help with that. Let me start over. What's your name?",
+            "patient_data": {},
+            "appointment_data": {},
+            "step_complete": True
         }
     
-    def _determine_current_step(self) -> str:
+    def _determine_current_step(self, state: ConversationState) -> str:
         """Determine current step based on collected data."""
         
-        patient_info = self.collected_data["patient_info"]
-        appointment_info = self.collected_data["appointment_info"]
-        insurance_info = self.collected_data["insurance_info"]
+        patient_info = state.patient_info
+        appointment_info = state.appointment_info
+        insurance_info = state.insurance_info
         
         # Check if basic patient info is complete
         required_patient_fields = ["name", "date_of_birth", "preferred_doctor", "location"]
@@ -1,17 +1,22 @@
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
-import schedule
+import config
 from utils.email_service import EmailService
 from utils.sms_service import SMSService
 from utils.database import Database
+from utils.lazy_import import lazy_component
+from utils.outbox import get_outbox
 
 class ReminderAgent:
     """Agent responsible for scheduling and sending appointment reminders."""
     
+    email_service = lazy_component(lambda self: EmailService())
+    sms_service = lazy_component(lambda self: SMSService())
+    db = lazy_component(lambda self: Database())
+    # Email and SMS are handed to the outbox instead of being sent inline, when it is enabled
+    outbox = lazy_component(lambda self: get_outbox() if config.OUTBOX_ENABLED else None)
+    
     def __init__(self):
-        self.email_service = EmailService()
-        self.sms_service = SMSService()
-        self.db = Database()
         self.reminder_schedule = [7, 3, 1]  # Days before appointment
         
     def schedule_reminders(self, appointment_data: Dict[str, Any], patient_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -60,30 +65,111 @@ class ReminderAgent:
         
         # Generate reminder message based on type
         message = self._generate_reminder_message(reminder_type, appointment, patient)
+        subject = f"Appointment Reminder - {appointment['datetime'].strftime('%m/%d/%Y')}"
+        sms_message = self._generate_sms_message(reminder_type, appointment)
+        
+        if self.outbox is not None:
+            self.outbox.enqueue_reminders([{
+                "reminder_id": reminder_data['reminder_id'],
+                "appointment_id": reminder_data['appointment_id'],
+                "email": {"to_email": patient.get('email'), "subject": subject, "message": message},
+                "sms": {"phone": patient.get('phone'), "message": sms_message}
+            }])
+            email_sent = sms_sent = True
+        else:
+            # Send email reminder
+            email_sent = self.email_service.send_reminder_email(
+                to_email=patient.get('email'),
+                subject=subject,
+                message=message,
+                appointment_data=appointment
+            )
+            
+            # Send SMS reminder
+            sms_sent = self.sms_service.send_reminder_sms(to_phone=patient.get('phone'), message=sms_message)
         
-        # Send email reminder
-        email_sent = self.email_service.send_reminder_email(
-            to_email=patient.get('email'),
-            subject=f"Appointment Reminder - {appointment['datetime'].strftime('%m/%d/%Y')}",
-            message=message,
-            appointment_data=appointment
-        )
-        
-        # Send SMS reminder
-        sms_sent = self.sms_service.send_reminder_sms(
-            to_phone=patient.get('phone'),
-            message=self._generate_sms_message(reminder_type, appointment)
-        )
-        
-        # Update reminder status
-        self.db.update_reminder_status(reminder_data['reminder_id'], 'sent')
+        # Update reminder status; a reminder no channel delivered is marked failed rather than sent
+        delivered = bool(email_sent or sms_sent)
+        self.db.update_reminder_status(reminder_data['reminder_id'], 'sent' if delivered else 'failed')
         
-        return {
-            "success": True,
+        result = {
+            "success": delivered,
             "email_sent": email_sent,
             "sms_sent": sms_sent,
+            "queued": self.outbox is not None,
             "reminder_type": reminder_type
         }
+        if not delivered:
+            result["error"] = "Neither the email nor the SMS was sent"
+        return result
+    
+    def send_due_reminders(self, reminders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send a batch of reminders with one lookup of appointments and patients and one status update.
+        
+        Returns a result per reminder, in order, shaped like send_reminder's. Reminders for
+        cancelled appointments are not sent and are marked cancelled; reminders that neither
+        channel delivered are marked failed. With the outbox enabled the
+        whole batch is queued in one transaction and delivered by its workers.
+        """
+        
+        results: List[Dict[str, Any]] = [None] * len(reminders)
+        statuses = {}
+        emails = []
+        sms_messages = []
+        sending = []
+        
+        for position, detail in enumerate(self.db.get_reminder_details(reminders)):
+            reminder, appointment, patient = detail["reminder"], detail["appointment"], detail["patient"]
+            
+            if not appointment or not patient:
+                results[position] = {"success": False, "error": "Appointment or patient not found"}
+                continue
+            
+            if appointment.get('status') == 'cancelled':
+                results[position] = {"success": False, "error": "Appointment cancelled"}
+                statuses[reminder['reminder_id']] = 'cancelled'
+                continue
+            
+            reminder_type = reminder.get('type') or 'standard'
+            emails.append({
+                "to_email": patient.get('email'),
+                "subject": f"Appointment Reminder - {appointment['datetime'].strftime('%m/%d/%Y')}",
+                "message": self._generate_reminder_message(reminder_type, appointment, patient)
+            })
+            sms_messages.append({
+                "phone": patient.get('phone'),
+                "message": self._generate_sms_message(reminder_type, appointment)
+            })
+            sending.append((position, reminder['reminder_id'], reminder_type))
+        
+        if self.outbox is not None:
+            self.outbox.enqueue_reminders([
+                {"reminder_id": reminder_id, "appointment_id": reminders[position].get('appointment_id'),
+                 "email": email, "sms": sms}
+                for (position, reminder_id, _), email, sms in zip(sending, emails, sms_messages)
+            ])
+            email_results = sms_results = [True] * len(sending)
+        else:
+            email_results = self.email_service.send_reminder_emails(emails)
+            sms_results = self.sms_service.send_bulk_reminders(sms_messages)['results']
+        
+        for (position, reminder_id, reminder_type), email_sent, sms_sent in zip(sending, email_results, sms_results):
+            delivered = bool(email_sent or sms_sent)
+            statuses[reminder_id] = 'sent' if delivered else 'failed'
+            results[position] = {
+                "success": delivered,
+                "email_sent": email_sent,
+                "sms_sent": sms_sent,
+                "queued": self.outbox is not None,
+                "reminder_type": reminder_type
+            }
+            if not delivered:
+                results[position]["error"] = "Neither the email nor the SMS was sent"
+        
+        # Update all reminder statuses in one write
+        self.db.update_reminder_statuses(statuses)
+        
+        return results
     
     def _get_reminder_type(self, days_before: int) -> str:
         """Determine reminder type based on days before appointment."""
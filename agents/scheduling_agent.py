@@ -1,41 +1,55 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
-import pandas as pd
+import config
 from utils.calendar_integration import CalendarIntegration
-from utils.database import Database
-from config import DEMO_MODE
+from utils.database import Database, data_lock
+from utils.llm_client import create_llm
+from utils.llm_resilience import LLMUnavailableError
+from utils.lazy_import import lazy_import, lazy_component
+from utils.prefetch import get_availability_prefetcher
+from utils.tracing import span
 
-# Import mock LLM for demo mode
-if DEMO_MODE:
-    from utils.mock_llm import MockChatOpenAI
+lc_messages = lazy_import("langchain_core.messages")
 
 class SchedulingAgent:
     """Agent responsible for finding and booking appointment slots."""
     
+    llm = lazy_component(lambda self: create_llm(self.llm_model, temperature=0.1))
+    calendar = lazy_component(lambda self: CalendarIntegration())
+    db = lazy_component(lambda self: Database())
+    prefetcher = lazy_component(lambda self: get_availability_prefetcher() if config.PREFETCH_ENABLED else None)
+    
     def __init__(self, llm_model: str = "gpt-3.5-turbo"):
-        if DEMO_MODE:
-            self.llm = MockChatOpenAI(model=llm_model, temperature=0.1)
-        else:
-            self.llm = ChatOpenAI(model=llm_model, temperature=0.1)
-        self.calendar = CalendarIntegration()
-        self.db = Database()
+        self.llm_model = llm_model
+        
+    def process(self, user_input: str, patient_data: Dict[str, Any], appointment_data: Dict[str, Any],
+                slot_number: int = None, use_llm: bool = True, slot_offer: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Process scheduling requests and find available slots.
         
-    def process(self, user_input: str, patient_data: Dict[str, Any], appointment_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process scheduling requests and find available slots."""
+        ``slot_number`` is a 1-based selection already recognized by the caller;
+        ``use_llm=False`` presents slots with the template message only.
+        ``slot_offer`` is the offer returned with the slots the patient was last
+        shown: a selection resolves against it without scanning the calendar again.
+        """
         
         duration = appointment_data.get("appointment_duration", 60)
         preferred_doctor = patient_data.get("preferred_doctor")
         location = patient_data.get("location")
-        
-        # Get available slots
-        available_slots = self.calendar.get_available_slots(
-            doctor=preferred_doctor,
-            location=location,
-            duration=duration,
-            days_ahead=14  # Look 2 weeks ahead
-        )
+        notice = None
+        
+        offered_slots = (slot_offer or {}).get("slots") or []
+        if offered_slots:
+            selected_slot = self._select_slot(user_input, offered_slots, slot_number)
+            if selected_slot:
+                result = self._confirm_appointment(selected_slot, patient_data, appointment_data, slot_offer.get("etag"))
+                if result["booking_successful"]:
+                    return result
+                # Someone else took the slot since it was offered; show what is open now
+                notice = result["message"]
+        
+        # Get available slots (warm from the prefetch started at lookup when there is one)
+        available_slots, availability_etag = self._get_available_slots(preferred_doctor, location, duration,
+                                                                       use_prefetch=notice is None)
         
         if not available_slots:
             return {
@@ -43,9 +57,21 @@ class SchedulingAgent:
                           f"in the next two weeks at our {location} location. Would you like me to check with " \
                           f"another doctor or a different location?",
                 "available_slots": [],
+                "slot_offer": {},
                 "next_step": "alternative_options"
             }
         
+        # A selection made before any slots were shown picks from the list just found
+        if not offered_slots:
+            selected_slot = self._select_slot(user_input, available_slots, slot_number)
+            if selected_slot:
+                result = self._confirm_appointment(selected_slot, patient_data, appointment_data, availability_etag)
+                if result["booking_successful"]:
+                    return result
+                notice = result["message"]
+                available_slots, availability_etag = self._get_available_slots(preferred_doctor, location, duration,
+                                                                               use_prefetch=False)
+        
         # Format available slots for presentation
         formatted_slots = self._format_slots_for_display(available_slots[:6])  # Show top 6 options
         
@@ -62,24 +88,60 @@ class SchedulingAgent:
         """
         
         messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Show available appointments: {formatted_slots}")
+            lc_messages.SystemMessage(content=system_prompt),
+            lc_messages.HumanMessage(content=f"Show available appointments: {formatted_slots}")
         ]
         
-        response = self.llm(messages)
-        
-        # Check if user selected a time slot
-        selected_slot = self._extract_selected_slot(user_input, available_slots)
+        # Get LLM response, falling back to a template if the LLM is unavailable
+        intro_message = None
+        if use_llm and notice is None:
+            try:
+                with span("llm.scheduling", "llm"):
+                    intro_message = self.llm(messages).content
+            except LLMUnavailableError:
+                pass
         
-        if selected_slot:
-            return self._confirm_appointment(selected_slot, patient_data, appointment_data)
+        if intro_message is None:
+            intro_message = notice or f"Dr. {preferred_doctor} has the following {duration}-minute openings " \
+                                      f"at our {location} location."
         
         return {
-            "message": response.content + "\\n\\n" + formatted_slots,
+            "message": intro_message + "\\n\\n" + formatted_slots,
             "available_slots": available_slots,
+            "slot_offer": {"slots": available_slots, "etag": availability_etag},
             "next_step": "slot_selection"
         }
     
+    def _select_slot(self, user_input: str, slots: List[Dict], slot_number: int = None) -> Optional[Dict]:
+        """Resolve the patient's choice against a slot list (by the recognized number, or from the text)."""
+        if slot_number is not None:
+            return slots[slot_number - 1] if 0 < slot_number <= len(slots) else None
+        return self._extract_selected_slot(user_input, slots)
+    
+    def _get_available_slots(self, doctor: str, location: str, duration: int,
+                             use_prefetch: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """Return two weeks of open slots and the availability etag they were read at.
+        
+        A prefetched result has no etag (its scan may predate bookings made in
+        other processes), so a slot picked from it is always rechecked.
+        """
+        if use_prefetch and self.prefetcher is not None:
+            with span("prefetch.get", "io") as prefetch_span:
+                slots = self.prefetcher.get(doctor, location, duration, days_ahead=14)
+                if prefetch_span is not None:
+                    prefetch_span.attrs["hit"] = slots is not None
+            if slots is not None:
+                return slots, None
+        
+        availability_etag = self.calendar.get_availability_etag(doctor, location)
+        slots = self.calendar.get_available_slots(
+            doctor=doctor,
+            location=location,
+            duration=duration,
+            days_ahead=14  # Look 2 weeks ahead
+        )
+        return slots, availability_etag
+    
     def _format_slots_for_display(self, slots: List[Dict]) -> str:
         """Format available slots for user-friendly display."""
         if not slots:
@@ -119,7 +181,8 @@ class SchedulingAgent:
         
         return None
     
-    def _confirm_appointment(self, selected_slot: Dict, patient_data: Dict, appointment_data: Dict) -> Dict:
+    def _confirm_appointment(self, selected_slot: Dict, patient_data: Dict, appointment_data: Dict,
+                             availability_etag: Optional[str] = None) -> Dict:
         """Confirm the selected appointment slot."""
         
         appointment_details = {
@@ -133,12 +196,17 @@ class SchedulingAgent:
             "created_at": datetime.now()
         }
         
-        # Book the appointment
-        success = self.calendar.book_appointment(selected_slot, appointment_details)
+        # Recheck and save under one lock so two sessions can't both take the slot
+        with data_lock:
+            success = self.calendar.book_appointment(selected_slot, appointment_details, availability_etag)
+            if success:
+                # Save to database
+                self.db.save_appointment(appointment_details)
         
         if success:
-            # Save to database
-            self.db.save_appointment(appointment_details)
+            if self.prefetcher is not None:
+                self.prefetcher.record_booking(appointment_details["doctor"], appointment_details["location"],
+                                               appointment_details["datetime"], appointment_details["duration"] or 60)
             
             date_str = selected_slot['datetime'].strftime("%A, %B %d, %Y")
             time_str = selected_slot['datetime'].strftime("%I:%M %p")
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP/JSON API for the scheduling conversation.
+
+Lets phone and SMS front ends drive the same booking flow as the Streamlit
+app without re-running a UI script per message:
+
+    POST /sessions                        start a session      -> {"session_id", "state"}
+    POST /sessions/<id>/messages          send one message     -> {"session_id", "reply", "state"}
+                                          (body {"message", "turn_id"?}; a repeated turn_id gets the first reply)
+    GET  /sessions/<id>                   current state        -> {"session_id", "state"}
+    GET  /health                          pool and session store counters
+    GET  /traces[?format=chrome]          slowest spans and recent turn traces
+    POST /sms/inbound                     patient reply to a reminder -> {"reply", "status", "appointment_id", ...}
+                                          (Twilio's form post {"From", "Body"} is answered with TwiML instead;
+                                          with TWILIO_AUTH_TOKEN set, its X-Twilio-Signature is checked)
+
+Requests are served by a fixed pool of HTTP threads. Turns run on a pool of
+orchestrators (each with its own agents and LLM clients), while the session
+store, job queue and extractors are the process-wide shared instances. Turns
+for the same session are serialized so concurrent messages cannot overwrite
+each other's state.
+
+Usage:
+    python api_server.py --port 8000 --workers 4
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+import argparse
+import hmac
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.orchestrator import SchedulingOrchestrator
+from utils.lazy_import import lazy_component
+from utils.session_store import SessionStore, get_session_store
+from utils.sms_router import get_sms_router, twilio_signature
+from utils.tracing import start_trace, span, chrome_trace, get_trace_recorder
+from utils.turn_log import TurnLog, get_turn_log
+import config
+
+
+class WorkerPoolBusy(Exception):
+    """No orchestrator became free within the checkout timeout."""
+
+
+class OrchestratorPool:
+    """Fixed set of orchestrators checked out by one request at a time."""
+
+    def __init__(self, size: int = config.API_WORKERS,
+                 factory: Callable[[], SchedulingOrchestrator] = SchedulingOrchestrator):
+        self.size = size
+        self._idle: "queue.Queue[SchedulingOrchestrator]" = queue.Queue()
+        for _ in range(size):
+            self._idle.put(factory())
+
+    @contextmanager
+    def checkout(self, timeout: float = config.API_WORKER_TIMEOUT_SECONDS):
+        try:
+            with span("pool.wait", "wait"):
+                orchestrator = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerPoolBusy(f"No conversation worker free after {timeout:.0f}s")
+        try:
+            yield orchestrator
+        finally:
+            self._idle.put(orchestrator)
+
+    def idle_count(self) -> int:
+        return self._idle.qsize()
+
+
+class ConversationAPI:
+    """Session operations behind the HTTP routes (usable without a server)."""
+
+    def __init__(self, pool: OrchestratorPool = None, session_store: SessionStore = None, lock_stripes: int = 256,
+                 turn_log: TurnLog = None):
+        self.pool = pool or OrchestratorPool()
+        self.session_store = session_store or get_session_store()
+        self.turn_log = turn_log or get_turn_log()
+        self._session_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._stats_lock = threading.Lock()
+        self._stats = {"sessions_started": 0, "turns": 0, "duplicate_turns": 0, "busy_rejections": 0}
+
+    def _session_lock(self, session_id: str) -> threading.Lock:
+        return self._session_locks[hash(session_id) % len(self._session_locks)]
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def start_session(self) -> Dict[str, Any]:
+        """Create an empty session and return its ID."""
+        session_id = uuid.uuid4().hex
+        state = self.session_store.get_or_create(session_id)
+        self.session_store.put(session_id, state)
+        self._count("sessions_started")
+        return {"session_id": session_id, "state": state.to_dict()}
+
+    def send_message(self, session_id: str, message: str, turn_id: str = None) -> Dict[str, Any]:
+        """Run one turn for the session (a new session is created for an unknown ID).
+
+        Clients that may retry should send a ``turn_id``: a turn ID the session has
+        already processed returns the original reply instead of running the turn again.
+        """
+        start = time.perf_counter()
+        with start_trace("api.send_message", "api"), self._session_lock(session_id):
+            with span("session_store.get", "io"):
+                state = self.session_store.get_or_create(session_id)
+            step = state.current_step
+            try:
+                with self.pool.checkout() as orchestrator:
+                    state, reply = orchestrator.process_turn(state, message, turn_id)
+            except WorkerPoolBusy:
+                self._count("busy_rejections")
+                raise
+            duplicate = bool(reply.get("duplicate"))
+            if not duplicate:
+                with span("session_store.put", "io"):
+                    self.session_store.put(session_id, state)
+            # Logged under the session lock, so the log lists a session's turns in the order they ran
+            self._count("duplicate_turns" if duplicate else "turns")
+            self.turn_log.append(session_id, turn_id, step, message, state.current_step,
+                                 (time.perf_counter() - start) * 1000, duplicate)
+
+        return {"session_id": session_id, "reply": reply, "state": state.to_dict()}
+
+    def get_state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session's state, or None if the session does not exist."""
+        state = self.session_store.get(session_id)
+        if state is None:
+            return None
+        return {"session_id": session_id, "state": state.to_dict()}
+
+    def get_traces(self, limit: int = 20, chrome: bool = False) -> Dict[str, Any]:
+        """Return per-span timing totals and the most recent traces (or a Chrome trace document)."""
+        recorder = get_trace_recorder()
+        traces = recorder.recent(limit)
+        if chrome:
+            return chrome_trace(traces)
+        return {"spans": recorder.get_stats(), "recent": [trace.to_dict() for trace in traces]}
+
+    def get_health(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            "status": "ok",
+            "workers": self.pool.size,
+            "idle_workers": self.pool.idle_count(),
+            "sessions": self.session_store.get_stats(),
+            **stats
+        }
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """HTTP server that handles connections on a bounded thread pool instead of a thread each."""
+
+    def __init__(self, server_address, handler_class, threads: int = config.API_HTTP_THREADS):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="api-http")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
+class APIServer:
+    """Conversation API served over HTTP/1.1 keep-alive connections."""
+
+    sms_router = lazy_component(lambda self: get_sms_router())
+
+    def __init__(self, api: ConversationAPI = None, host: str = config.API_HOST, port: int = config.API_PORT,
+                 http_threads: int = config.API_HTTP_THREADS, sms_router=None):
+        self.api = api or ConversationAPI()
+        if sms_router is not None:
+            self.sms_router = sms_router
+        self.httpd = PooledHTTPServer((host, port), self._make_handler(), threads=http_threads)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "APIServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="api-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve requests on the current thread until interrupted."""
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Shut the server down and release the port."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Dispatch one request to the conversation API and return (status, JSON body)."""
+        parts = [part for part in path.split("?")[0].split("/") if part]
+
+        if method == "GET" and parts == ["health"]:
+            return 200, self.api.get_health()
+
+        if method == "GET" and parts == ["traces"]:
+            query = parse_qs(urlparse(path).query)
+            try:
+                limit = int(query.get("limit", ["20"])[0])
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return 400, {"error": "'limit' must be a positive integer"}
+            # The recorder keeps no more than TRACE_BUFFER_SIZE traces anyway
+            limit = min(limit, config.TRACE_BUFFER_SIZE)
+            return 200, self.api.get_traces(limit, chrome=query.get("format") == ["chrome"])
+
+        if parts == ["sms", "inbound"]:
+            if method != "POST":
+                return 405, {"error": "Method not allowed"}
+            from_phone, message = body.get("From"), body.get("Body")
+            if not isinstance(from_phone, str) or not isinstance(message, str):
+                return 400, {"error": "Request body must include 'From' and 'Body'"}
+            return 200, self.sms_router.handle(from_phone, message)
+
+        if parts[:1] != ["sessions"] or len(parts) > 3:
+            return 404, {"error": "Not found"}
+
+        if method == "POST" and len(parts) == 1:
+            return 201, self.api.start_session()
+
+        if method == "GET" and len(parts) == 2:
+            result = self.api.get_state(parts[1])
+            return (200, result) if result else (404, {"error": "Unknown session"})
+
+        if len(parts) == 3 and parts[2] != "messages":
+            return 404, {"error": "Not found"}
+
+        if method == "POST" and len(parts) == 3:
+            message = body.get("message")
+            if not isinstance(message, str) or not message.strip():
+                return 400, {"error": "Request body must include a non-empty 'message'"}
+            turn_id = body.get("turn_id")
+            if turn_id is not None and not isinstance(turn_id, str):
+                return 400, {"error": "'turn_id' must be a string"}
+            try:
+                return 200, self.api.send_message(parts[1], message, turn_id)
+            except WorkerPoolBusy as e:
+                return 503, {"error": str(e)}
+
+        return 405, {"error": "Method not allowed"}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Close idle keep-alive connections so they do not hold an HTTP thread forever
+            timeout = 30
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def _handle(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                # Twilio posts webhooks as a form and expects TwiML back
+                form = (self.headers.get("Content-Type") or "").startswith("application/x-www-form-urlencoded")
+                try:
+                    if form:
+                        query = parse_qs(raw.decode("utf-8"), keep_blank_values=True)
+                        body = {key: values[-1] for key, values in query.items()}
+                    else:
+                        body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise ValueError("body is not a JSON object")
+                except ValueError:
+                    self._send_json(400, {"error": "Request body must be a JSON object"})
+                    return
+
+                if form and config.TWILIO_AUTH_TOKEN and not self._signed_by_twilio(body):
+                    self._send_json(403, {"error": "Invalid X-Twilio-Signature"})
+                    return
+
+                try:
+                    status, payload = server.route(method, self.path, body)
+                except Exception as e:
+                    print(f"Error handling {method} {self.path}: {e}")
+                    status, payload = 500, {"error": "Internal server error"}
+                if form and status == 200 and "reply" in payload:
+                    self._send_twiml(payload["reply"])
+                else:
+                    self._send_json(status, payload)
+
+            def _signed_by_twilio(self, params: Dict[str, str]) -> bool:
+                url = config.SMS_WEBHOOK_URL or f"http://{self.headers.get('Host', '')}{self.path}"
+                expected = twilio_signature(config.TWILIO_AUTH_TOKEN, url, params)
+                return hmac.compare_digest(expected, self.headers.get("X-Twilio-Signature", ""))
+
+            def _send_twiml(self, reply: str):
+                data = (f'<?xml version="1.0" encoding="UTF-8"?><Response><Message>{escape(reply)}</Message>'
+                        f'</Response>').encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload, default=_json_default).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the scheduling conversation over HTTP/JSON')
+    parser.add_argument('--host', default=config.API_HOST, help='Interface to bind')
+    parser.add_argument('--port', type=int, default=config.API_PORT, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=config.API_WORKERS, help='Orchestrators in the pool')
+    parser.add_argument('--http-threads', type=int, default=config.API_HTTP_THREADS, help='Connection handler threads')
+    args = parser.parse_args()
+
+    server = APIServer(ConversationAPI(OrchestratorPool(args.workers)), host=args.host, port=args.port,
+                       http_threads=args.http_threads)
+    print(f"Conversation API listening on {server.base_url} ({args.workers} workers, {args.http_threads} HTTP threads)")
+    if config.REMINDER_DISPATCHER_ENABLED:
+        # Reminders booked through this server reach the dispatcher directly; run one dispatcher per data/ directory
+        from utils.reminder_dispatcher import get_reminder_dispatcher
+        print(f"Reminder dispatcher running ({get_reminder_dispatcher().get_stats()['pending']} pending reminders)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
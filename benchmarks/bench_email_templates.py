@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+CPU benchmark for building reminder and confirmation emails.
+
+Builds the same messages two ways: the old path (an f-string render of the
+whole HTML body per message, and for confirmations a fresh read and base64
+encoding of the intake form) and EmailService with the compiled templates
+and the cached attachment. No mail is sent; only message construction and
+serialization are timed. A synthetic intake form of ``--form-kb`` KB is
+written to a temporary file.
+
+Usage:
+    python benchmarks/bench_email_templates.py --reminders 10000 --confirmations 2000 --form-kb 200
+"""
+
+from datetime import datetime, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.email_service import EmailService
+from utils.email_templates import CachedAttachment, CONFIRMATION_TEMPLATE
+import utils.email_templates as email_templates
+
+
+def legacy_reminder(to_email, subject, message):
+    msg = MIMEMultipart()
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    html_message = message.replace('\\n', '<br>')
+    html_body = f"""
+        <html>
+        <head></head>
+        <body>
+            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                {html_message}
+            </div>
+        </body>
+        </html>
+        """
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+def legacy_confirmation(form_path, values):
+    msg = MIMEMultipart()
+    msg['To'] = values['email']
+    msg['Subject'] = "Appointment Confirmation"
+    # The old body was one large f-string; format() over the same text costs the same
+    msg.attach(MIMEText(CONFIRMATION_TEMPLATE.source.format(**values), 'html'))
+    with open(form_path, "rb") as attachment:
+        part = MIMEApplication(attachment.read(), Name="Patient_Intake_Form.pdf")
+        part['Content-Disposition'] = 'attachment; filename="Patient_Intake_Form.pdf"'
+        msg.attach(part)
+    return msg
+
+
+def confirmation_data(i):
+    start = datetime(2026, 3, 2, 9) + timedelta(minutes=30 * i)
+    patient = {'name': f'Patient {i}', 'email': f'patient{i}@example.com'}
+    appointment = {'datetime': start, 'doctor': 'Smith', 'duration': 30, 'location': 'Main Clinic',
+                   'appointment_id': f'APT{i:06d}'}
+    insurance = {'insurance_carrier': 'Aetna', 'member_id': f'M{i:08d}', 'group_number': 'G100'}
+    return patient, appointment, insurance
+
+
+def timed(label, count, build):
+    start = time.perf_counter()
+    size = 0
+    for i in range(count):
+        size += len(build(i).as_bytes())
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:>9.2f} {count / elapsed:>11.0f} {size / count / 1024:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark email construction with compiled templates')
+    parser.add_argument('--reminders', type=int, default=10000, help='Reminder emails to build')
+    parser.add_argument('--confirmations', type=int, default=2000, help='Confirmation emails to build')
+    parser.add_argument('--form-kb', type=int, default=200, help='Size of the synthetic intake form in KB')
+    args = parser.parse_args()
+
+    service = EmailService()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        form_path = os.path.join(tmpdir, "intake_form.pdf")
+        with open(form_path, "wb") as f:
+            f.write(os.urandom(args.form_kb * 1024))
+        email_templates._intake_form = CachedAttachment(form_path, "Patient_Intake_Form.pdf")
+
+        print(f"{'build':<34} {'seconds':>9} {'emails/s':>11} {'avg KB':>9}")
+        timed("reminders, f-string", args.reminders,
+              lambda i: legacy_reminder(f"patient{i}@example.com", "Reminder", f"Hi {i},\\nSee you tomorrow."))
+        timed("reminders, compiled template", args.reminders,
+              lambda i: service._create_reminder_message(f"patient{i}@example.com", "Reminder",
+                                                         f"Hi {i},\\nSee you tomorrow."))
+
+        def legacy(i):
+            patient, appointment, insurance = confirmation_data(i)
+            values = {**appointment, **insurance, 'name': patient['name'], 'email': patient['email'],
+                      'appointment_date': appointment['datetime'].strftime('%A, %B %d, %Y'),
+                      'appointment_time': appointment['datetime'].strftime('%I:%M %p')}
+            return legacy_confirmation(form_path, values)
+
+        def compiled(i):
+            patient, appointment, insurance = confirmation_data(i)
+            msg = MIMEMultipart(boundary=email_templates.multipart_boundary())
+            msg['To'] = patient['email']
+            msg['Subject'] = "Appointment Confirmation"
+            msg.attach(MIMEText(service._create_confirmation_email_body(patient, appointment, insurance), 'html'))
+            msg.attach(email_templates.get_intake_form().part())
+            return msg
+
+        timed("confirmations, read + encode form", args.confirmations, legacy)
+        timed("confirmations, cached form", args.confirmations, compiled)
+        print(f"intake form loads with caching: {email_templates.get_intake_form().loads}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for patient information extraction.
+
+Generates a corpus of synthetic chat transcripts and compares the original
+multi-regex GreetingAgent extraction against the single-pass
+PatientInfoExtractor, reporting messages per second and field agreement.
+
+Usage:
+    python benchmarks/bench_extraction.py --messages 50000 --seed 42
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_extraction import PatientInfoExtractor, Gazetteer
+
+DOCTORS = ["Smith", "Johnson", "Wilson", "Davis", "Brown"]
+LOCATIONS = ["Downtown", "Uptown", "Midtown", "Westside", "Eastside"]
+FIRST_NAMES = ["John", "Jane", "Michael", "Sarah", "David", "Emily", "Robert", "Jessica", "William", "Ashley"]
+LAST_NAMES = ["Garcia", "Miller", "Martinez", "Lopez", "Anderson", "Taylor", "Moore", "Jackson", "Lee", "White"]
+
+TEMPLATES = [
+    "Hi, I need to schedule an appointment",
+    "My name is {name}",
+    "I'm {name}, born {dob}",
+    "My date of birth is {dob}",
+    "I'd like to see Dr. {doctor} at the {location} clinic",
+    "Can I book with doctor {doctor}? Location: {location}",
+    "{name} {dob}",
+    "Hi, my name is {name}, date of birth {dob}, I'd like to see Dr. {doctor} at {location} clinic",
+    "Option 2 looks good",
+    "I have Blue Cross Blue Shield insurance, member ID 123456789, group number ABC123",
+    "Is there anything available next Tuesday around 2 PM? I prefer mornings if possible, thanks.",
+    "office: {location}",
+]
+
+
+def legacy_extract_patient_info(text, existing_data):
+    """The original GreetingAgent._extract_patient_info, kept for comparison."""
+    data = existing_data.copy()
+
+    name_patterns = [
+        r"(?:my name is|i'm|i am|name's)\s+([a-zA-Z\s]+)",
+        r"^([A-Z][a-z]+\s+[A-Z][a-z]+)",
+    ]
+    for pattern in name_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match and not data.get("name"):
+            data["name"] = match.group(1).strip().title()
+            break
+
+    dob_match = re.search(r"(\d{1,2}[/-]\d{1,2}[/-]\d{4})", text)
+    if dob_match and not data.get("date_of_birth"):
+        data["date_of_birth"] = dob_match.group(1)
+
+    doctor_patterns = [
+        r"(?:doctor|dr\.?)\s+([a-zA-Z\s]+)",
+        r"(?:see|with|appointment with)\s+(?:doctor|dr\.?)\s+([a-zA-Z\s]+)",
+    ]
+    for pattern in doctor_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match and not data.get("preferred_doctor"):
+            data["preferred_doctor"] = match.group(1).strip().title()
+            break
+
+    for keyword in ["location", "clinic", "office", "branch"]:
+        match = re.search(keyword + r"[:\s]+([a-zA-Z\s]+)", text, re.IGNORECASE)
+        if match and not data.get("location"):
+            data["location"] = match.group(1).strip().title()
+            break
+
+    return data
+
+
+def generate_corpus(num_messages, seed):
+    """Generate synthetic chat messages from the templates."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(num_messages):
+        corpus.append(rng.choice(TEMPLATES).format(
+            name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            dob=f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1940, 2005)}",
+            doctor=rng.choice(DOCTORS),
+            location=rng.choice(LOCATIONS)
+        ))
+    return corpus
+
+
+def run(name, extract, corpus, repeat):
+    """Time extraction over the corpus, keeping the best of several runs."""
+    best = float("inf")
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract(text, {}) for text in corpus]
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{name:<12} {len(corpus) / best:>12,.0f} msgs/sec   ({best * 1e6 / len(corpus):.2f} us/msg)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark patient information extraction')
+    parser.add_argument('--messages', type=int, default=50000, help='Number of synthetic messages')
+    parser.add_argument('--seed', type=int, default=42, help='Corpus RNG seed')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation (best is reported)')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.messages, args.seed)
+    extractor = PatientInfoExtractor(Gazetteer(DOCTORS, LOCATIONS))
+
+    print(f"Extraction throughput over {len(corpus):,} messages")
+    print("-" * 60)
+    legacy = run("legacy", legacy_extract_patient_info, corpus, args.repeat)
+    compiled = run("compiled", extractor.extract, corpus, args.repeat)
+
+    print("-" * 60)
+    for field in PatientInfoExtractor.fields:
+        legacy_found = sum(1 for record in legacy if record.get(field))
+        compiled_found = sum(1 for record in compiled if record.get(field))
+        print(f"{field:<18} found: legacy {legacy_found:>7,}   compiled {compiled_found:>7,}")
+
+
+if __name__ == "__main__":
+    main()
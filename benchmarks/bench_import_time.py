@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cold-start import benchmark.
+
+Imports each target module in a fresh interpreter under ``python -X importtime``
+and reports the median cumulative import time of the target together with the
+heaviest packages it pulled in. Run it before and after a change to track
+startup cost of main.py and demo.py.
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5
+    python benchmarks/bench_import_time.py --targets main demo agents.orchestrator --top 10
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:  self [us] |  cumulative | <indent>module"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Our own modules are reported through the target's total, not as third-party cost
+_PROJECT_PACKAGES = {"agents", "utils", "config", "main", "demo"}
+
+
+def _run_importtime(code, env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        raise RuntimeError(error)
+    return [match.groups() for match in map(_IMPORTTIME_LINE.match, result.stderr.splitlines()) if match]
+
+
+def startup_modules(env):
+    """Modules the bare interpreter imports before running any code (site hooks, encodings)."""
+    return {module for _, _, _, module in _run_importtime("pass", env)}
+
+
+def measure(target, env, baseline):
+    """Import target in a fresh interpreter and return (cumulative us, {package: us})."""
+    total = None
+    packages = {}
+    for _, cumulative, _, module in _run_importtime(f"import {target}", env):
+        if module == target:
+            total = int(cumulative)
+        package = module.split(".")[0]
+        if module in baseline or package in _PROJECT_PACKAGES or package == target.split(".")[0]:
+            continue
+        # A package's outermost import line carries the largest cumulative time
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold import time of the app entry points')
+    parser.add_argument('--targets', nargs='+', default=['main', 'demo', 'agents.orchestrator'],
+                        help='Modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per target (median is reported)')
+    parser.add_argument('--top', type=int, default=8, help='Heaviest packages to list per target')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DEMO_MODE=os.getenv("DEMO_MODE", "true"))
+    baseline = startup_modules(env)
+    report = {}
+
+    for target in args.targets:
+        try:
+            runs = [measure(target, env, baseline) for _ in range(args.runs)]
+        except RuntimeError as e:
+            report[target] = {"error": str(e)}
+            continue
+
+        packages = runs[-1][1]
+        report[target] = {
+            "median_ms": statistics.median(total for total, _ in runs) / 1000,
+            "heaviest": sorted(((name, us / 1000) for name, us in packages.items()),
+                               key=lambda item: item[1], reverse=True)[:args.top]
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for target, result in report.items():
+        print(f"{target}")
+        if "error" in result:
+            print(f"  not importable here: {result['error']}")
+            continue
+        print(f"  cold import: {result['median_ms']:.1f} ms (median of {args.runs})")
+        for name, ms in result["heaviest"]:
+            print(f"    {name:<28} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
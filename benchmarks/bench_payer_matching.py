@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for insurance payer matching.
+
+Builds payer dictionaries of increasing size (the real alias file padded with
+synthetic plan names) and compares the original linear ``alias in text`` scan
+against the Aho–Corasick PayerMatcher on the same set of messages.
+
+Usage:
+    python benchmarks/bench_payer_matching.py --sizes 100 1000 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.payer_matcher import PayerMatcher, load_payer_aliases
+
+MESSAGES = [
+    "I have Blue Cross Blue Shield insurance, member ID 123456789",
+    "My insurance is through Aetna and my group number is 55012",
+    "It's untied healthcare I think",
+    "Kaiser Permanente, the card says member number K99812",
+    "I'm not sure who my carrier is, it's through my employer",
+    "medicare part b",
+]
+
+SYLLABLES = ["ac", "bel", "car", "dor", "en", "fal", "gra", "hol", "ix", "jun", "kel", "lor", "mir", "nov"]
+
+
+def synthetic_aliases(count, seed):
+    """Generate unique fake plan names such as "kelnov mirac health plan"."""
+    rng = random.Random(seed)
+    aliases = {}
+    while len(aliases) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(3)) + " " + \
+               "".join(rng.choice(SYLLABLES) for _ in range(2))
+        aliases[f"{name} health plan"] = name.title()
+    return aliases
+
+
+def linear_match(aliases, text):
+    """The original InsuranceAgent carrier scan, kept for comparison."""
+    text_lower = text.lower()
+    for alias, carrier in aliases.items():
+        if alias in text_lower:
+            return carrier
+    return None
+
+
+def time_per_message(match, repeat):
+    """Best-of-repeat average time per message in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in MESSAGES:
+            match(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6 / len(MESSAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark payer matching against dictionary size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Payer dictionary sizes')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic alias RNG seed')
+    parser.add_argument('--repeat', type=int, default=200, help='Timed passes over the messages')
+    args = parser.parse_args()
+
+    base_aliases = load_payer_aliases()
+
+    print(f"{'payers':>8} {'build ms':>10} {'linear us/msg':>15} {'automaton us/msg':>18}")
+    print("-" * 56)
+    for size in args.sizes:
+        # Real aliases go last so the linear scan has to walk the synthetic ones first
+        aliases = synthetic_aliases(max(size - len(base_aliases), 0), args.seed)
+        aliases.update(base_aliases)
+
+        start = time.perf_counter()
+        matcher = PayerMatcher(aliases)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        linear = time_per_message(lambda text: linear_match(aliases, text), args.repeat)
+        automaton = time_per_message(matcher.match, args.repeat)
+        print(f"{len(aliases):>8,} {build_ms:>10.1f} {linear:>15.1f} {automaton:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
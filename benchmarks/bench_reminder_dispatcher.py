@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the reminder dispatcher.
+
+Writes a reminders.csv with N pending reminders (a share of them already
+due, the rest spread over the next 30 days) to a temporary directory, then
+measures how long the dispatcher takes to load it, its memory footprint,
+how fast it drains the due reminders to a no-op sender, and the CPU it uses
+while idle with the rest of the reminders pending.
+
+Usage:
+    python benchmarks/bench_reminder_dispatcher.py --reminders 1000000 --due 100000
+"""
+
+from datetime import datetime
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from utils.reminder_dispatcher import ReminderDispatcher
+
+TYPES = ["initial", "form_check", "confirmation"]
+
+
+def write_reminders(path, count, due, seed_time):
+    """Write ``count`` scheduled reminders, the first ``due`` of them already due."""
+    offsets = pd.Series(range(count), dtype="int64")
+    # Due reminders fell due within the last hour; the rest are spread over the next 30 days
+    minutes = (offsets % (30 * 24 * 60) + 1).where(offsets >= due, -1 - offsets % 60)
+    pd.DataFrame({
+        "reminder_id": "APT" + offsets.astype(str) + "_7d",
+        "appointment_id": "APT" + offsets.astype(str),
+        "patient_id": "P" + (offsets % 50000).astype(str),
+        "reminder_datetime": (pd.Timestamp(seed_time) + pd.to_timedelta(minutes, unit="m")).dt.strftime("%Y-%m-%dT%H:%M:%S"),
+        "days_before": 7,
+        "type": [TYPES[i % 3] for i in range(count)],
+        "status": "scheduled",
+        "response": ""
+    }).to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the reminder dispatcher against pending reminder count')
+    parser.add_argument('--reminders', type=int, default=1000000, help='Pending reminders in the file')
+    parser.add_argument('--due', type=int, default=100000, help='How many of them are already due')
+    parser.add_argument('--idle-seconds', type=float, default=5.0, help='How long to measure idle CPU')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="reminder-bench-"), "reminders.csv")
+    write_reminders(path, args.reminders, args.due, datetime.now())
+    print(f"Wrote {args.reminders:,} reminders ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+    sent = []
+    drained = threading.Event()
+
+    def send_batch(reminders):
+        sent.append(len(reminders))
+        if sum(sent) >= args.due:
+            drained.set()
+        return [{"success": True}] * len(reminders)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    dispatcher = ReminderDispatcher(send_batch=send_batch, reminders_file=path)
+    start = time.perf_counter()
+    loaded = dispatcher.load()
+    load_seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Loaded {loaded:,} in {load_seconds:.2f}s (peak RSS +{(rss_after - rss_before) / 1024:.0f} MB)")
+
+    start = time.perf_counter()
+    dispatcher.start()
+    drained.wait(600)
+    drain_seconds = time.perf_counter() - start
+    print(f"Dispatched {sum(sent):,} due reminders in {drain_seconds:.2f}s "
+          f"({sum(sent) / drain_seconds:,.0f}/s, {len(sent)} sender batches)")
+
+    cpu_start = time.process_time()
+    time.sleep(args.idle_seconds)
+    idle_cpu = time.process_time() - cpu_start
+    stats = dispatcher.get_stats()
+    print(f"Idle with {stats['pending']:,} pending: {idle_cpu * 1000:.1f} ms CPU over {args.idle_seconds:.0f}s "
+          f"(next due {stats['next_due']})")
+
+    start = time.perf_counter()
+    dispatcher.add({"reminder_id": "new", "appointment_id": "APTnew", "patient_id": "P1",
+                    "reminder_datetime": datetime.now(), "type": "initial"})
+    while dispatcher.get_stats()["sent"] < args.due + 1 and time.perf_counter() - start < 10:
+        time.sleep(0.001)
+    print(f"Newly saved due reminder sent after {(time.perf_counter() - start) * 1000:.1f} ms")
+    dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
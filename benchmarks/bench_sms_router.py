@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark for handling a burst of inbound SMS replies.
+
+Writes synthetic patients.csv and reminders.csv files (every reminder "sent")
+to a temporary directory, then answers the same replies two ways: the old
+path (per reply, scan patients.csv for the number, scan reminders.csv for
+its open reminders and rewrite the file) and InboundSMSRouter (an indexed
+lookup per reply, with the statuses written in batches by the background
+flusher). The old path is timed on a sample and reported per reply.
+
+Usage:
+    python benchmarks/bench_sms_router.py --patients 20000 --replies 5000 --sample 50
+"""
+
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.database import Database, data_lock, write_data_file
+from utils.sms_router import InboundSMSRouter
+from utils.sms_service import normalize_phone
+
+
+class NoCancellations:
+    def cancel_appointments(self, appointment_ids):
+        return True
+
+
+def phone(i):
+    return f"(555) {i // 10000:03d}-{i % 10000:04d}"
+
+
+def write_data(db, patients):
+    pd.DataFrame({"patient_id": [f"P{i}" for i in range(patients)], "phone": [phone(i) for i in range(patients)]}
+                 ).to_csv(db.patients_file, index=False)
+    start = datetime(2030, 1, 1, 9)
+    rows = []
+    for i in range(patients):
+        for days_before in (7, 3):
+            rows.append({"reminder_id": f"R{i}-{days_before}", "appointment_id": f"APT{i}", "patient_id": f"P{i}",
+                         "reminder_datetime": (start - timedelta(days=days_before, minutes=i)).isoformat(),
+                         "days_before": days_before, "type": "initial", "status": "sent", "response": ""})
+    pd.DataFrame(rows).to_csv(db.reminders_file, index=False)
+
+
+def per_reply(db, from_phone, message):
+    with data_lock:
+        patients_df = pd.read_csv(db.patients_file, dtype=str)
+        patient_ids = patients_df.loc[patients_df["phone"].map(normalize_phone) == normalize_phone(from_phone),
+                                      "patient_id"]
+        reminders_df = pd.read_csv(db.reminders_file, dtype=str)
+        answered = reminders_df["patient_id"].isin(patient_ids) & (reminders_df["status"] == "sent")
+        reminders_df.loc[answered, "status"] = "confirmed"
+        reminders_df.loc[answered, "response"] = message
+        write_data_file(reminders_df, db.reminders_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark routing a burst of inbound SMS replies')
+    parser.add_argument('--patients', type=int, default=20000, help='Patients, each with two sent reminders')
+    parser.add_argument('--replies', type=int, default=5000, help='Replies in the burst')
+    parser.add_argument('--sample', type=int, default=50, help='Replies to time on the old per-reply path')
+    args = parser.parse_args()
+
+    senders = random.Random(7).sample(range(args.patients), args.replies)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(tmpdir)
+        write_data(db, args.patients)
+
+        print(f"{args.patients} patients, {args.patients * 2} sent reminders, {args.replies} replies")
+        print(f"{'approach':<30} {'seconds':>9} {'ms/reply':>9} {'replies/s':>10} {'writes':>7}")
+
+        start = time.perf_counter()
+        for i in senders[:args.sample]:
+            per_reply(db, phone(i), "YES")
+        elapsed = time.perf_counter() - start
+        print(f"{'scan + rewrite per reply':<30} {elapsed:>9.2f} {elapsed / args.sample * 1000:>9.2f} "
+              f"{args.sample / elapsed:>10.0f} {args.sample:>7}")
+
+        write_data(db, args.patients)
+        router = InboundSMSRouter()
+        router.db, router.calendar = db, NoCancellations()
+        router.start()
+        start = time.perf_counter()
+        for i in senders:
+            router.handle(phone(i), "YES")
+        answered = time.perf_counter() - start
+        router.stop()
+        elapsed = time.perf_counter() - start
+        stats = router.get_stats()
+        print(f"{'router, answered':<30} {answered:>9.2f} {answered / args.replies * 1000:>9.2f} "
+              f"{args.replies / answered:>10.0f} {'':>7}")
+        print(f"{'router, answered + written':<30} {elapsed:>9.2f} {elapsed / args.replies * 1000:>9.2f} "
+              f"{args.replies / elapsed:>10.0f} {stats['flushes']:>7}")
+        print(f"index loads: {stats['reloads']}, matched: {stats['matched']}")
+
+
+if __name__ == "__main__":
+    main()
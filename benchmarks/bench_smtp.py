@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for bulk email sending against a local SMTP stand-in.
+
+Starts MockSMTPServer with a simulated network round trip, then sends the
+same reminder emails two ways: the old path (a new connection, EHLO and
+login for every message, then MAIL/RCPT/DATA one command at a time) and
+EmailService.send_many over the connection pool with pipelining. Reports
+messages per second and how many connections each approach opened.
+
+Usage:
+    python benchmarks/bench_smtp.py --messages 200 --latency 0.02 --pool-size 4
+"""
+
+from email.mime.text import MIMEText
+import argparse
+import os
+import smtplib
+import sys
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.email_service import EmailService
+from utils.mock_smtp import MockSMTPServer
+from utils.smtp_pool import SMTPConnectionPool
+
+USER, PASSWORD = "clinic", "secret"
+
+
+def reminder_messages(count):
+    messages = []
+    for i in range(count):
+        msg = MIMEText(f"Reminder {i}: your appointment is tomorrow at 10:00 AM.", "plain")
+        msg["From"] = "clinic@example.com"
+        msg["To"] = f"patient{i}@example.com"
+        msg["Subject"] = "Appointment Reminder"
+        messages.append(msg)
+    return messages
+
+
+def per_message_connection(server, messages):
+    host, port = server.address
+    for msg in messages:
+        smtp = smtplib.SMTP(host, port)
+        smtp.login(USER, PASSWORD)
+        smtp.send_message(msg)
+        smtp.quit()
+    return len(messages)
+
+
+def pooled(server, messages, pool_size):
+    host, port = server.address
+    service = EmailService()
+    service.email_user, service.email_password = USER, PASSWORD
+    service.smtp_pool = SMTPConnectionPool(host, port, USER, PASSWORD, size=pool_size, starttls=False)
+    sent = sum(ok for _, ok in service.send_many(messages))
+    service.smtp_pool.close()
+    return sent
+
+
+def run(label, args, send):
+    server = MockSMTPServer(latency=args.latency, credentials=(USER, PASSWORD)).start()
+    messages = reminder_messages(args.messages)
+    start = time.perf_counter()
+    sent = send(server, messages)
+    elapsed = time.perf_counter() - start
+    server.stop()
+    print(f"{label:<28} {elapsed:>9.2f} {sent / elapsed:>9.1f} {sent:>6} {server.stats['connections']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled SMTP sending against a local SMTP stand-in')
+    parser.add_argument('--messages', type=int, default=200, help='Emails to send')
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated network round trip in seconds')
+    parser.add_argument('--pool-size', type=int, nargs='+', default=[1, 4], help='Pool sizes to compare')
+    args = parser.parse_args()
+
+    print(f"{args.messages} emails, {args.latency * 1000:.0f} ms round trip")
+    print(f"{'approach':<28} {'seconds':>9} {'msg/s':>9} {'sent':>6} {'connections':>11}")
+    run("connection per message", args, per_message_connection)
+    for size in args.pool_size:
+        run(f"pool of {size}, pipelined", args, lambda server, messages: pooled(server, messages, size))
+
+
+if __name__ == "__main__":
+    main()
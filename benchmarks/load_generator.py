@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Load generator for the conversation API (api_server.py).
+
+Each virtual patient opens a keep-alive connection, starts a session and
+plays a scripted booking conversation (greeting, patient details, slot
+selection, insurance). Reports turn throughput, latency percentiles, HTTP
+errors and completed bookings.
+
+Without --url an in-process server is started against the local data/
+directory (run generate_sample_data.py first, and use DEMO_MODE=true so no
+real LLM is called); bookings made by the run are written there.
+
+Usage:
+    DEMO_MODE=true python benchmarks/load_generator.py --sessions 200 --concurrency 16 --workers 4
+    python benchmarks/load_generator.py --url http://127.0.0.1:8000 --sessions 1000 --concurrency 64
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOCTORS = [("Smith", "Downtown"), ("Johnson", "Uptown"), ("Wilson", "Midtown"), ("Davis", "Westside"), ("Brown", "Eastside")]
+FIRST_NAMES = ["Avery", "Jordan", "Riley", "Casey", "Morgan", "Quinn", "Rowan", "Sawyer", "Emerson", "Harper"]
+LAST_NAMES = ["Lambert", "Okafor", "Nguyen", "Castillo", "Novak", "Haddad", "Lindqvist", "Moreau", "Tanaka", "Ibarra"]
+
+
+def conversation(index):
+    """Scripted messages for one virtual patient (unique name, rotating doctor)."""
+    doctor, location = DOCTORS[index % len(DOCTORS)]
+    name = f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]}{index}"
+    return [
+        "Hi, I need to schedule an appointment",
+        f"My name is {name}, date of birth 03/{index % 28 + 1:02d}/1985, I'd like to see Dr. {doctor} at {location} clinic",
+        "Option 1",
+        f"I have Aetna insurance, member ID {100000000 + index}, group number G{index:05d}",
+    ]
+
+
+class Results:
+    """Thread-safe collection of per-turn outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = {}
+        self.bookings = 0
+
+    def record(self, latency, status, booked):
+        with self.lock:
+            if status == 200:
+                self.latencies.append(latency)
+            else:
+                self.errors[status] = self.errors.get(status, 0) + 1
+            if booked:
+                self.bookings += 1
+
+
+def run_patient(base_url, index, results, think_seconds):
+    parsed = urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+
+    def request(method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+
+    try:
+        status, session = request("POST", "/sessions", {})
+        if status != 201:
+            results.record(0, status, False)
+            return
+        for message in conversation(index):
+            start = time.perf_counter()
+            status, reply = request("POST", f"/sessions/{session['session_id']}/messages", {"message": message})
+            booked = status == 200 and bool(reply["reply"].get("booking_complete"))
+            results.record(time.perf_counter() - start, status, booked)
+            if think_seconds:
+                time.sleep(think_seconds)
+    except (OSError, http.client.HTTPException) as e:
+        results.record(0, type(e).__name__, False)
+    finally:
+        connection.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive scripted booking conversations against the conversation API')
+    parser.add_argument('--url', default=None, help='Base URL of a running api_server.py (default: start one in-process)')
+    parser.add_argument('--sessions', type=int, default=200, help='Virtual patients to run')
+    parser.add_argument('--concurrency', type=int, default=16, help='Patients in flight at once')
+    parser.add_argument('--workers', type=int, default=4, help='Orchestrator pool size for the in-process server')
+    parser.add_argument('--think-ms', type=float, default=0, help='Pause between a patient\'s messages')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        from api_server import APIServer, ConversationAPI, OrchestratorPool
+        server = APIServer(ConversationAPI(OrchestratorPool(args.workers)), port=0,
+                           http_threads=max(args.concurrency, 1)).start()
+        base_url = server.base_url
+
+    results = Results()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for index in range(args.sessions):
+                pool.submit(run_patient, base_url, index, results, args.think_ms / 1000)
+    finally:
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            server.stop()
+
+    turns = len(results.latencies)
+    print(f"Sessions: {args.sessions} ({args.concurrency} concurrent) against {base_url}")
+    print(f"Turns: {turns:,} in {elapsed:.1f}s ({turns / elapsed * 60 if elapsed else 0:,.0f} turns/min)")
+    if turns:
+        print(f"Latency: mean {statistics.mean(results.latencies) * 1000:.1f} ms, "
+              f"p50 {percentile(results.latencies, 0.50) * 1000:.1f} ms, "
+              f"p95 {percentile(results.latencies, 0.95) * 1000:.1f} ms, "
+              f"p99 {percentile(results.latencies, 0.99) * 1000:.1f} ms")
+    print(f"Bookings completed: {results.bookings}")
+    if results.errors:
+        print(f"Errors: {results.errors}")
+
+
+if __name__ == "__main__":
+    main()
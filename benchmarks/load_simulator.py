@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+End-to-end load simulation of the scheduling conversation.
+
+Builds a throwaway data directory with generate_sample_data (patients,
+doctor schedules, an empty appointments book), then runs N synthetic
+patients through SchedulingOrchestrator with the mock LLM, C at a time, on
+a pool of orchestrator workers. Returning patients are drawn from the
+generated patient file and new patients are synthetic; each one greets,
+gives their details, picks one of the offered slots and provides insurance.
+
+Reports throughput, per-step latency percentiles, the booking conflict
+rate (slot picks that did not book, and slots booked twice) and how many
+times each data file was read and written. Use it to size API_WORKERS and
+to catch regressions between commits (--json for machine-readable output).
+
+Usage:
+    python benchmarks/load_simulator.py --sessions 200 --concurrency 16 --workers 4
+    python benchmarks/load_simulator.py --sessions 50 --returning 0.5 --json > run.json
+"""
+
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add the project root to the path
+sys.path.append(PROJECT_ROOT)
+
+# The simulation always runs against the mock LLM, with reference data from the project
+os.environ["DEMO_MODE"] = "true"
+os.environ.setdefault("INSURANCE_PAYERS_CSV", os.path.join(PROJECT_ROOT, "reference", "insurance_payers.csv"))
+
+import pandas as pd
+import generate_sample_data
+
+CARRIERS = ["Aetna", "Blue Cross Blue Shield", "Cigna", "Humana", "United Healthcare", "Kaiser Permanente"]
+NEW_FIRST_NAMES = ["Avery", "Jordan", "Riley", "Casey", "Morgan", "Quinn", "Rowan", "Sawyer", "Emerson", "Harper"]
+NEW_LAST_NAMES = ["Lambert", "Okafor", "Castillo", "Novak", "Haddad", "Lindqvist", "Moreau", "Tanaka", "Ibarra", "Quist"]
+DOCTOR_LOCATIONS = [("Smith", "Downtown"), ("Johnson", "Uptown"), ("Wilson", "Midtown"), ("Davis", "Westside"), ("Brown", "Eastside")]
+
+
+class FileIOCounter:
+    """Counts pandas reads and writes per data file while installed."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def _wrap(self, owner, name, kind):
+        original = getattr(owner, name)
+        self._originals[(owner, name)] = original
+        counter = self
+
+        def wrapper(*args, **kwargs):
+            target = args[1] if owner is pd.DataFrame else args[0]
+            if isinstance(target, (str, os.PathLike)):
+                path = os.fspath(target)
+                # Per-booking export files are counted together
+                name = "exports/*.xlsx" if os.path.dirname(path) == "exports" else os.path.basename(path)
+                # Data files are written to ".<name>.<random><ext>" and renamed into place
+                match = re.match(r"^\.(.+)\.\w+(\.\w+)$", name)
+                if match:
+                    name = match.group(1) + match.group(2)
+                with counter._lock:
+                    counter.counts[(kind, name)] += 1
+            return original(*args, **kwargs)
+
+        setattr(owner, name, wrapper)
+
+    def install(self):
+        self._wrap(pd, "read_csv", "read")
+        self._wrap(pd, "read_excel", "read")
+        self._wrap(pd.DataFrame, "to_csv", "write")
+        self._wrap(pd.DataFrame, "to_excel", "write")
+
+    def uninstall(self):
+        for (owner, name), original in self._originals.items():
+            setattr(owner, name, original)
+        self._originals.clear()
+
+
+def build_patients(count, returning_fraction, rng):
+    """Return scripted patient profiles, a mix of existing and new patients."""
+    existing = pd.read_csv("data/patients.csv", dtype=str).fillna("").to_dict("records")
+    patients = []
+    for index in range(count):
+        if existing and rng.random() < returning_fraction:
+            record = rng.choice(existing)
+            # Ask for the patient's preferred doctor at the clinic where that doctor works
+            doctor = record["preferred_doctor"]
+            location = dict(DOCTOR_LOCATIONS).get(doctor, record["location"])
+            patients.append({
+                "kind": "returning",
+                "name": record["name"],
+                "date_of_birth": record["date_of_birth"],
+                "doctor": doctor,
+                "location": location,
+                "carrier": record["insurance_carrier"] or rng.choice(CARRIERS),
+                "member_id": record["member_id"] or str(rng.randint(100000000, 999999999)),
+                "group_number": record["group_number"] or str(rng.randint(10000, 99999))
+            })
+        else:
+            doctor, location = rng.choice(DOCTOR_LOCATIONS)
+            patients.append({
+                "kind": "new",
+                "name": f"{rng.choice(NEW_FIRST_NAMES)} {rng.choice(NEW_LAST_NAMES)}{index}",
+                "date_of_birth": f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1945, 2005)}",
+                "doctor": doctor,
+                "location": location,
+                "carrier": rng.choice(CARRIERS),
+                "member_id": str(rng.randint(100000000, 999999999)),
+                "group_number": str(rng.randint(10000, 99999))
+            })
+    return patients
+
+
+def script_for(patient, rng, max_option):
+    """Messages one patient sends, in order."""
+    return [
+        rng.choice(["Hi, I need to schedule an appointment", "Hello, I'd like to book a visit", "Hi there"]),
+        f"My name is {patient['name']}, date of birth {patient['date_of_birth']}, "
+        f"I'd like to see Dr. {patient['doctor']} at {patient['location']} clinic",
+        f"Option {rng.randint(1, max_option)}",
+        f"I have {patient['carrier']} insurance, member ID {patient['member_id']}, group number {patient['group_number']}",
+    ]
+
+
+class SimulationStats:
+    """Per-step latencies and booking outcomes collected from all sessions."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = Counter()
+
+    def record_turn(self, step, seconds):
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def count(self, outcome):
+        with self.lock:
+            self.outcomes[outcome] += 1
+
+
+def run_session(api, patient, messages, stats, pick_retries=2):
+    session_id = api.start_session()["session_id"]
+    step = "greeting"
+    pending = list(messages)
+    while pending:
+        message = pending.pop(0)
+        start = time.perf_counter()
+        result = api.send_message(session_id, message)
+        stats.record_turn(step, time.perf_counter() - start)
+
+        new_step = result["state"]["current_step"]
+        if step == "scheduling" and message.startswith("Option"):
+            stats.count("slot_picks")
+            if new_step == "scheduling":
+                stats.count("slot_pick_rejected")
+                if pick_retries:
+                    # The rejection lists the slots still open; take the first of those
+                    pending.insert(0, "Option 1")
+                    pick_retries -= 1
+        if result["reply"].get("booking_complete"):
+            stats.count(f"booked_{patient['kind']}")
+        step = new_step
+
+    if step != "greeting":
+        stats.count(f"stalled_at_{step}")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def double_bookings():
+    """Number of (doctor, start time) pairs booked more than once."""
+    appointments = pd.read_excel("data/appointments.xlsx")
+    if appointments.empty:
+        return 0, 0
+    active = appointments[appointments["status"] != "cancelled"]
+    counts = active.groupby(["doctor", "datetime"]).size()
+    return int((counts > 1).sum()), len(active)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent booking conversations end to end')
+    parser.add_argument('--sessions', type=int, default=100, help='Synthetic patients to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='Sessions in flight at once')
+    parser.add_argument('--workers', type=int, default=4, help='Orchestrators in the worker pool')
+    parser.add_argument('--patients', type=int, default=50, help='Patients in the generated patient file')
+    parser.add_argument('--returning', type=float, default=0.4, help='Fraction of sessions by existing patients')
+    parser.add_argument('--max-option', type=int, default=3, help='Patients pick a slot between 1 and this number')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed for patients, scripts and the mock LLM')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary data directory')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    os.environ.setdefault("MOCK_LLM_SEED", str(args.seed))
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="load-sim-")
+    os.chdir(workdir)
+    os.makedirs("data", exist_ok=True)
+    with redirect_stdout(io.StringIO()):
+        generate_sample_data.generate_sample_patients(args.patients)
+        generate_sample_data.generate_doctors_schedule()
+        generate_sample_data.initialize_appointments_file()
+
+    from api_server import ConversationAPI, OrchestratorPool
+    from utils.job_queue import get_job_queue
+
+    patients = build_patients(args.sessions, args.returning, rng)
+    scripts = [script_for(patient, rng, args.max_option) for patient in patients]
+
+    api = ConversationAPI(OrchestratorPool(args.workers))
+    stats = SimulationStats()
+    io_counter = FileIOCounter()
+    io_counter.install()
+
+    start = time.perf_counter()
+    # Agent output (email/export notices) is noise here
+    with redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_session, api, patient, messages, stats)
+                       for patient, messages in zip(patients, scripts)]
+            errors = Counter(type(future.exception()).__name__ for future in futures if future.exception())
+        elapsed = time.perf_counter() - start
+
+        # Let the booking side effects finish so their file I/O is counted
+        job_queue = get_job_queue()
+        drain_deadline = time.time() + 120
+        while job_queue.get_stats()["pending"] + job_queue.get_stats()["running"] and time.time() < drain_deadline:
+            time.sleep(0.1)
+
+    io_counter.uninstall()
+    doubled, active_appointments = double_bookings()
+
+    turns = sum(len(values) for values in stats.latencies.values())
+    bookings = stats.outcomes["booked_new"] + stats.outcomes["booked_returning"]
+    slot_picks = stats.outcomes["slot_picks"]
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "turns": turns,
+        "turns_per_second": round(turns / elapsed, 2) if elapsed else 0,
+        "bookings": bookings,
+        "bookings_by_kind": {"new": stats.outcomes["booked_new"], "returning": stats.outcomes["booked_returning"]},
+        "steps": {step: {
+            "turns": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2)
+        } for step, values in stats.latencies.items()},
+        "conflicts": {
+            "slot_picks": slot_picks,
+            "rejected_picks": stats.outcomes["slot_pick_rejected"],
+            "conflict_rate": round(stats.outcomes["slot_pick_rejected"] / slot_picks, 4) if slot_picks else 0.0,
+            "double_booked_slots": doubled,
+            "active_appointments": active_appointments
+        },
+        "stalled": {key[len("stalled_at_"):]: value for key, value in stats.outcomes.items() if key.startswith("stalled_at_")},
+        "file_io": {f"{kind} {name}": count for (kind, name), count in sorted(io_counter.counts.items())},
+        "jobs": job_queue.get_stats(),
+        "errors": dict(errors),
+        "workdir": workdir if args.keep else None
+    }
+
+    if not args.keep:
+        job_queue.stop()
+        os.chdir(PROJECT_ROOT)
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Sessions: {args.sessions} ({args.concurrency} concurrent, {args.workers} workers)")
+    print(f"Turns: {turns:,} in {elapsed:.1f}s ({report['turns_per_second']:.1f} turns/s, "
+          f"{report['turns_per_second'] * 60:,.0f} turns/min)")
+    print(f"Bookings: {bookings} (new {stats.outcomes['booked_new']}, returning {stats.outcomes['booked_returning']})")
+    print()
+    print(f"{'step':<22} {'turns':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, row in report["steps"].items():
+        print(f"{step:<22} {row['turns']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}")
+    print()
+    conflicts = report["conflicts"]
+    print(f"Slot picks: {conflicts['slot_picks']}, rejected {conflicts['rejected_picks']} "
+          f"({conflicts['conflict_rate']:.1%}); double-booked slots: {conflicts['double_booked_slots']} "
+          f"of {conflicts['active_appointments']} appointments")
+    if report["stalled"]:
+        print(f"Sessions not finished, by step: {report['stalled']}")
+    print()
+    print("File I/O:")
+    for name, count in report["file_io"].items():
+        print(f"  {name:<32} {count:>7,}")
+    print(f"Background jobs: {report['jobs']}")
+    if errors:
+        print(f"Errors: {dict(errors)}")
+    if args.keep:
+        print(f"Data kept in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,16 @@ load_dotenv()
 
 # API Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. a local MockOpenAIServer for load tests
 CALENDLY_API_KEY = os.getenv("CALENDLY_API_KEY")
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")  # e.g. a local MockTwilioServer for load tests
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "true").lower() == "true"
 
 # Business Rules
 NEW_PATIENT_DURATION = 60  # minutes
@@ -22,6 +25,7 @@ PATIENTS_CSV = "data/patients.csv"
 DOCTORS_SCHEDULE_XLSX = "data/doctors_schedule.xlsx"
 APPOINTMENTS_XLSX = "data/appointments.xlsx"
 INTAKE_FORM_PDF = "forms/intake_form_template.pdf"
+INSURANCE_PAYERS_CSV = os.getenv("INSURANCE_PAYERS_CSV", "reference/insurance_payers.csv")
 
 # Reminder Schedule (days before appointment)
 REMINDER_SCHEDULE = [7, 3, 1]
@@ -31,6 +35,98 @@ LLM_MODEL = "gpt-3.5-turbo"
 LLM_TEMPERATURE = 0.1
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"
 
+# Mock LLM benchmarking (seeded responses and simulated latency in DEMO_MODE)
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED")) if os.getenv("MOCK_LLM_SEED") else None
+MOCK_LLM_TTFT_MS = float(os.getenv("MOCK_LLM_TTFT_MS", "0"))
+MOCK_LLM_TTFT_JITTER_MS = float(os.getenv("MOCK_LLM_TTFT_JITTER_MS", "0"))
+MOCK_LLM_PER_TOKEN_MS = float(os.getenv("MOCK_LLM_PER_TOKEN_MS", "0"))
+MOCK_LLM_TAIL_PROBABILITY = float(os.getenv("MOCK_LLM_TAIL_PROBABILITY", "0"))
+MOCK_LLM_TAIL_MULTIPLIER = float(os.getenv("MOCK_LLM_TAIL_MULTIPLIER", "1"))
+
+# LLM Request Batching (coalesces concurrent calls into one generate())
+LLM_BATCHING_ENABLED = os.getenv("LLM_BATCHING_ENABLED", "false").lower() == "true"
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+LLM_BATCH_MAX_WAIT_MS = float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "5"))
+LLM_BATCH_MAX_CONCURRENT = int(os.getenv("LLM_BATCH_MAX_CONCURRENT", "8"))  # batches in flight at once
+
+# LLM Resilience (deadlines, retries, hedging, circuit breaker)
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").lower() == "true"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# Background Jobs (confirmation side effects run after the reply is returned)
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "true").lower() == "true"
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "data/jobs.db")
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # renewed while the job runs; retried this long after a worker dies
+
+# Session Store (conversation state shared by one stateless orchestrator)
+SESSION_DB = os.getenv("SESSION_DB", "data/sessions.db")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+TURN_RESULTS_KEPT = int(os.getenv("TURN_RESULTS_KEPT", "8"))  # replies kept per session for resubmitted turns
+TURN_LOG = os.getenv("TURN_LOG")  # e.g. data/turn_log.jsonl: append-only log of every turn, replayable
+
+# Conversation API (api_server.py)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+API_HTTP_THREADS = int(os.getenv("API_HTTP_THREADS", "32"))
+API_WORKER_TIMEOUT_SECONDS = float(os.getenv("API_WORKER_TIMEOUT_SECONDS", "30"))
+
+# Tracing (per-turn timing spans for step handlers, LLM calls and data I/O)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_LOG = os.getenv("TRACE_LOG")  # e.g. data/traces.jsonl to keep every turn's trace
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+# Multi-process Data Access (several API/Streamlit processes sharing data/)
+MULTIPROCESS_DATA = os.getenv("MULTIPROCESS_DATA", "false").lower() == "true"
+DATA_LOCK_FILE = os.getenv("DATA_LOCK_FILE", "data/.data.lock")
+DATA_GENERATION_FILE = os.getenv("DATA_GENERATION_FILE", "data/.generations.json")
+
+# Availability Prefetch (slots computed in the background between lookup and scheduling)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "60"))
+
+# Reminder Dispatcher (sends reminders when they fall due; see utils/reminder_dispatcher.py)
+REMINDER_DISPATCHER_ENABLED = os.getenv("REMINDER_DISPATCHER_ENABLED", "false").lower() == "true"  # run inside api_server
+REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", "4"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))  # most reminders taken off the heap per wakeup
+REMINDER_RESCAN_SECONDS = float(os.getenv("REMINDER_RESCAN_SECONDS", "30"))  # standalone daemon: reminders.csv check interval
+
+# Bulk SMS (concurrent, rate-limited sends through SMSService)
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", "8"))
+SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", "10"))  # the sending number's messages-per-second limit
+SMS_MAX_RETRIES = int(os.getenv("SMS_MAX_RETRIES", "3"))  # retries after a 429 or 5xx response
+SMS_BACKOFF_SECONDS = float(os.getenv("SMS_BACKOFF_SECONDS", "0.5"))
+
+# SMTP Connection Pool (persistent logged-in connections shared by EmailService)
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_CHECK_SECONDS = float(os.getenv("SMTP_IDLE_CHECK_SECONDS", "30"))  # NOOP a connection idle this long before reuse
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "500"))
+
+# Outbox (durable queue that email and SMS go through; see utils/outbox.py)
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+OUTBOX_DB = os.getenv("OUTBOX_DB", "data/outbox.db")
+OUTBOX_EMAIL_WORKERS = int(os.getenv("OUTBOX_EMAIL_WORKERS", str(SMTP_POOL_SIZE)))  # one per pooled SMTP connection
+OUTBOX_SMS_WORKERS = int(os.getenv("OUTBOX_SMS_WORKERS", str(SMS_WORKERS)))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))  # then the message is dead-lettered
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))  # above the worst-case send: 2 SMTP attempts x 30 s timeout + pool wait
+
+# Inbound SMS (replies posted to /sms/inbound; see utils/sms_router.py)
+SMS_ROUTER_FLUSH_SECONDS = float(os.getenv("SMS_ROUTER_FLUSH_SECONDS", "0.5"))  # how long replies wait to be written together
+SMS_ROUTER_BATCH_SIZE = int(os.getenv("SMS_ROUTER_BATCH_SIZE", "200"))  # write early once this many are waiting
+SMS_WEBHOOK_URL = os.getenv("SMS_WEBHOOK_URL")  # public URL Twilio posts to, if it differs from the Host header's
+
 # Streamlit Configuration
 APP_TITLE = "AI Medical Scheduling Agent"
 APP_DESCRIPTION = "Automated appointment scheduling with AI assistance"
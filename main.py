@@ -1,14 +1,39 @@
 import streamlit as st
 import sys
 import os
+import time
+import uuid
 
 # Add the project root to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from agents.orchestrator import SchedulingOrchestrator
-from utils.database import Database
+from utils.job_queue import get_job_queue
+from utils.outbox import get_outbox
+from utils.session_store import get_session_store
+from utils.turn_log import get_turn_log
 import config
 
+JOB_LABELS = {
+    "confirmation_email": "Confirmation email",
+    "email": "Confirmation email",
+    "excel_export": "Excel report",
+    "schedule_reminders": "Reminders",
+    "sms": "Text message"
+}
+JOB_STATUS_ICONS = {"pending": "⏳ queued", "running": "⏳ in progress", "succeeded": "✅ done", "failed": "❌ failed"}
+
+@st.cache_resource
+def get_orchestrator() -> SchedulingOrchestrator:
+    """One stateless orchestrator shared by every browser session."""
+    return SchedulingOrchestrator()
+
+def get_session_id() -> str:
+    """Session ID kept in the URL so a reload or server restart resumes the conversation."""
+    if "session" not in st.query_params:
+        st.query_params["session"] = uuid.uuid4().hex
+    return st.query_params["session"]
+
 def main():
     st.set_page_config(
         page_title=config.APP_TITLE,
@@ -19,27 +44,39 @@ def main():
     st.title("🏥 AI Medical Scheduling Agent")
     st.markdown(config.APP_DESCRIPTION)
     
-    # Initialize session state
+    # Conversation state lives in the session store; only the chat transcript is kept per browser session
+    session_id = get_session_id()
+    session_store = get_session_store()
     if "messages" not in st.session_state:
         st.session_state.messages = []
-        st.session_state.orchestrator = SchedulingOrchestrator()
-        st.session_state.patient_data = {}
-        st.session_state.appointment_data = {}
+    
+    state = session_store.get_or_create(session_id)
     
     # Sidebar with patient info
     with st.sidebar:
         st.header("📋 Current Session")
-        if st.session_state.patient_data:
-            st.json(st.session_state.patient_data)
+        if state.patient_info:
+            st.json(state.patient_info)
         
-        if st.session_state.appointment_data:
+        if state.appointment_info:
             st.header("📅 Appointment Details")
-            st.json(st.session_state.appointment_data)
+            st.json(state.appointment_info)
+        
+        if st.session_state.get("booking_jobs"):
+            st.header("📨 Booking Follow-up")
+            job_status = {}
+            if config.JOB_QUEUE_ENABLED:
+                job_status.update(get_job_queue().get_group_status(st.session_state.booking_jobs))
+            if config.OUTBOX_ENABLED:
+                job_status.update(get_outbox().get_group_status(st.session_state.booking_jobs))
+            for job_type, status in job_status.items():
+                st.write(f"{JOB_LABELS.get(job_type, job_type)}: {JOB_STATUS_ICONS.get(status, status)}")
+            if st.button("Refresh status"):
+                st.rerun()
         
         if st.button("🔄 Reset Session"):
             st.session_state.messages = []
-            st.session_state.patient_data = {}
-            st.session_state.appointment_data = {}
+            session_store.delete(session_id)
             st.rerun()
     
     # Chat interface
@@ -62,20 +99,18 @@ def main():
             # Process with orchestrator
             with st.chat_message("assistant"):
                 with st.spinner("Processing..."):
-                    response = st.session_state.orchestrator.process_message(
-                        prompt, 
-                        st.session_state.patient_data,
-                        st.session_state.appointment_data
-                    )
+                    start = time.perf_counter()
+                    # No turn ID: chat_input delivers each submission to one run only, and an ID derived from the
+                    # transcript would repeat after a page reload and replay an old reply from turn_results
+                    new_state, response = get_orchestrator().process_turn(state, prompt)
+                    session_store.put(session_id, new_state)
+                    get_turn_log().append(session_id, None, state.current_step, prompt, new_state.current_step,
+                                          (time.perf_counter() - start) * 1000)
                     
                     st.markdown(response["message"])
                     
-                    # Update session data
-                    if "patient_data" in response:
-                        st.session_state.patient_data.update(response["patient_data"])
-                    
-                    if "appointment_data" in response:
-                        st.session_state.appointment_data.update(response["appointment_data"])
+                    if response.get("booking_jobs"):
+                        st.session_state.booking_jobs = response["booking_jobs"]
                     
                     # Add assistant message to chat
                     st.session_state.messages.append({
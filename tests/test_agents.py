@@ -1,7 +1,12 @@
 import unittest
 import sys
 import os
-from datetime import datetime
+import tempfile
+import json
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime, timedelta
 
 # Add the parent directory to the path so we can import the agents
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -10,7 +15,19 @@ from agents.greeting_agent import GreetingAgent
 from agents.lookup_agent import LookupAgent
 from agents.scheduling_agent import SchedulingAgent
 from agents.insurance_agent import InsuranceAgent
+from agents.orchestrator import SchedulingOrchestrator
+from agents.reminder_agent import ReminderAgent
+from utils.calendar_integration import CalendarIntegration
 from utils.database import Database
+from utils.llm_resilience import ResilientLLM, CircuitBreaker
+from utils.mock_llm import FaultInjectingChatModel
+from utils.job_queue import JobQueue
+from utils.outbox import Outbox
+from utils.session_store import ConversationState, SessionStore
+from utils.tracing import get_trace_recorder
+from utils.turn_log import TurnLog, read_turn_log, sessions_from_log
+from agents.orchestrator import TRANSITIONS, AUTOMATIC_STEPS, MESSAGE, ENTERED
+from api_server import APIServer, ConversationAPI, OrchestratorPool
 
 class TestGreetingAgent(unittest.TestCase):
     """Test cases for the GreetingAgent."""
@@ -52,13 +69,26 @@ class TestGreetingAgent(unittest.TestCase):
         result = self.agent.process(user_input, complete_data)
         
         self.assertTrue(result["is_complete"])
+    
+    def test_fallback_when_llm_unavailable(self):
+        """Test template response when the circuit breaker is open."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        self.agent.llm = ResilientLLM(FaultInjectingChatModel(), breaker=breaker)
+        
+        result = self.agent.process("My name is John Smith", {})
+        
+        self.assertIn("date of birth", result["message"])
+        self.assertEqual(result["extracted_data"].get("name"), "John Smith")
 
 class TestLookupAgent(unittest.TestCase):
     """Test cases for the LookupAgent."""
     
     def setUp(self):
+        # A private copy of the data files, so records created here don't leak into later runs
+        self.database = Database(tempfile.mkdtemp())
         self.agent = LookupAgent()
-        self.database = Database()
+        self.agent.db = self.database
     
     def test_new_patient_detection(self):
         """Test new patient detection."""
@@ -90,12 +120,37 @@ class TestLookupAgent(unittest.TestCase):
         
         # Should create new patient if not found
         self.assertIsNotNone(result["patient_id"])
+    
+    def test_repeated_lookup_does_not_duplicate_patient(self):
+        """Test that looking the same new patient up twice creates one record."""
+        patient_data = {
+            "name": "Repeat Lookup",
+            "date_of_birth": "03/03/1993",
+            "preferred_doctor": "Smith",
+            "location": "Downtown"
+        }
+        
+        first = self.agent.process(dict(patient_data))
+        second = self.agent.process(dict(patient_data))
+        
+        self.assertEqual(first["patient_type"], "new")
+        self.assertEqual(second["patient_type"], "returning")
+        self.assertEqual(len(self.database.search_patient("Repeat Lookup", "03/03/1993")), 1)
 
 class TestSchedulingAgent(unittest.TestCase):
     """Test cases for the SchedulingAgent."""
     
     def setUp(self):
-        self.agent = SchedulingAgent()
+        # A private data directory, so the slots booked here don't leak into ./data or later runs
+        self.data_dir = tempfile.mkdtemp()
+        self.agent = self._agent()
+    
+    def _agent(self):
+        agent = SchedulingAgent()
+        agent.db = Database(self.data_dir)
+        agent.calendar = CalendarIntegration(self.data_dir)
+        agent.prefetcher = None
+        return agent
     
     def test_available_slots_generation(self):
         """Test available slots generation."""
@@ -116,9 +171,39 @@ class TestSchedulingAgent(unittest.TestCase):
         self.assertIn("available_slots", result)
     
     def test_slot_selection(self):
-        """Test appointment slot selection."""
-        # This would test the slot selection logic
-        pass
+        """Test that a pick resolves against the offered slots without another calendar scan."""
+        patient_data = {"name": "Test Patient", "preferred_doctor": "Johnson", "location": "Uptown"}
+        appointment_data = {"appointment_duration": 30}
+        
+        offer = self.agent.process("Which times are free?", patient_data, appointment_data, use_llm=False)["slot_offer"]
+        self.assertTrue(offer["slots"])
+        self.assertIsNotNone(offer["etag"])
+        
+        self.agent.calendar.get_available_slots = lambda **kwargs: self.fail("selection rescanned the calendar")
+        result = self.agent.process("Option 2", patient_data, appointment_data, slot_number=2, use_llm=False,
+                                    slot_offer=offer)
+        
+        self.assertTrue(result["booking_successful"])
+        self.assertEqual(result["appointment_details"]["datetime"], offer["slots"][1]["datetime"])
+    
+    def test_taken_slot_is_offered_again_fresh(self):
+        """Test that a slot booked by another session since it was offered is rejected."""
+        patient_data = {"name": "Test Patient", "preferred_doctor": "Wilson", "location": "Midtown"}
+        appointment_data = {"appointment_duration": 60}
+        offer = self.agent.process("Which times are free?", patient_data, appointment_data, use_llm=False)["slot_offer"]
+        
+        other_session = self._agent()
+        taken = other_session.process("1", patient_data, appointment_data, slot_number=1, use_llm=False,
+                                      slot_offer=offer)
+        self.assertTrue(taken["booking_successful"])
+        
+        result = self.agent.process("1", patient_data, appointment_data, slot_number=1, use_llm=False,
+                                    slot_offer=offer)
+        
+        self.assertNotIn("booking_successful", result)
+        self.assertIn("no longer available", result["message"])
+        self.assertNotIn(offer["slots"][0]["datetime"], [slot["datetime"] for slot in result["slot_offer"]["slots"]])
+        self.assertNotEqual(result["slot_offer"]["etag"], offer["etag"])
 
 class TestInsuranceAgent(unittest.TestCase):
     """Test cases for the InsuranceAgent."""
@@ -157,7 +242,7 @@ class TestDatabase(unittest.TestCase):
     """Test cases for the Database utility."""
     
     def setUp(self):
-        self.db = Database()
+        self.db = Database(tempfile.mkdtemp())
     
     def test_patient_creation(self):
         """Test patient record creation."""
@@ -189,12 +274,89 @@ class TestDatabase(unittest.TestCase):
         self.assertTrue(appointment_id.startswith("APT"))
         self.assertEqual(len(appointment_id), 17)  # APT + 8 digits + 6 chars
 
+class TestReminderAgent(unittest.TestCase):
+    """Test cases for the ReminderAgent."""
+    
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.agent = ReminderAgent()
+        self.agent.db = self.db = Database(temp_dir)
+        # Not started: the tests look at what was queued, nothing is delivered
+        self.agent.outbox = Outbox(db_path=os.path.join(temp_dir, "outbox.db"), channel_workers={})
+    
+    def _book(self, patient_id, status="confirmed"):
+        appointment_id = self.db.generate_appointment_id()
+        appointment_time = datetime.now() + timedelta(days=8)
+        self.db.save_appointment({
+            "appointment_id": appointment_id,
+            "patient_id": patient_id,
+            "doctor": "Smith",
+            "datetime": appointment_time,
+            "duration": 30,
+            "location": "Downtown",
+            "status": status,
+            "created_at": datetime.now()
+        })
+        reminders = self.agent.schedule_reminders({"appointment_id": appointment_id, "datetime": appointment_time},
+                                                  {"patient_id": patient_id})["scheduled_reminders"]
+        return reminders[0]
+    
+    def test_send_due_reminders_in_one_pass(self):
+        """Test that a batch is resolved with joined lookups and its statuses written together."""
+        patient_id = self.db.create_patient_record({"name": "Batch Reminder", "date_of_birth": "02/02/1992",
+                                                    "email": "batch@example.com", "phone": "(555) 123-4567"})
+        confirmed = self._book(patient_id)
+        cancelled = self._book(patient_id, status="cancelled")
+        missing = dict(confirmed, reminder_id="missing_7d", appointment_id="APT-MISSING")
+        
+        def unexpected(*args):
+            raise AssertionError("per-reminder lookup used")
+        self.db.get_appointment = self.db.get_patient = unexpected
+        
+        results = self.agent.send_due_reminders([confirmed, cancelled, missing])
+        
+        self.assertTrue(results[0]["success"])
+        self.assertTrue(results[0]["email_sent"] and results[0]["sms_sent"])
+        self.assertEqual(results[0]["reminder_type"], "initial")
+        self.assertFalse(results[1]["success"])
+        self.assertFalse(results[2]["success"])
+        
+        import pandas as pd
+        statuses = pd.read_csv(self.db.reminders_file).set_index("reminder_id")["status"]
+        self.assertEqual(statuses[confirmed["reminder_id"]], "sent")
+        self.assertEqual(statuses[cancelled["reminder_id"]], "cancelled")
+    
+    def test_undelivered_reminder_is_marked_failed(self):
+        """Test that a reminder neither channel delivered is reported and stored as failed, not sent."""
+        class DownEmail:
+            def send_reminder_emails(self, emails):
+                return [False] * len(emails)
+        
+        class DownSMS:
+            def send_bulk_reminders(self, messages):
+                return {"results": [False] * len(messages)}
+        
+        patient_id = self.db.create_patient_record({"name": "Unreachable Patient", "date_of_birth": "03/03/1993",
+                                                    "email": "down@example.com", "phone": "(555) 765-4321"})
+        reminder = self._book(patient_id)
+        self.agent.outbox = None
+        self.agent.email_service, self.agent.sms_service = DownEmail(), DownSMS()
+        
+        result = self.agent.send_due_reminders([reminder])[0]
+        
+        self.assertFalse(result["success"])
+        self.assertIn("error", result)
+        import pandas as pd
+        statuses = pd.read_csv(self.db.reminders_file).set_index("reminder_id")["status"]
+        self.assertEqual(statuses[reminder["reminder_id"]], "failed")
+
 class TestWorkflow(unittest.TestCase):
     """Test cases for the complete workflow."""
     
     def setUp(self):
         self.greeting_agent = GreetingAgent()
         self.lookup_agent = LookupAgent()
+        self.lookup_agent.db = Database(tempfile.mkdtemp())
         self.scheduling_agent = SchedulingAgent()
         self.insurance_agent = InsuranceAgent()
     
@@ -217,6 +379,263 @@ class TestWorkflow(unittest.TestCase):
             self.assertIsNotNone(lookup_result["patient_id"])
             self.assertIn(lookup_result["patient_type"], ["new", "returning"])
 
+class TestOrchestrator(unittest.TestCase):
+    """Test cases for the SchedulingOrchestrator routing."""
+    
+    def setUp(self):
+        # Private data files and a job queue without workers, instead of ./data and the shared queue
+        self.temp_dir = tempfile.mkdtemp()
+        self.job_queue = JobQueue(db_path=os.path.join(self.temp_dir, "jobs.db"), workers=0)
+        self.orchestrator = SchedulingOrchestrator(job_queue=self.job_queue)
+        database = Database(self.temp_dir)
+        self.orchestrator.lookup_agent.db = database
+        self.orchestrator.scheduling_agent.db = database
+        self.orchestrator.scheduling_agent.calendar = CalendarIntegration(self.temp_dir)
+        self.orchestrator.scheduling_agent.prefetcher = None
+        self.orchestrator.reminder_agent.db = database
+        self.orchestrator.reminder_agent.outbox = None
+    
+    def test_cancel_resets_conversation(self):
+        """Test that a cancel request is handled locally and resets state."""
+        self.orchestrator.process_message("My name is Jane Roe", {}, {})
+        result = self.orchestrator.process_message("cancel", {}, {})
+        
+        self.assertTrue(result["session_reset"])
+        self.assertEqual(self.orchestrator.current_step, "greeting")
+        self.assertEqual(self.orchestrator.collected_data["patient_info"], {})
+    
+    def test_outbox_is_built_on_first_booking(self):
+        """Test that creating an orchestrator does not open the outbox or start its workers."""
+        self.assertNotIn("outbox", vars(self.orchestrator))
+        self.orchestrator.process_message("My name is Jane Roe", {}, {})
+        self.assertNotIn("outbox", vars(self.orchestrator))
+    
+    def test_confirmation_queues_side_effects(self):
+        """Test that confirmation replies at once and leaves side effects to the job queue and outbox."""
+        job_queue = self.job_queue
+        outbox = Outbox(db_path=os.path.join(self.temp_dir, "outbox.db"), channel_workers={})
+        self.orchestrator.outbox = outbox
+        for job_type in ("confirmation_email", "excel_export", "schedule_reminders"):
+            job_queue.register(job_type, lambda payload: True)
+        
+        state = ConversationState(
+            current_step="confirmation",
+            patient_info={"name": "Jane Roe", "email": "jane@example.com"},
+            insurance_info={"insurance_carrier": "Aetna", "member_id": "123456789"},
+            appointment_info={"appointment_id": "APT9001", "datetime": datetime.now() + timedelta(days=10)}
+        )
+        result = self.orchestrator._handle_confirmation(state)
+        
+        self.assertTrue(result["booking_complete"])
+        self.assertEqual(result["booking_jobs"], "APT9001")
+        self.assertEqual(set(job_queue.get_group_status("APT9001").values()), {"pending"})
+        self.assertEqual(outbox.get_group_status("APT9001"), {"email": "pending"})
+        
+        self.assertEqual(job_queue.run_pending(), 2)
+        self.assertEqual(set(job_queue.get_group_status("APT9001").values()), {"succeeded"})
+    
+    def test_process_turn_keeps_sessions_apart(self):
+        """Test that one orchestrator serves interleaved sessions without sharing state."""
+        first = ConversationState()
+        second = ConversationState()
+        
+        first_after, _ = self.orchestrator.process_turn(first, "My name is Jane Roe")
+        second_after, _ = self.orchestrator.process_turn(second, "My name is John Doe")
+        
+        self.assertEqual(first_after.patient_info["name"], "Jane Roe")
+        self.assertEqual(second_after.patient_info["name"], "John Doe")
+        self.assertEqual(first.patient_info, {})
+        
+        restored = ConversationState.from_dict(first_after.to_dict())
+        reset_state, result = self.orchestrator.process_turn(restored, "start over")
+        self.assertTrue(result["session_reset"])
+        self.assertEqual(reset_state, ConversationState())
+
+    def test_transition_table_covers_every_step(self):
+        """Every step a transition leads to should have a handler for its entry event."""
+        steps = {next_step for _, next_step in TRANSITIONS.values()}
+        for step in steps:
+            event = ENTERED if step in AUTOMATIC_STEPS else MESSAGE
+            self.assertIn((step, event), TRANSITIONS)
+            handler_name, _ = TRANSITIONS[(step, event)]
+            self.assertTrue(callable(getattr(self.orchestrator, handler_name)))
+    
+    def test_turn_records_step_spans(self):
+        """A turn that completes the greeting should trace the greeting and lookup handlers."""
+        self.orchestrator.lookup_agent.process = lambda patient_info: {
+            "message": "Welcome back!", "patient_type": "returning",
+            "patient_id": "P1", "appointment_duration": 30
+        }
+        state = ConversationState(patient_info={
+            "name": "Jane Roe", "date_of_birth": "01/15/1990", "preferred_doctor": "Smith"
+        })
+        
+        new_state, result = self.orchestrator.process_turn(state, "Downtown location please")
+        trace = get_trace_recorder().recent(1)[0]
+        handler_spans = [span.name for span in trace.root.children if span.category == "handler"]
+        
+        self.assertEqual(new_state.current_step, "scheduling")
+        self.assertTrue(result["message"].endswith("Welcome back!"))
+        self.assertEqual(handler_spans, ["step.greeting", "step.lookup"])
+        self.assertNotIn("step_complete", result)
+    
+    def test_lookup_prefetches_slots_for_scheduling(self):
+        """Lookup should start the slot scan the scheduling turn then picks up."""
+        prefetched = {}
+        
+        class RecordingPrefetcher:
+            def prefetch(self, doctor, location, duration, days_ahead=14):
+                prefetched[(doctor, location, duration)] = [{"datetime": datetime(2030, 1, 7, 9, 0)}]
+            
+            def get(self, doctor, location, duration, days_ahead=14):
+                return prefetched.get((doctor, location, duration))
+        
+        agent = self.orchestrator.scheduling_agent
+        agent.prefetcher = RecordingPrefetcher()
+        agent.calendar.get_available_slots = lambda **kwargs: self.fail("scheduling scanned the calendar")
+        self.orchestrator.lookup_agent.process = lambda patient_info: {
+            "message": "Welcome!", "patient_type": "new", "patient_id": None, "appointment_duration": 60
+        }
+        state = ConversationState(current_step="lookup", patient_info={
+            "name": "Jane Roe", "preferred_doctor": "Smith", "location": "Downtown"
+        })
+        
+        self.orchestrator._handle_lookup(state)
+        self.assertIn(("Smith", "Downtown", 60), prefetched)
+        
+        result = agent.process("Which times are free?", state.patient_info, state.appointment_info, use_llm=False)
+        self.assertEqual(len(result["available_slots"]), 1)
+
+class TestConversationAPI(unittest.TestCase):
+    """Test cases for the HTTP/JSON conversation API."""
+    
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        job_queue = JobQueue(db_path=os.path.join(temp_dir, "jobs.db"), workers=0)
+        pool = OrchestratorPool(2, factory=lambda: SchedulingOrchestrator(job_queue=job_queue))
+        self.api = ConversationAPI(pool, SessionStore(db_path=os.path.join(temp_dir, "sessions.db")))
+        self.server = APIServer(self.api, port=0, http_threads=4).start()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def _call(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.server.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+    
+    def test_session_round_trip(self):
+        """Test starting a session, sending a message and reading the state back."""
+        status, started = self._call("POST", "/sessions", {})
+        self.assertEqual(status, 201)
+        session_id = started["session_id"]
+        
+        status, turn = self._call("POST", f"/sessions/{session_id}/messages", {"message": "My name is Jane Roe"})
+        self.assertEqual(status, 200)
+        self.assertIn("message", turn["reply"])
+        self.assertEqual(turn["state"]["patient_info"]["name"], "Jane Roe")
+        
+        status, current = self._call("GET", f"/sessions/{session_id}")
+        self.assertEqual(status, 200)
+        self.assertEqual(current["state"], turn["state"])
+    
+    def test_request_errors(self):
+        """Test unknown sessions, missing messages, bad trace limits and unknown routes."""
+        self.assertEqual(self._call("GET", "/sessions/missing")[0], 404)
+        self.assertEqual(self._call("POST", "/sessions/abc/messages", {})[0], 400)
+        self.assertEqual(self._call("GET", "/nowhere")[0], 404)
+        for limit in ("abc", "-1", "0"):
+            status, error = self._call("GET", f"/traces?limit={limit}")
+            self.assertEqual(status, 400)
+            self.assertIn("limit", error["error"])
+        self.assertEqual(self._call("GET", "/traces?limit=1000000")[0], 200)
+        
+        status, health = self._call("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(health["workers"], 2)
+    
+    def test_concurrent_turns_for_one_session_are_serialized(self):
+        """Test that parallel messages to one session all land in its state, logged in the order they ran."""
+        log_path = os.path.join(tempfile.mkdtemp(), "turn_log.jsonl")
+        self.api.turn_log = TurnLog(log_path)
+        session_id = self.api.start_session()["session_id"]
+        messages = ["My name is Jane Roe", "My date of birth is 01/15/1990"]
+        threads = [threading.Thread(target=self.api.send_message, args=(session_id, message)) for message in messages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        patient_info = self.api.get_state(session_id)["state"]["patient_info"]
+        self.assertEqual(patient_info.get("name"), "Jane Roe")
+        self.assertEqual(patient_info.get("date_of_birth"), "01/15/1990")
+        self.assertEqual(self.api.get_health()["turns"], 2)
+        
+        records = list(read_turn_log(log_path))
+        self.assertEqual(records[1]["step"], records[0]["next_step"])
+    
+    def test_resubmitted_turn_returns_stored_reply(self):
+        """Test that a repeated turn_id gets the original reply without running the turn again."""
+        log_path = os.path.join(tempfile.mkdtemp(), "turn_log.jsonl")
+        self.api.turn_log = TurnLog(log_path)
+        session_id = self.api.start_session()["session_id"]
+        path = f"/sessions/{session_id}/messages"
+        
+        status, first = self._call("POST", path, {"message": "My name is Jane Roe", "turn_id": "t1"})
+        self.assertEqual(status, 200)
+        status, retry = self._call("POST", path, {"message": "My name is Jane Roe", "turn_id": "t1"})
+        self.assertEqual(status, 200)
+        self.assertTrue(retry["reply"]["duplicate"])
+        self.assertEqual(retry["reply"]["message"], first["reply"]["message"])
+        self.assertEqual(retry["state"], first["state"])
+        self.assertEqual(self._call("POST", path, {"message": "hi", "turn_id": 7})[0], 400)
+        
+        health = self.api.get_health()
+        self.assertEqual((health["turns"], health["duplicate_turns"]), (1, 1))
+        
+        records = list(read_turn_log(log_path))
+        self.assertEqual([record["duplicate"] for record in records], [False, True])
+        self.assertEqual(records[0]["step"], "greeting")
+        self.assertEqual(len(sessions_from_log(records)[session_id]), 1)
+    
+    def test_inbound_sms_webhook(self):
+        """Test JSON and signed Twilio form posts to the inbound SMS route."""
+        import config
+        from urllib.parse import urlencode
+        from utils.sms_router import twilio_signature
+        
+        class StubRouter:
+            def handle(self, from_phone, message):
+                return {"matched": True, "status": "confirmed", "reply": "Thanks & see you <soon>"}
+        
+        self.server.sms_router = StubRouter()
+        status, result = self._call("POST", "/sms/inbound", {"From": "+15550100001", "Body": "yes"})
+        self.assertEqual((status, result["status"]), (200, "confirmed"))
+        self.assertEqual(self._call("POST", "/sms/inbound", {"From": "+15550100001"})[0], 400)
+        
+        params = {"From": "+15550100001", "Body": "yes", "MessageSid": "SM1"}
+        url = self.server.base_url + "/sms/inbound"
+        original_token = config.TWILIO_AUTH_TOKEN
+        config.TWILIO_AUTH_TOKEN = "test-token"
+        try:
+            for signature, expected_status in (("forged", 403), (twilio_signature("test-token", url, params), 200)):
+                request = urllib.request.Request(url, data=urlencode(params).encode("utf-8"), method="POST", headers={
+                    "Content-Type": "application/x-www-form-urlencoded", "X-Twilio-Signature": signature})
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        status, body = response.status, response.read().decode("utf-8")
+                except urllib.error.HTTPError as e:
+                    status, body = e.code, e.read().decode("utf-8")
+                self.assertEqual(status, expected_status)
+        finally:
+            config.TWILIO_AUTH_TOKEN = original_token
+        self.assertIn("<Message>Thanks &amp; see you &lt;soon&gt;</Message>", body)
+
 if __name__ == "__main__":
     # Create test suite
     test_suite = unittest.TestSuite()
@@ -227,7 +646,10 @@ if __name__ == "__main__":
     test_suite.addTest(unittest.makeSuite(TestSchedulingAgent))
     test_suite.addTest(unittest.makeSuite(TestInsuranceAgent))
     test_suite.addTest(unittest.makeSuite(TestDatabase))
+    test_suite.addTest(unittest.makeSuite(TestReminderAgent))
     test_suite.addTest(unittest.makeSuite(TestWorkflow))
+    test_suite.addTest(unittest.makeSuite(TestOrchestrator))
+    test_suite.addTest(unittest.makeSuite(TestConversationAPI))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
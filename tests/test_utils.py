@@ -0,0 +1,1476 @@
+import unittest
+import sys
+import os
+import threading
+import time
+import json
+import subprocess
+import tempfile
+import urllib.request
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+# Add the parent directory to the path so we can import the utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.mock_llm import MockMessage, MockChatGeneration, MockGenerationResult, FaultInjectingChatModel
+from utils.mock_llm import MockChatOpenAI, LatencyModel, MockOpenAIServer
+from utils.llm_batcher import LLMRequestCoalescer
+from utils.llm_resilience import ResilientLLM, CircuitBreaker, LLMUnavailableError
+from utils.prompt_builder import CompactPrompt, get_prompt_stats, reset_prompt_stats
+from utils.intent_classifier import classify_intent
+from utils.text_extraction import PatientInfoExtractor, Gazetteer, InsuranceInfoExtractor
+from utils.payer_matcher import PayerMatcher, AhoCorasick
+from utils.batch_extraction import BatchExtractor
+from utils.job_queue import JobQueue
+from utils.outbox import Outbox
+from utils.sms_router import InboundSMSRouter, UNKNOWN_NUMBER_REPLY
+from utils.sms_service import SMSService
+from utils.session_store import SessionStore, ConversationState
+from utils.lazy_import import lazy_import, lazy_component, LazyModule
+from utils.tracing import TraceRecorder, start_trace, span, traced, chrome_trace, read_trace_log
+from utils.prefetch import AvailabilityPrefetcher
+from utils.calendar_integration import AvailabilityIndex
+from utils.file_lock import FileLock, GenerationCounter, atomic_write
+from utils.reminder_dispatcher import ReminderDispatcher
+from utils.rate_limiter import TokenBucket
+from utils.mock_twilio import MockTwilioServer
+from utils.sms_service import SMSService, SMSDeliveryError
+from utils.mock_smtp import MockSMTPServer
+from utils.smtp_pool import SMTPConnectionPool, DeliveryUncertain
+from utils.email_service import EmailService
+from utils.email_templates import EmailTemplate, CachedAttachment
+from utils import database
+
+class EchoLLM:
+    """LLM stand-in that echoes the last message and records generate() calls."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def generate(self, messages, **kwargs):
+        self.batch_sizes.append(len(messages))
+        return MockGenerationResult(generations=[
+            [MockChatGeneration(message=MockMessage(content=f"echo: {message_list[-1]}"))]
+            for message_list in messages
+        ])
+
+class TestLLMRequestCoalescer(unittest.TestCase):
+    """Test cases for the LLM request coalescer."""
+
+    def test_concurrent_calls_are_batched(self):
+        """Concurrent calls should share generate() calls and get their own answers."""
+        llm = EchoLLM()
+        coalescer = LLMRequestCoalescer(llm, max_batch_size=8, max_wait_ms=50)
+        results = {}
+
+        def call(i):
+            results[i] = coalescer([f"message {i}"]).content
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {i: f"echo: message {i}" for i in range(8)})
+        self.assertLess(len(llm.batch_sizes), 8)
+        self.assertEqual(sum(llm.batch_sizes), 8)
+
+    def test_max_batch_size_respected(self):
+        """No dispatched batch should exceed the configured size."""
+        llm = EchoLLM()
+        coalescer = LLMRequestCoalescer(llm, max_batch_size=3, max_wait_ms=20)
+
+        futures = [coalescer.submit([f"message {i}"]) for i in range(7)]
+        contents = [future.result(timeout=5).content for future in futures]
+
+        self.assertEqual(contents, [f"echo: message {i}" for i in range(7)])
+        self.assertTrue(all(size <= 3 for size in llm.batch_sizes))
+        self.assertEqual(coalescer.get_stats()["requests"], 7)
+
+    def test_errors_fan_out_to_callers(self):
+        """A failed batch should raise in every waiting caller."""
+        class BrokenLLM:
+            def generate(self, messages, **kwargs):
+                raise ConnectionError("provider unavailable")
+
+        coalescer = LLMRequestCoalescer(BrokenLLM(), max_batch_size=4, max_wait_ms=5)
+
+        with self.assertRaises(ConnectionError):
+            coalescer(["hello"])
+
+    def test_slow_batches_run_concurrently(self):
+        """A slow batch should not hold up the next one, and batch() should be preferred when available."""
+        class SlowBatchLLM:
+            def __init__(self):
+                self.inputs = []
+
+            def batch(self, inputs, return_exceptions=False):
+                self.inputs.append(len(inputs))
+                time.sleep(0.3)
+                return [ConnectionError("bad prompt") if messages == ["fail"] else MockMessage(f"ok: {messages[-1]}")
+                        for messages in inputs]
+
+        llm = SlowBatchLLM()
+        coalescer = LLMRequestCoalescer(llm, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=4)
+        start = time.monotonic()
+        futures = [coalescer.submit([f"message {i}"]) for i in range(3)] + [coalescer.submit(["fail"])]
+        self.assertEqual([future.result(timeout=5).content for future in futures[:3]],
+                         ["ok: message 0", "ok: message 1", "ok: message 2"])
+        with self.assertRaises(ConnectionError):
+            futures[3].result(timeout=5)
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(llm.inputs, [1, 1, 1, 1])
+
+class TestResilientLLM(unittest.TestCase):
+    """Test cases for deadlines, retries, hedging and the circuit breaker."""
+
+    def test_deadline_bounds_slow_calls(self):
+        """A hung LLM should fail fast with LLMUnavailableError."""
+        llm = ResilientLLM(FaultInjectingChatModel(latency=2.0), timeout=0.1, max_retries=0)
+
+        start = time.monotonic()
+        with self.assertRaises(LLMUnavailableError):
+            llm(["hello"])
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_retry_recovers_from_transient_failure(self):
+        """A single failure should be retried within the deadline."""
+        flaky = FaultInjectingChatModel(failure_rate=0.5, seed=1)
+        llm = ResilientLLM(flaky, timeout=5.0, max_retries=5)
+
+        self.assertTrue(llm(["hello"]).content)
+        self.assertGreaterEqual(flaky.calls, 1)
+
+    def test_breaker_opens_and_short_circuits(self):
+        """After repeated failures the breaker should reject calls without invoking the LLM."""
+        failing = FaultInjectingChatModel(failure_rate=1.0)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        llm = ResilientLLM(failing, timeout=1.0, max_retries=0, breaker=breaker)
+
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailableError):
+                llm(["hello"])
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        calls_before = failing.calls
+        with self.assertRaises(LLMUnavailableError):
+            llm(["hello"])
+        self.assertEqual(failing.calls, calls_before)
+
+    def test_breaker_half_open_recovers(self):
+        """A successful trial request after the reset timeout should close the breaker."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_hedged_request_beats_slow_primary(self):
+        """A slow outlier should be overtaken by the hedged duplicate."""
+        def latency(call_number):
+            # Warm-up calls are fast; the first call after warm-up is a slow outlier
+            return 1.0 if call_number == 6 else 0.01
+
+        llm = ResilientLLM(FaultInjectingChatModel(latency=latency), timeout=5.0, hedging=True, hedge_min_samples=5)
+        for _ in range(5):
+            llm(["warm up"])
+
+        start = time.monotonic()
+        llm(["hello"])
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(llm.get_stats()["hedges"], 1)
+
+class TestCompactPrompt(unittest.TestCase):
+    """Test cases for the compact prompt builder."""
+
+    def setUp(self):
+        reset_prompt_stats()
+        self.prompt = CompactPrompt(
+            agent_name="test",
+            instructions="""
+            You are a receptionist.
+            """,
+            fields=[("name", "Name"), ("date_of_birth", "Date of birth"), ("location", "Location")]
+        )
+
+    def test_render_summarizes_known_and_missing_fields(self):
+        """Only configured fields should appear, in field order."""
+        rendered = self.prompt.render({"location": "Downtown", "name": "Jane Doe", "notes": "x" * 500})
+
+        self.assertTrue(rendered.startswith("You are a receptionist."))
+        self.assertIn("Collected: Name: Jane Doe; Location: Downtown", rendered)
+        self.assertIn("Missing: Date of birth", rendered)
+        self.assertNotIn("x" * 50, rendered)
+
+    def test_prefix_is_stable_across_turns(self):
+        """The instruction prefix should not change as data accumulates."""
+        first = self.prompt.render({})
+        second = self.prompt.render({"name": "Jane Doe"})
+
+        self.assertEqual(first[:len(self.prompt.prefix)], second[:len(self.prompt.prefix)])
+
+    def test_token_stats_recorded(self):
+        """Each render should be counted against its agent."""
+        self.prompt.render({})
+        self.prompt.render({"name": "Jane Doe"})
+
+        stats = get_prompt_stats()["test"]
+        self.assertEqual(stats["prompts"], 2)
+        self.assertGreater(stats["prompt_tokens"], 2 * stats["prefix_tokens"])
+
+class TestIntentClassifier(unittest.TestCase):
+    """Test cases for the local intent classifier."""
+
+    def test_trivial_intents(self):
+        """Short trivial replies should be classified without an LLM."""
+        cases = {
+            "yes": "confirm",
+            "Okay, sounds good!": "confirm",
+            "no": "deny",
+            "cancel": "cancel",
+            "no, cancel it please": "cancel",
+            "let's start over": "restart",
+            "option 3": "select",
+            "Option 2 looks good": "select",
+            "the second one please": "select",
+        }
+
+        for text, expected in cases.items():
+            self.assertEqual(classify_intent(text)["intent"], expected, text)
+
+    def test_slot_number_extracted(self):
+        """Selections should carry the 1-based slot number."""
+        self.assertEqual(classify_intent("option 3")["slot_number"], 3)
+        self.assertEqual(classify_intent("the first one")["slot_number"], 1)
+        self.assertIsNone(classify_intent("yes")["slot_number"])
+
+    def test_open_ended_turns_left_to_llm(self):
+        """Anything with unknown words should be reported as open."""
+        for text in ["My name is John Smith", "2 pm on Tuesday", "yes but can we do Friday instead", ""]:
+            self.assertEqual(classify_intent(text)["intent"], "open", text)
+
+    def test_classification_is_fast(self):
+        """Classification should run in microseconds per message."""
+        start = time.perf_counter()
+        for _ in range(10000):
+            classify_intent("Option 2 looks good")
+        self.assertLess((time.perf_counter() - start) / 10000, 0.0005)
+
+class TestMockChatOpenAI(unittest.TestCase):
+    """Test cases for the benchmarking features of the mock LLM."""
+
+    def test_seeded_responses_are_reproducible(self):
+        """Two mocks with the same seed should answer identically."""
+        prompts = [["hello"], ["my name is john smith born 1999"], ["yes"], ["thanks"]] * 3
+        first = [MockChatOpenAI(seed=7)(prompt).content for prompt in prompts]
+        second = [MockChatOpenAI(seed=7)(prompt).content for prompt in prompts]
+
+        self.assertEqual(first, second)
+
+    def test_simulated_token_usage(self):
+        """Responses should carry token usage and accumulate totals."""
+        llm = MockChatOpenAI(seed=1)
+        response = llm([MockMessage("You are a receptionist."), MockMessage("hello there")])
+
+        self.assertGreater(response.usage_metadata["input_tokens"], 0)
+        self.assertGreater(response.usage_metadata["output_tokens"], 0)
+        self.assertEqual(llm.usage["calls"], 1)
+
+    def test_latency_model(self):
+        """Calls should take roughly TTFT plus per-token time."""
+        llm = MockChatOpenAI(seed=1, latency_model=LatencyModel(ttft_ms=30, per_token_ms=1))
+
+        start = time.monotonic()
+        response = llm(["hello"])
+        elapsed = time.monotonic() - start
+
+        self.assertGreaterEqual(elapsed, 0.03 + response.usage_metadata["output_tokens"] * 0.001 - 0.005)
+
+    def test_tail_outliers(self):
+        """Tail outliers should multiply the sampled latency."""
+        import random
+        model = LatencyModel(ttft_ms=10, tail_probability=1.0, tail_multiplier=10)
+
+        self.assertAlmostEqual(model.sample(0, random.Random(0))["total"], 0.1)
+
+class TestMockOpenAIServer(unittest.TestCase):
+    """Test cases for the OpenAI-compatible mock server."""
+
+    def setUp(self):
+        self.server = MockOpenAIServer(MockChatOpenAI(seed=3)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _post(self, body):
+        request = urllib.request.Request(
+            self.server.base_url + "/chat/completions",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        return urllib.request.urlopen(request, timeout=5)
+
+    def test_chat_completion(self):
+        """A non-streaming request should return an OpenAI-shaped completion."""
+        with self._post({"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hello"}]}) as response:
+            body = json.loads(response.read())
+
+        self.assertEqual(body["object"], "chat.completion")
+        self.assertEqual(body["choices"][0]["message"]["role"], "assistant")
+        self.assertTrue(body["choices"][0]["message"]["content"])
+        self.assertGreater(body["usage"]["total_tokens"], 0)
+
+    def test_streaming_completion(self):
+        """A streaming request should return SSE chunks ending with [DONE]."""
+        body = {"model": "gpt-3.5-turbo", "stream": True, "messages": [{"role": "user", "content": "hello"}]}
+        with self._post(body) as response:
+            events = [line for line in response.read().decode("utf-8").split("\n\n") if line]
+
+        self.assertEqual(events[-1], "data: [DONE]")
+        content = "".join(
+            json.loads(event[len("data: "):])["choices"][0]["delta"].get("content", "")
+            for event in events[:-1]
+        )
+        self.assertTrue(content)
+
+class TestPatientInfoExtractor(unittest.TestCase):
+    """Test cases for the single-pass patient information extractor."""
+
+    def setUp(self):
+        self.extractor = PatientInfoExtractor(Gazetteer(["Smith", "Johnson"], ["Downtown", "Uptown"]))
+
+    def test_gazetteer_validates_doctor_and_location(self):
+        """Doctor and location values should be trimmed to known names."""
+        data = self.extractor.extract(
+            "Hi, I'm John Smith, born 01/15/1990, I'd like to see Dr. Johnson at Downtown clinic", {}
+        )
+
+        self.assertEqual(data["name"], "John Smith")
+        self.assertEqual(data["date_of_birth"], "01/15/1990")
+        self.assertEqual(data["preferred_doctor"], "Johnson")
+        self.assertEqual(data["location"], "Downtown")
+
+    def test_unknown_values_fall_back_to_raw_text(self):
+        """Without a gazetteer match the raw captured value is kept, as before."""
+        data = PatientInfoExtractor().extract("My name is jane doe", {})
+        self.assertEqual(data["name"], "Jane Doe")
+
+        data = PatientInfoExtractor().extract("office: north side", {})
+        self.assertEqual(data["location"], "North Side")
+
+    def test_leading_name_and_existing_values(self):
+        """Greetings are not names, and values already collected are kept."""
+        self.assertEqual(self.extractor.extract("Jane Doe 02/03/1985", {})["name"], "Jane Doe")
+        self.assertNotIn("name", self.extractor.extract("Hello there", {}))
+
+        data = self.extractor.extract("My name is Jane Doe", {"name": "John Smith"})
+        self.assertEqual(data["name"], "John Smith")
+
+class TestPayerMatcher(unittest.TestCase):
+    """Test cases for the insurance payer matcher."""
+
+    def setUp(self):
+        self.matcher = PayerMatcher({
+            "blue cross": "Blue Cross Blue Shield",
+            "blue cross blue shield": "Blue Cross Blue Shield",
+            "blue shield": "Blue Shield of California",
+            "united healthcare": "United Healthcare",
+            "uhc": "United Healthcare",
+            "humana": "Humana"
+        })
+
+    def test_automaton_finds_overlapping_patterns(self):
+        """Every occurrence, including overlapping ones, should be reported."""
+        automaton = AhoCorasick({"he": "he", "she": "she", "hers": "hers"})
+        matches = sorted(automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")])
+
+    def test_leftmost_longest_on_word_boundaries(self):
+        """The earliest, longest alias wins and aliases inside words are ignored."""
+        self.assertEqual(self.matcher.match("I have Blue Cross Blue Shield insurance"), "Blue Cross Blue Shield")
+        self.assertEqual(self.matcher.match("It's UHC."), "United Healthcare")
+        self.assertIsNone(self.matcher.match("The duhcky plan"))
+
+    def test_fuzzy_fallback_for_misspellings(self):
+        """Run-together and one-edit misspellings resolve; short aliases stay exact."""
+        self.assertEqual(self.matcher.match("bluecross"), "Blue Cross Blue Shield")
+        self.assertEqual(self.matcher.match("my insurance is untied healthcare"), "United Healthcare")
+        self.assertIsNone(self.matcher.match("I am human"))
+
+    def test_insurance_extractor(self):
+        """Carrier, member ID and group number should come from one message."""
+        extractor = InsuranceInfoExtractor(self.matcher)
+        data = extractor.extract("I have bluecross, my member ID is 123456789 and group number: ABC123", {})
+
+        self.assertEqual(data["insurance_carrier"], "Blue Cross Blue Shield")
+        self.assertEqual(data["member_id"], "123456789")
+        self.assertEqual(data["group_number"], "ABC123")
+
+class TestBatchExtraction(unittest.TestCase):
+    """Test cases for offline batch extraction."""
+
+    texts = [
+        "My name is Jane Doe, born 02/03/1985",
+        "I have Aetna, member ID 987654321, group number G100",
+        "Option 2 please",
+    ] * 5
+
+    def test_records_stream_in_input_order(self):
+        """Pooled extraction should match in-process extraction record for record."""
+        serial = list(BatchExtractor(workers=1, schedule_file="missing.xlsx").extract(self.texts))
+        pooled = list(BatchExtractor(workers=2, chunk_size=2, max_in_flight=2,
+                                     schedule_file="missing.xlsx").extract(iter(self.texts)))
+
+        self.assertEqual(pooled, serial)
+        self.assertEqual(serial[0], {"name": "Jane Doe", "date_of_birth": "02/03/1985"})
+        self.assertEqual(serial[1], {"insurance_carrier": "Aetna", "member_id": "987654321", "group_number": "G100"})
+        self.assertEqual(serial[2], {})
+
+    def test_no_llm_client_is_loaded(self):
+        """Batch extraction must not import the LLM client stack."""
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            "import sys\n"
+            "from utils.batch_extraction import extract_patient_batch\n"
+            "list(extract_patient_batch(['My name is Jane Doe'], workers=1))\n"
+            "print(any(name in sys.modules for name in ('langchain_openai', 'utils.llm_client', 'utils.mock_llm')))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=project_root, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "False")
+
+class TestJobQueue(unittest.TestCase):
+    """Test cases for the durable background job queue."""
+
+    def setUp(self):
+        self.db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+        self.queue = JobQueue(db_path=self.db_path, workers=0, max_attempts=3, backoff_seconds=0.01)
+
+    def test_idempotency_key_deduplicates(self):
+        """Enqueueing the same key twice should return the same job and run it once."""
+        calls = []
+        self.queue.register("email", calls.append)
+
+        first = self.queue.enqueue("email", {"to": "a@example.com"}, idempotency_key="APT1:email")
+        second = self.queue.enqueue("email", {"to": "a@example.com"}, idempotency_key="APT1:email")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.queue.run_pending(), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_lease_is_renewed_while_a_slow_job_runs(self):
+        """A job running longer than its lease should not be claimed by another worker."""
+        calls = []
+        queue = JobQueue(db_path=self.db_path, workers=0, lease_seconds=0.3)
+        queue.register("export", lambda payload: calls.append(payload) or time.sleep(1.0))
+        other = JobQueue(db_path=self.db_path, workers=0, lease_seconds=0.3)
+        other.register("export", calls.append)
+        job_id = queue.enqueue("export", {"appointment_id": "APT1"})
+
+        runner = threading.Thread(target=queue.run_pending)
+        runner.start()
+        time.sleep(0.7)
+        self.assertEqual(other.run_pending(), 0)
+        runner.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(queue.get_job(job_id)["status"], "succeeded")
+
+    def test_retry_with_backoff_then_succeed(self):
+        """A failing job should be retried after a backoff until it succeeds."""
+        attempts = []
+
+        def flaky(payload):
+            attempts.append(time.time())
+            if len(attempts) < 3:
+                raise RuntimeError("SMTP unavailable")
+            return "sent"
+
+        queue = JobQueue(db_path=self.db_path, workers=1, max_attempts=3, backoff_seconds=0.01, poll_interval=0.01)
+        queue.register("email", flaky)
+        job_id = queue.enqueue("email", {})
+        queue.start()
+        try:
+            self.assertTrue(queue.wait_for([job_id], timeout=5))
+        finally:
+            queue.stop()
+
+        job = queue.get_job(job_id)
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["attempts"], 3)
+        self.assertEqual(job["result"], "sent")
+
+    def test_gives_up_after_max_attempts(self):
+        """A job that keeps failing should end up failed with its last error."""
+        def broken(payload):
+            raise RuntimeError("boom")
+
+        self.queue.register("export", broken)
+        job_id = self.queue.enqueue("export", {}, group="APT2")
+        for _ in range(3):
+            time.sleep(0.05)
+            self.queue.run_pending()
+
+        job = self.queue.get_job(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["last_error"], "boom")
+        self.assertEqual(self.queue.get_group_status("APT2"), {"export": "failed"})
+
+    def test_jobs_survive_restart(self):
+        """A job enqueued before a restart should run on a new queue with the same database."""
+        when = datetime(2030, 1, 2, 9, 30)
+        self.queue.enqueue("reminders", {"datetime": when})
+
+        received = []
+        restarted = JobQueue(db_path=self.db_path, workers=0)
+        restarted.register("reminders", received.append)
+
+        self.assertEqual(restarted.run_pending(), 1)
+        self.assertEqual(received, [{"datetime": when}])
+
+class TestSessionStore(unittest.TestCase):
+    """Test cases for the LRU session store with its SQLite tier."""
+
+    def setUp(self):
+        self.db_path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+
+    def _state(self, name):
+        return ConversationState(
+            current_step="scheduling",
+            patient_info={"name": name},
+            appointment_info={"datetime": datetime(2030, 1, 2, 9, 30)}
+        )
+
+    def test_sessions_survive_restart(self):
+        """State written by one store should be readable by a new store on the same database."""
+        SessionStore(db_path=self.db_path).put("abc", self._state("Jane Roe"))
+
+        restored = SessionStore(db_path=self.db_path).get("abc")
+
+        self.assertEqual(restored, self._state("Jane Roe"))
+        self.assertIsNone(SessionStore(db_path=self.db_path).get("missing"))
+
+    def test_lru_eviction_reloads_from_disk(self):
+        """Evicted sessions should drop out of memory but still load on their next turn."""
+        store = SessionStore(db_path=self.db_path, capacity=2)
+        for name in ["a", "b", "c"]:
+            store.put(name, self._state(name))
+
+        self.assertEqual(store.get_stats()["in_memory"], 2)
+        self.assertEqual(store.get("a").patient_info["name"], "a")
+
+        stats = store.get_stats()
+        self.assertEqual(stats["evictions"], 2)
+        self.assertEqual(stats["disk_loads"], 1)
+
+    def test_returned_state_is_a_copy(self):
+        """Mutating a state returned by get should not change the stored session."""
+        store = SessionStore(db_path=self.db_path)
+        store.put("abc", self._state("Jane Roe"))
+
+        store.get("abc").patient_info["name"] = "Someone Else"
+        self.assertEqual(store.get("abc").patient_info["name"], "Jane Roe")
+
+        store.delete("abc")
+        self.assertIsNone(store.get("abc"))
+
+    def test_shared_store_sees_other_process_writes(self):
+        """In multi-process mode a cached session should be reloaded after another store writes it."""
+        first = SessionStore(db_path=self.db_path, shared=True)
+        second = SessionStore(db_path=self.db_path, shared=True)
+        first.put("abc", self._state("Jane Roe"))
+        self.assertEqual(second.get("abc").patient_info["name"], "Jane Roe")
+
+        time.sleep(0.01)
+        first.put("abc", self._state("Jane Q. Roe"))
+
+        self.assertEqual(second.get("abc").patient_info["name"], "Jane Q. Roe")
+        self.assertEqual(second.get_stats()["disk_loads"], 2)
+
+class TestLazyImport(unittest.TestCase):
+    """Test cases for deferred imports and on-first-use construction."""
+
+    def test_module_is_imported_on_first_attribute_access(self):
+        """A lazy module should not be imported until one of its attributes is used."""
+        sys.modules.pop("colorsys", None)
+        module = lazy_import("colorsys")
+
+        self.assertIsInstance(module, LazyModule)
+        self.assertNotIn("colorsys", sys.modules)
+        self.assertEqual(module.rgb_to_hsv(0, 0, 0), (0.0, 0.0, 0.0))
+        self.assertIn("colorsys", sys.modules)
+
+        # Already imported modules are returned as they are
+        self.assertIs(lazy_import("json"), json)
+
+    def test_component_is_built_once_under_concurrency(self):
+        """Concurrent first reads should build the component exactly once."""
+        builds = []
+
+        def build(owner):
+            builds.append(owner)
+            time.sleep(0.05)
+            return object()
+
+        class Owner:
+            component = lazy_component(build)
+
+        owner = Owner()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(owner.component)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(builds), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        # Assigning the attribute replaces the built component without calling the factory
+        owner.component = "replacement"
+        self.assertEqual(owner.component, "replacement")
+        self.assertEqual(len(builds), 1)
+
+    def test_orchestrator_import_skips_heavy_dependencies(self):
+        """Importing and constructing the orchestrator must not load pandas or the LLM stack."""
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            "import sys\n"
+            "from agents.orchestrator import SchedulingOrchestrator\n"
+            "SchedulingOrchestrator()\n"
+            "print(sorted(name for name in ('pandas', 'langchain_core', 'twilio', 'openpyxl') if name in sys.modules))\n"
+        )
+        env = dict(os.environ, JOB_QUEUE_DB=os.path.join(tempfile.mkdtemp(), "jobs.db"))
+        result = subprocess.run([sys.executable, "-c", script], cwd=project_root, capture_output=True,
+                                text=True, env=env)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
+class TestTracing(unittest.TestCase):
+    """Test cases for per-turn timing spans."""
+
+    def test_spans_form_a_tree(self):
+        """Nested spans and traced functions should hang under the trace root."""
+        recorder = TraceRecorder(capacity=5, log_path=None)
+
+        @traced(category="io")
+        def load():
+            time.sleep(0.01)
+
+        with start_trace("turn", recorder=recorder, step="greeting") as trace:
+            with span("step.greeting", "handler"):
+                load()
+                with span("llm.greeting", "llm"):
+                    pass
+
+        root = trace.to_dict()["root"]
+        self.assertEqual(root["attrs"], {"step": "greeting"})
+        handler = root["children"][0]
+        self.assertEqual(handler["name"], "step.greeting")
+        self.assertEqual([child["name"] for child in handler["children"]],
+                         [load.__qualname__, "llm.greeting"])
+        self.assertGreaterEqual(handler["children"][0]["duration_ms"], 10)
+        self.assertIs(recorder.recent()[-1], trace)
+
+        stats = {row["name"]: row for row in recorder.get_stats()}
+        self.assertEqual(stats["llm.greeting"]["count"], 1)
+        self.assertEqual(recorder.get_stats()[0]["name"], "turn")
+
+    def test_spans_outside_a_trace_are_noops(self):
+        """Spans without an active trace record nothing; nested traces become spans."""
+        recorder = TraceRecorder(log_path=None)
+        with span("orphan") as orphan:
+            self.assertIsNone(orphan)
+
+        with start_trace("request", recorder=recorder) as outer:
+            with start_trace("turn", recorder=recorder) as inner:
+                self.assertIsNone(inner)
+
+        self.assertEqual(len(recorder.recent()), 1)
+        self.assertEqual(outer.root.children[0].name, "turn")
+
+    def test_trace_log_converts_to_chrome_events(self):
+        """Logged traces should load back and convert to Chrome trace events."""
+        log_path = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+        recorder = TraceRecorder(log_path=log_path)
+        for _ in range(2):
+            with start_trace("turn", recorder=recorder):
+                with span("step.lookup", "handler"):
+                    pass
+
+        traces = list(read_trace_log(log_path))
+        self.assertEqual(len(traces), 2)
+
+        events = chrome_trace(traces)["traceEvents"]
+        self.assertEqual(len(events), 4)
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+        self.assertEqual({event["cat"] for event in events}, {"turn", "handler"})
+
+class SlowCalendar:
+    """Calendar stand-in whose slot scan blocks until released and counts calls."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def get_available_slots(self, doctor, location, duration, days_ahead=14):
+        self.calls.append((doctor, location, duration))
+        self.release.wait(5)
+        return [{"datetime": datetime(2030, 1, 7, 9, 0), "doctor": doctor, "duration": duration}]
+
+
+class TestAvailabilityPrefetcher(unittest.TestCase):
+    """Test cases for speculative availability prefetching."""
+
+    def setUp(self):
+        self.calendar = SlowCalendar()
+        self.prefetcher = AvailabilityPrefetcher(calendar_factory=lambda: self.calendar, workers=1)
+
+    def tearDown(self):
+        self.calendar.release.set()
+        self.prefetcher.shutdown()
+
+    def test_get_waits_for_in_flight_scan(self):
+        """A prefetched query should be scanned once and served to every later caller."""
+        self.prefetcher.prefetch("Smith", "Downtown", 30)
+        self.prefetcher.prefetch("smith", "downtown", 30)
+        threading.Timer(0.05, self.calendar.release.set).start()
+
+        first = self.prefetcher.get("Smith", "Downtown", 30)
+        second = self.prefetcher.get("Smith", "Downtown", 30)
+
+        self.assertEqual(len(self.calendar.calls), 1)
+        self.assertEqual(first, second)
+        self.assertIsNot(first[0], second[0])
+        self.assertIsNone(self.prefetcher.get("Smith", "Downtown", 60))
+        self.assertEqual(self.prefetcher.get_stats()["hits"], 2)
+
+    def test_invalidate_discards_running_scan(self):
+        """A booking during a scan should keep its possibly stale result from being served."""
+        self.prefetcher.prefetch("Smith", "Downtown", 60)
+        self.prefetcher.invalidate("Smith", "Downtown")
+        self.calendar.release.set()
+
+        self.assertIsNone(self.prefetcher.get("Smith", "Downtown", 60))
+
+        self.prefetcher.prefetch("Smith", "Downtown", 60)
+        self.assertEqual(len(self.prefetcher.get("Smith", "Downtown", 60)), 1)
+        self.assertEqual(self.prefetcher.get_stats()["discarded"], 1)
+
+    def test_booking_hides_overlapping_slots(self):
+        """A booking should filter the cached result rather than force a new scan."""
+        self.calendar.release.set()
+        self.prefetcher.prefetch("Smith", "Downtown", 60)
+        self.prefetcher.record_booking("Smith", "Uptown", datetime(2030, 1, 7, 9, 0), 30)
+        self.assertEqual(len(self.prefetcher.get("Smith", "Downtown", 60)), 1)
+
+        self.prefetcher.record_booking("Smith", "Downtown", datetime(2030, 1, 7, 9, 30), 30)
+        self.assertEqual(self.prefetcher.get("Smith", "Downtown", 60), [])
+        self.assertEqual(len(self.calendar.calls), 1)
+
+
+class TestAvailabilityIndex(unittest.TestCase):
+    """Test cases for the in-memory index of confirmed bookings."""
+
+    def setUp(self):
+        import pandas as pd
+        self.pd = pd
+        self.path = os.path.join(tempfile.mkdtemp(), "appointments.xlsx")
+        self.rows = [
+            {"appointment_id": "APT1", "doctor": "Smith", "location": "Downtown", "datetime": "2030-01-07T09:00:00",
+             "duration": 60, "status": "confirmed"},
+            {"appointment_id": "APT2", "doctor": "Smith", "location": "Downtown", "datetime": "2030-01-07T11:00:00",
+             "duration": 60, "status": "cancelled"},
+            {"appointment_id": "APT3", "doctor": "Wilson", "location": "Midtown", "datetime": "2030-01-07T09:00:00",
+             "duration": 30, "status": "confirmed"},
+        ]
+        pd.DataFrame(self.rows).to_excel(self.path, index=False)
+        self.index = AvailabilityIndex(self.path)
+
+    def test_overlapping_slots_are_unavailable(self):
+        """Only confirmed bookings overlapping the slot should block it."""
+        self.assertFalse(self.index.is_available("smith", "downtown", datetime(2030, 1, 7, 9, 30), 30))
+        self.assertFalse(self.index.is_available("Smith", "Downtown", datetime(2030, 1, 7, 8, 30), 60))
+        self.assertTrue(self.index.is_available("Smith", "Downtown", datetime(2030, 1, 7, 8, 0), 60))
+        self.assertTrue(self.index.is_available("Smith", "Downtown", datetime(2030, 1, 7, 10, 0), 30))
+        self.assertTrue(self.index.is_available("Smith", "Downtown", datetime(2030, 1, 7, 11, 0), 60))
+        self.assertTrue(self.index.is_available("Smith", "Uptown", datetime(2030, 1, 7, 9, 0), 60))
+
+    def test_etag_changes_only_for_the_booked_doctor(self):
+        """A new booking should change that doctor's etag and be seen without a restart."""
+        smith_etag = self.index.etag("Smith", "Downtown")
+        wilson_etag = self.index.etag("Wilson", "Midtown")
+
+        self.rows.append({"appointment_id": "APT4", "doctor": "Smith", "location": "Downtown",
+                          "datetime": "2030-01-07T10:00:00", "duration": 30, "status": "confirmed"})
+        self.pd.DataFrame(self.rows).to_excel(self.path, index=False)
+        self.index.invalidate()
+
+        self.assertNotEqual(self.index.etag("Smith", "Downtown"), smith_etag)
+        self.assertEqual(self.index.etag("Wilson", "Midtown"), wilson_etag)
+        self.assertFalse(self.index.is_available("Smith", "Downtown", datetime(2030, 1, 7, 10, 0), 30))
+
+
+MULTIPROCESS_WORKER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from datetime import datetime, timedelta
+from utils.database import Database, data_lock
+from utils.calendar_integration import CalendarIntegration
+
+worker = int(sys.argv[2])
+db = Database()
+calendar = CalendarIntegration()
+booked = 0
+for i in range(6):
+    db.create_patient_record({"name": f"Worker{worker} Patient{i}", "date_of_birth": "01/01/1990"})
+    # Every worker races for the same slots; each should be booked exactly once
+    details = {"appointment_id": f"APT-{worker}-{i}", "patient_id": None, "doctor": "Smith", "location": "Downtown",
+               "datetime": datetime(2030, 1, 7, 9, 0) + timedelta(minutes=30 * i), "duration": 30,
+               "status": "confirmed", "created_at": datetime.now()}
+    with data_lock:
+        if calendar.book_appointment({"datetime": details["datetime"]}, details):
+            db.save_appointment(details)
+            booked += 1
+print(booked)
+"""
+
+
+class TestMultiprocessData(unittest.TestCase):
+    """Test cases for cross-process locking, atomic writes and change counters."""
+
+    def test_file_lock_is_reentrant_and_exclusive(self):
+        """The lock should nest in one thread and block other threads until fully released."""
+        lock = FileLock(os.path.join(tempfile.mkdtemp(), "data.lock"))
+        acquired = threading.Event()
+
+        def contend():
+            with lock:
+                acquired.set()
+
+        with lock:
+            with lock:
+                thread = threading.Thread(target=contend)
+                thread.start()
+            self.assertFalse(acquired.wait(0.05))
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_generation_counter_shared_through_file(self):
+        """Bumps from one counter should be seen by another and told apart from its own."""
+        path = os.path.join(tempfile.mkdtemp(), "generations.json")
+        first, second = GenerationCounter(path), GenerationCounter(path)
+
+        self.assertEqual(first.bump("appointments.xlsx"), 1)
+        self.assertEqual(second.get("appointments.xlsx"), 1)
+        self.assertTrue(second.changed_elsewhere("appointments.xlsx", 0))
+        self.assertFalse(first.changed_elsewhere("appointments.xlsx", 0))
+        self.assertEqual(second.bump("appointments.xlsx"), 2)
+        self.assertEqual(first.get("patients.csv"), 0)
+
+    def test_atomic_write_leaves_original_on_failure(self):
+        """A failed write should keep the old file and remove its temp file."""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "patients.csv")
+        atomic_write(path, lambda temp_path: open(temp_path, "w").write("old"))
+
+        def failing_write(temp_path):
+            with open(temp_path, "w") as f:
+                f.write("partial")
+            raise IOError("disk full")
+
+        with self.assertRaises(IOError):
+            atomic_write(path, failing_write)
+        with open(path) as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(directory), ["patients.csv"])
+
+    def test_atomic_write_keeps_file_mode(self):
+        """A rewrite should keep the file's permissions, and a new file should get the umask default."""
+        import stat
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "patients.csv")
+        umask = os.umask(0)
+        os.umask(umask)
+        atomic_write(path, lambda temp_path: open(temp_path, "w").write("new"))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o666 & ~umask)
+
+        os.chmod(path, 0o664)
+        atomic_write(path, lambda temp_path: open(temp_path, "w").write("newer"))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o664)
+
+    def test_concurrent_processes_keep_data_consistent(self):
+        """Processes mutating the same files should lose no rows and never double-book a slot."""
+        import pandas as pd
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        work_dir = tempfile.mkdtemp()
+        env = dict(os.environ, MULTIPROCESS_DATA="true", DEMO_MODE="true", TRACING_ENABLED="false")
+        workers = [subprocess.Popen([sys.executable, "-c", MULTIPROCESS_WORKER, project_root, str(worker)],
+                                    cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                   for worker in range(4)]
+        outputs = [worker.communicate(timeout=120) for worker in workers]
+
+        self.assertEqual([worker.returncode for worker in workers], [0] * 4, [err for _, err in outputs])
+        self.assertEqual(sum(int(out.strip().splitlines()[-1]) for out, _ in outputs), 6)
+
+        appointments = pd.read_excel(os.path.join(work_dir, "data", "appointments.xlsx"))
+        self.assertEqual(len(appointments), 6)
+        self.assertEqual(appointments["datetime"].nunique(), 6)
+        patients = pd.read_csv(os.path.join(work_dir, "data", "patients.csv"))
+        self.assertEqual(len(patients), 24)
+        self.assertFalse([name for name in os.listdir(os.path.join(work_dir, "data")) if name.startswith(".")
+                          and name not in (".data.lock", ".generations.json")])
+
+
+class RecordingSender:
+    """Reminder sender stand-in that records each batch it is given."""
+
+    def __init__(self):
+        self.batches = []
+        self.sent = threading.Event()
+
+    def __call__(self, reminders):
+        self.batches.append([reminder["reminder_id"] for reminder in reminders])
+        self.sent.set()
+        return [{"success": True} for _ in reminders]
+
+
+class TestReminderDispatcher(unittest.TestCase):
+    """Test cases for the heap-based reminder dispatcher."""
+
+    def setUp(self):
+        self.sender = RecordingSender()
+        self.reminders_file = os.path.join(tempfile.mkdtemp(), "reminders.csv")
+        self.dispatcher = ReminderDispatcher(send_batch=self.sender, workers=1, reminders_file=self.reminders_file)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def _reminder(self, reminder_id, due):
+        return {"reminder_id": reminder_id, "appointment_id": "APT1", "patient_id": "P1",
+                "reminder_datetime": due, "type": "initial"}
+
+    def test_load_queues_only_scheduled_reminders(self):
+        """Sent reminders in the file should stay off the heap, and due ones go out in one batch."""
+        now = datetime.now()
+        with open(self.reminders_file, "w") as f:
+            f.write("reminder_id,appointment_id,patient_id,reminder_datetime,days_before,type,status,response\n")
+            f.write(f"R2,APT1,P1,{(now - timedelta(minutes=1)).isoformat()},3,form_check,scheduled,\n")
+            f.write(f"R1,APT1,P1,{(now - timedelta(minutes=2)).isoformat()},7,initial,scheduled,\n")
+            f.write(f"R0,APT1,P1,{(now - timedelta(minutes=3)).isoformat()},7,initial,sent,\n")
+            f.write(f"R3,APT1,P1,{(now + timedelta(days=1)).isoformat()},1,confirmation,scheduled,\n")
+
+        self.assertEqual(self.dispatcher.load(), 3)
+        self.assertEqual(self.dispatcher.load(), 0)
+        self.dispatcher.start()
+
+        self.assertTrue(self.sender.sent.wait(5))
+        self.assertEqual(self.sender.batches, [["R1", "R2"]])
+        self.assertEqual(self.dispatcher.get_stats()["pending"], 1)
+
+    def test_saved_reminder_wakes_dispatcher(self):
+        """A reminder saved through the database hook should be sent when due, without a reload."""
+        self.dispatcher.start()
+        self.dispatcher.add(self._reminder("later", datetime.now() + timedelta(hours=1)))
+        self.dispatcher.add(self._reminder("cancelled", datetime.now() + timedelta(seconds=0.1)))
+        self.assertTrue(self.dispatcher.cancel("cancelled"))
+
+        for listener in database.reminder_listeners:
+            listener(self._reminder("soon", datetime.now() + timedelta(seconds=0.2)))
+
+        self.assertTrue(self.sender.sent.wait(5))
+        time.sleep(0.2)
+        self.assertEqual(self.sender.batches, [["soon"]])
+        stats = self.dispatcher.get_stats()
+        self.assertEqual((stats["pending"], stats["sent"], stats["skipped"]), (1, 1, 1))
+
+
+class TestBulkSMS(unittest.TestCase):
+    """Test cases for concurrent, rate-limited SMS sending against the Twilio stand-in."""
+
+    def setUp(self):
+        self.server = MockTwilioServer(seed=3).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_token_bucket_spaces_acquisitions(self):
+        """After the burst, tokens should come out at the configured rate."""
+        bucket = TokenBucket(rate=50, capacity=5)
+        start = time.perf_counter()
+        for _ in range(15):
+            bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.18)
+        self.assertFalse(bucket.try_acquire())
+
+    def test_bulk_send_dedupes_and_retries(self):
+        """Repeats should be sent once and provider 500s retried until delivered."""
+        self.server.error_rate = 0.3
+        service = SMSService(workers=4, rate_per_second=500, api_base_url=self.server.base_url,
+                             max_retries=10, backoff_seconds=0.001)
+        reminders = [{"phone": f"555-010-{i:04d}", "message": f"Reminder {i}"} for i in range(20)]
+        reminders += [reminders[0], reminders[1], {"phone": "12", "message": "bad number"}]
+
+        streamed = list(service.send_bulk_stream(reminders))
+
+        self.assertEqual(sorted(result["index"] for result in streamed), list(range(23)))
+        self.assertEqual(sum(result["duplicate"] for result in streamed), 2)
+        self.assertEqual([result["success"] for result in streamed if result["index"] == 22], [False])
+        self.assertEqual(self.server.stats["accepted"], 20)
+        self.assertEqual(self.server.delivered_twice(), 0)
+        self.assertGreater(service.get_stats()["retries"], 0)
+        self.assertEqual(service.send_bulk_reminders(reminders[:3])["results"], [True, True, True])
+
+    def test_client_errors_are_not_retried(self):
+        """A 4xx other than 429 should fail at once; throttling should be retried."""
+        service = SMSService(api_base_url=self.server.base_url, backoff_seconds=0.001)
+        self.assertFalse(service._send_with_retries("+15550100000", "")["success"])
+        self.assertEqual(service.get_stats()["retries"], 0)
+
+        self.server.rate_limiter = TokenBucket(rate=20, capacity=1)
+        service.backoff_seconds = 0.1
+        results = service.send_bulk_reminders([{"phone": f"555-010-{i:04d}", "message": "x"} for i in range(3)])
+        self.assertEqual(results["successful"], 3)
+
+    def test_lost_reply_is_not_resent(self):
+        """A request sent without a reply coming back may have been accepted, so it should not be retried."""
+        import socket
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(8)
+        requests_seen = []
+
+        def swallow():
+            while True:
+                try:
+                    client, _ = listener.accept()
+                except OSError:
+                    return
+                requests_seen.append(client.recv(65536))
+                client.close()
+
+        threading.Thread(target=swallow, daemon=True).start()
+        host, port = listener.getsockname()
+        service = SMSService(api_base_url=f"http://{host}:{port}", max_retries=3, backoff_seconds=0.001)
+        result = service._send_with_retries("+15550100000", "Reminder")
+        listener.close()
+        self.assertFalse(result["success"])
+        self.assertEqual((result["attempts"], len(requests_seen)), (1, 1))
+
+        # Nothing listening: the request never left, so it is retried
+        unused = socket.socket()
+        unused.bind(("127.0.0.1", 0))
+        host, port = unused.getsockname()
+        service.api_base_url = f"http://{host}:{port}"
+        unused.close()
+        result = service._send_with_retries("+15550100000", "Reminder")
+        self.assertEqual((result["success"], result["attempts"]), (False, 4))
+
+
+class TestSMTPPool(unittest.TestCase):
+    """Test cases for pooled, pipelined SMTP sending against the local SMTP stand-in."""
+
+    def setUp(self):
+        self.server = MockSMTPServer(credentials=("clinic", "secret")).start()
+        host, port = self.server.address
+        self.pool = SMTPConnectionPool(host, port, "clinic", "secret", size=2, starttls=False, timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def make_service(self):
+        service = EmailService()
+        service.email_user, service.email_password = "clinic", "secret"
+        service.smtp_pool = self.pool
+        return service
+
+    def test_send_many_reuses_connections(self):
+        """Many messages should go out pipelined over at most pool-size logins."""
+        service = self.make_service()
+        reminders = [{"to_email": f"patient{i}@example.com", "subject": f"Reminder {i}", "message": ".dot\\nline"}
+                     for i in range(30)]
+
+        self.assertEqual(service.send_reminder_emails(reminders), [True] * 30)
+
+        stats = self.pool.get_stats()
+        self.assertLessEqual(stats["connections_opened"], 2)
+        self.assertEqual(self.server.stats["auth"], stats["connections_opened"])
+        self.assertEqual(stats["pipelined"], 30)
+        self.assertEqual(sorted(recipients[0] for _, recipients, _ in self.server.messages),
+                         sorted(reminder["to_email"] for reminder in reminders))
+
+    def test_reconnects_after_server_drops_connections(self):
+        """A connection dropped between messages should be replaced without losing the message."""
+        service = self.make_service()
+        self.assertTrue(service.send_reminder_email("a@example.com", "First", "Hello", {}))
+        self.server.disconnect_all()
+        time.sleep(0.05)
+
+        self.assertTrue(service.send_reminder_email("b@example.com", "Second", "Hello", {}))
+        self.assertEqual(self.pool.get_stats()["connections_opened"], 2)
+        self.assertEqual(self.server.stats["messages"], 2)
+
+    def test_drop_after_message_body_is_not_resent(self):
+        """A session lost after the body went out may have been queued, so the message is not sent again."""
+        for pipelining in (True, False):
+            self.server.pipelining = pipelining
+            self.server.drop_after_data = 1
+            self.server.messages.clear()
+            pool = SMTPConnectionPool(*self.server.address, "clinic", "secret", size=1, starttls=False, timeout=5)
+            message = MIMEText("Hello")
+            message["To"] = "a@example.com"
+            with self.assertRaises(DeliveryUncertain):
+                pool.deliver(message)
+            self.assertEqual(len(self.server.messages), 1)
+            self.assertEqual(pool.get_stats()["uncertain"], 1)
+
+            pool.deliver(message)
+            self.assertEqual(len(self.server.messages), 2)
+            pool.close()
+
+    def test_idle_connection_is_checked_with_noop(self):
+        """A connection idle past the check interval should be NOOPed before reuse."""
+        self.pool.idle_check_seconds = 0
+        service = self.make_service()
+        for i in range(3):
+            self.assertTrue(service.send_reminder_email(f"p{i}@example.com", "Reminder", "Hello", {}))
+        self.assertEqual(self.server.stats["noop"], 2)
+        self.assertEqual(self.pool.get_stats()["connections_opened"], 1)
+
+    def test_login_failure_is_reported(self):
+        """A rejected login should fail the message without retrying, and not poison the pool."""
+        self.pool.user = "wrong"
+        self.assertFalse(self.make_service().send_reminder_email("a@example.com", "x", "y", {}))
+        self.pool.user = "clinic"
+        self.assertTrue(self.make_service().send_reminder_email("a@example.com", "x", "y", {}))
+
+
+class TestEmailTemplates(unittest.TestCase):
+    """Test cases for compiled email templates and the cached attachment."""
+
+    def test_template_renders_like_format(self):
+        """Rendering should match str.format, including escaped braces."""
+        source = "<style>p {{ margin: 0; }}</style><p>Dear {name},</p><p>{name} at {time}</p>"
+        template = EmailTemplate(source)
+        values = {"name": "Ann {x}", "time": "10:00 AM"}
+        self.assertEqual(template.render(values), source.format(**values))
+        self.assertEqual(template.fields, {"name", "time"})
+        with self.assertRaises(KeyError):
+            template.render({"name": "Ann"})
+        with self.assertRaises(ValueError):
+            EmailTemplate("{patient.name}")
+
+    def test_attachment_cached_until_file_changes(self):
+        """The file should be read once, then again only after it changes."""
+        from email.mime.application import MIMEApplication
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "form.pdf")
+            attachment = CachedAttachment(path, "form.pdf")
+            self.assertIsNone(attachment.part())
+
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 " * 100)
+            first = attachment.part()
+            attachment.part()
+            self.assertEqual(attachment.loads, 1)
+            self.assertEqual(first.get_payload(), MIMEApplication(b"%PDF-1.4 " * 100).get_payload())
+
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.7 changed")
+            os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+            self.assertEqual(attachment.part().get_payload(decode=True), b"%PDF-1.7 changed")
+            self.assertEqual(attachment.loads, 2)
+
+
+class FakeEmailService:
+    """Records delivered emails, optionally failing or taking time."""
+
+    def __init__(self, error=None, delay=0.0):
+        self.error = error
+        self.delay = delay
+        self.delivered = []
+
+    def build_message(self, kind, fields):
+        return {"kind": kind, **fields}
+
+    def deliver(self, msg):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.delivered.append(msg)
+
+
+class FakeSMSService:
+    """Records delivered texts; fails with a 503 while unhealthy."""
+
+    def __init__(self):
+        self.healthy = True
+        self.delivered = []
+
+    def send_once(self, phone, message):
+        if not self.healthy:
+            raise SMSDeliveryError("Service Unavailable", status=503)
+        self.delivered.append((phone, message))
+        return "SM1"
+
+
+class TestOutbox(unittest.TestCase):
+    """Test cases for the durable email/SMS outbox."""
+
+    def setUp(self):
+        self.db_path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+        self.email = FakeEmailService()
+        self.sms = FakeSMSService()
+
+    def make_outbox(self, **kwargs):
+        kwargs.setdefault("channel_workers", {})
+        return Outbox(db_path=self.db_path, max_attempts=2, backoff_seconds=0.01, poll_interval=0.01,
+                      email_service=self.email, sms_service=self.sms, **kwargs)
+
+    def test_retries_then_dead_letters_and_replays(self):
+        """A message failing every attempt should be dead-lettered, then delivered on replay."""
+        outbox = self.make_outbox()
+        self.sms.healthy = False
+        job_id = outbox.enqueue_sms("555-010-0000", "Reminder", group="APT1")
+        for _ in range(2):
+            outbox.run_pending()
+            time.sleep(0.02)
+
+        self.assertEqual(outbox.get_job(job_id)["status"], "failed")
+        letters = outbox.get_dead_letters()
+        self.assertEqual([(letter["channel"], letter["attempts"]) for letter in letters], [("sms", 2)])
+        self.assertEqual(outbox.get_stats()["dead_letters"], 1)
+
+        self.sms.healthy = True
+        self.assertEqual(outbox.replay([letters[0]["dead_letter_id"]]), 1)
+        self.assertEqual(outbox.run_pending(), 1)
+        self.assertEqual(outbox.get_job(job_id)["status"], "succeeded")
+        self.assertEqual(self.sms.delivered, [("555-010-0000", "Reminder")])
+        self.assertEqual(outbox.get_stats()["dead_letters"], 0)
+
+    def test_permanent_failure_is_not_retried(self):
+        """A refused recipient should go straight to the dead-letter table."""
+        import smtplib
+        self.email.error = smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")})
+        outbox = self.make_outbox()
+        outbox.enqueue_email("reminder", {"to_email": "a@example.com", "subject": "s", "message": "m"})
+        outbox.run_pending()
+        self.assertEqual([letter["attempts"] for letter in outbox.get_dead_letters("email")], [1])
+
+    def test_slow_send_is_not_sent_twice(self):
+        """A send outlasting the lease should not be picked up by a second outbox worker."""
+        self.email.delay = 0.8
+        outbox = self.make_outbox(lease_seconds=0.3)
+        other = self.make_outbox(lease_seconds=0.3)
+        outbox.enqueue_email("reminder", {"to_email": "a@example.com", "subject": "s", "message": "m"})
+
+        sender = threading.Thread(target=outbox.run_pending)
+        sender.start()
+        time.sleep(0.5)
+        self.assertEqual(other.run_pending(), 0)
+        sender.join()
+        self.assertEqual(len(self.email.delivered), 1)
+
+    def test_channels_drain_independently(self):
+        """Slow email should not hold up SMS, and requeueing reminders should not duplicate them."""
+        self.email.delay = 0.3
+        outbox = self.make_outbox(channel_workers={"email": 1, "sms": 2})
+        reminders = [{"reminder_id": f"R{i}", "appointment_id": "APT1",
+                      "email": {"to_email": f"p{i}@example.com", "subject": "s", "message": "m"},
+                      "sms": {"phone": f"555-010-{i:04d}", "message": "m"}} for i in range(4)]
+        job_ids = outbox.enqueue_reminders(reminders)
+        self.assertEqual(outbox.enqueue_reminders(reminders), job_ids)
+
+        outbox.start()
+        try:
+            self.assertTrue(outbox.wait_for(job_ids[1::2], timeout=5))
+            self.assertLess(len(self.email.delivered), 4)
+            self.assertTrue(outbox.wait_for(job_ids, timeout=5))
+        finally:
+            outbox.stop()
+        self.assertEqual(len(self.sms.delivered), 4)
+        self.assertEqual(len(self.email.delivered), 4)
+
+    def test_reminders_do_not_share_the_confirmation_group(self):
+        """Reminder messages should not overwrite the booking confirmation in its group status."""
+        outbox = self.make_outbox()
+        outbox.enqueue_email("confirmation", {"to_email": "p@example.com"}, idempotency_key="APT1:confirmation",
+                             group="APT1")
+        outbox.enqueue_reminders([{"reminder_id": "R1", "appointment_id": "APT1",
+                                   "email": {"to_email": "p@example.com", "subject": "s", "message": "m"},
+                                   "sms": {"phone": "555-010-0001", "message": "m"}}])
+
+        self.assertEqual(outbox.get_group_status("APT1"), {"email": "pending"})
+        self.assertEqual(outbox.get_group_status("APT1:reminders"), {"email": "pending", "sms": "pending"})
+
+
+class RecordingCalendar:
+    """Calendar stand-in that records cancellation batches."""
+
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel_appointments(self, appointment_ids):
+        if appointment_ids:
+            self.cancelled.append(list(appointment_ids))
+        return True
+
+
+class TestInboundSMSRouter(unittest.TestCase):
+    """Test cases for routing SMS replies to open reminders."""
+
+    def setUp(self):
+        import pandas as pd
+        self.pd = pd
+        temp_dir = tempfile.mkdtemp()
+        self.db = database.Database(temp_dir)
+        pd.DataFrame([{"patient_id": "P1", "name": "Jane Roe", "phone": "(555) 010-0001"},
+                      {"patient_id": "P2", "name": "John Doe", "phone": "555.010.0002"}]).to_csv(
+            self.db.patients_file, index=False)
+        self.reminders = [
+            {"reminder_id": "R1", "appointment_id": "APT1", "patient_id": "P1",
+             "reminder_datetime": "2030-01-01T09:00:00", "type": "initial", "status": "sent", "response": ""},
+            {"reminder_id": "R2", "appointment_id": "APT1", "patient_id": "P1",
+             "reminder_datetime": "2030-01-05T09:00:00", "type": "form_check", "status": "sent", "response": ""},
+            {"reminder_id": "R3", "appointment_id": "APT2", "patient_id": "P2",
+             "reminder_datetime": "2030-01-02T09:00:00", "type": "initial", "status": "sent", "response": ""},
+            {"reminder_id": "R4", "appointment_id": "APT2", "patient_id": "P2",
+             "reminder_datetime": "2030-01-08T09:00:00", "type": "confirmation", "status": "scheduled", "response": ""},
+        ]
+        pd.DataFrame(self.reminders).to_csv(self.db.reminders_file, index=False)
+
+        self.calendar = RecordingCalendar()
+        self.router = InboundSMSRouter(flush_seconds=10, batch_size=100)
+        self.router.db = self.db
+        self.router.calendar = self.calendar
+        self.router.prefetcher = None
+
+    def tearDown(self):
+        self.router.stop()
+
+    def statuses(self):
+        reminders_df = self.pd.read_csv(self.db.reminders_file, dtype=str)
+        return dict(zip(reminders_df["reminder_id"], reminders_df["status"]))
+
+    def test_index_follows_this_process_writes_without_reloading(self):
+        """Reminders saved, sent and answered here should update the index in place, not trigger a reload."""
+        self.router.start()
+        self.assertEqual(self.router.handle("+1 555 010 0002", "Yes")["reminder_ids"], ["R3"])
+
+        self.db.update_reminder_statuses({"R4": "sent"})
+        patient_id = self.db.create_patient_record({"name": "New Patient", "phone": "555-010-0003"})
+        self.db.save_reminder({"reminder_id": "R5", "appointment_id": "APT3", "patient_id": patient_id,
+                               "reminder_datetime": datetime(2030, 1, 3, 9), "days_before": 7,
+                               "type": "initial", "status": "scheduled"})
+        self.db.update_reminder_status("R5", "sent")
+
+        self.assertEqual(self.router.handle("555-010-0002", "done")["reminder_ids"], ["R4"])
+        self.assertEqual(self.router.handle("555-010-0003", "yes")["appointment_id"], "APT3")
+        self.assertEqual(self.router.get_stats()["reloads"], 1)
+
+        # A change made outside this process's listeners still rebuilds the index
+        self.router.stop()
+        self.pd.DataFrame(self.reminders).to_csv(self.db.reminders_file, index=False)
+        self.assertEqual(self.router.handle("555-010-0002", "yes")["reminder_ids"], ["R3"])
+        self.assertEqual(self.router.get_stats()["reloads"], 2)
+
+    def test_reply_answers_every_open_reminder_of_the_appointment(self):
+        """A reply should close the appointment's sent reminders and nothing else."""
+        result = self.router.handle("+1 555 010 0001", "Yes!")
+        self.assertTrue(result["matched"])
+        self.assertEqual((result["status"], result["appointment_id"]), ("confirmed", "APT1"))
+        self.assertEqual(sorted(result["reminder_ids"]), ["R1", "R2"])
+        self.assertEqual(self.statuses(), {"R1": "confirmed", "R2": "confirmed", "R3": "sent", "R4": "scheduled"})
+
+        again = self.router.handle("5550100001", "yes")
+        self.assertFalse(again["matched"])
+        unknown = self.router.handle("+15559999999", "yes")
+        self.assertEqual((unknown["matched"], unknown["reply"]), (False, UNKNOWN_NUMBER_REPLY))
+
+    def test_cancellation_frees_the_slot(self):
+        """A cancel reply should cancel the appointment along with its sent reminder."""
+        result = self.router.handle("555-010-0002", "Please cancel, sorry")
+        self.assertEqual(result["status"], "cancelled")
+        self.assertEqual(self.calendar.cancelled, [["APT2"]])
+        self.assertEqual(self.statuses()["R3"], "cancelled")
+
+    def test_cancellation_invalidates_cached_availability(self):
+        """Slots freed by an SMS cancellation should not stay hidden behind a cached availability scan."""
+        class RecordingPrefetcher:
+            def __init__(self):
+                self.invalidated = []
+
+            def invalidate(self, doctor, location):
+                self.invalidated.append((doctor, location))
+
+        self.pd.DataFrame([{"appointment_id": "APT1", "doctor": "Smith", "location": "Downtown"},
+                           {"appointment_id": "APT2", "doctor": "Wilson", "location": "Midtown"}]).to_excel(
+            self.db.appointments_file, index=False)
+        self.router.prefetcher = RecordingPrefetcher()
+
+        self.router.handle("555-010-0001", "yes")
+        self.assertEqual(self.router.prefetcher.invalidated, [])
+        self.router.handle("555-010-0002", "cancel")
+        self.assertEqual(self.router.prefetcher.invalidated, [("Wilson", "Midtown")])
+        self.assertEqual(self.statuses()["R4"], "scheduled")
+
+    def test_burst_is_written_once_and_new_reminders_are_picked_up(self):
+        """Queued replies should share one write, and reminders sent elsewhere should be routable."""
+        writes = []
+        update = self.db.update_reminder_responses
+        self.db.update_reminder_responses = lambda responses: writes.append(dict(responses)) or update(responses)
+        self.router.start()
+
+        self.router.handle("5550100001", "done")
+        self.router.handle("5550100002", "can we move it?")
+        self.assertEqual(writes, [])
+        self.router.stop()
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.statuses(), {"R1": "forms_completed", "R2": "forms_completed",
+                                           "R3": "reschedule_requested", "R4": "scheduled"})
+
+        with database.data_lock:
+            reminders_df = self.pd.read_csv(self.db.reminders_file, dtype=str)
+            reminders_df.loc[reminders_df["reminder_id"] == "R4", "status"] = "sent"
+            database.write_data_file(reminders_df, self.db.reminders_file)
+        self.assertEqual(self.router.handle("5550100002", "Y")["reminder_ids"], ["R4"])
+        self.assertEqual(self.router.get_stats()["reloads"], 2)
+
+    def test_replies_are_classified_by_whole_words(self):
+        """Words that merely contain a keyword's letters should not be read as that keyword."""
+        sms = SMSService()
+        expected = {
+            "NO": "cancelled",
+            "Please cancel": "cancelled",
+            "Yes, see you then": "confirmed",
+            "Yes, no problem": "confirmed",
+            "No problem, see you then": "possible_cancellation",
+            "Yes I will be there, no changes": "confirmed",
+            "No thank you": "possible_cancellation",
+            "yes cancel it": "possible_cancellation",
+            "Can I reschedule? no mornings": "reschedule_requested",
+            "Running late": "other",
+        }
+        for message, response_type in expected.items():
+            self.assertEqual(sms.process_sms_response("", message)["response_type"], response_type, message)
+
+    def test_unclear_reply_asks_before_cancelling(self):
+        """A reply that might mean cancel should keep the booking and the reminders open."""
+        result = self.router.handle("5550100002", "No problem, see you then")
+        self.assertEqual((result["matched"], result["status"]), (True, None))
+        self.assertIn("Reply CANCEL", result["reply"])
+        self.assertEqual(self.calendar.cancelled, [])
+        self.assertEqual(self.statuses()["R3"], "sent")
+
+        self.assertEqual(self.router.handle("5550100002", "cancel")["reminder_ids"], ["R3"])
+        self.assertEqual(self.calendar.cancelled, [["APT2"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
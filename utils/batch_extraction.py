@@ -0,0 +1,171 @@
+"""
+Offline batch extraction over archives of chat and SMS transcripts.
+
+The batch extractors run the same pure extractors the agents use (see
+utils.text_extraction) without constructing any LLM client. Input texts are
+streamed in chunks to a process pool; at most ``max_in_flight`` chunks are
+outstanding at once, so memory stays bounded however long the input is, and
+records are yielded in input order.
+
+Usage:
+    python -m utils.batch_extraction transcripts.jsonl --output records.jsonl --workers 4
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+import config
+from utils.text_extraction import PatientInfoExtractor, InsuranceInfoExtractor, Gazetteer, load_schedule_gazetteer
+from utils.payer_matcher import PayerMatcher, load_payer_aliases
+
+KINDS = ["patient", "insurance", "all"]
+
+# Extractors owned by each worker process (built once by _init_worker)
+_worker_extractors: List[Any] = []
+
+
+def _build_extractors(kind: str, doctors: List[str], locations: List[str], payer_aliases: Dict[str, str]) -> List[Any]:
+    extractors = []
+    if kind in ("patient", "all"):
+        extractors.append(PatientInfoExtractor(Gazetteer(doctors, locations)))
+    if kind in ("insurance", "all"):
+        extractors.append(InsuranceInfoExtractor(PayerMatcher(payer_aliases)))
+    return extractors
+
+
+def _init_worker(kind: str, doctors: List[str], locations: List[str], payer_aliases: Dict[str, str]):
+    """Process pool initializer: compile the extractors once per worker."""
+    global _worker_extractors
+    _worker_extractors = _build_extractors(kind, doctors, locations, payer_aliases)
+
+
+def _extract_chunk(texts: List[str], extractors: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    """Extract one record of found fields per text."""
+    extractors = _worker_extractors if extractors is None else extractors
+    records = []
+    for text in texts:
+        record: Dict[str, Any] = {}
+        for extractor in extractors:
+            record = extractor.extract(text, record)
+        records.append(record)
+    return records
+
+
+class BatchExtractor:
+    """Streams structured records for an iterable of texts using a process pool."""
+
+    def __init__(self, kind: str = "all", workers: int = None, chunk_size: int = 1000,
+                 max_in_flight: int = None, schedule_file: str = config.DOCTORS_SCHEDULE_XLSX,
+                 payers_file: str = config.INSURANCE_PAYERS_CSV):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}")
+
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or self.workers * 2
+
+        # Reference data is loaded once here and shipped to the workers
+        gazetteer = load_schedule_gazetteer(schedule_file)
+        self._init_args = (
+            kind,
+            list(gazetteer.doctors.values()),
+            list(gazetteer.locations.values()),
+            load_payer_aliases(payers_file)
+        )
+
+    def extract(self, texts: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Yield one record of extracted fields per input text, in input order."""
+        chunks = self._chunks(texts)
+
+        if self.workers <= 1:
+            extractors = _build_extractors(*self._init_args)
+            for chunk in chunks:
+                yield from _extract_chunk(chunk, extractors)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=self._init_args) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_extract_chunk, chunk))
+                if len(pending) >= self.max_in_flight:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _chunks(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        iterator = iter(texts)
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def extract_patient_batch(texts: Iterable[str], **kwargs) -> Iterator[Dict[str, Any]]:
+    """Stream name, date of birth, doctor and location records for texts."""
+    return BatchExtractor(kind="patient", **kwargs).extract(texts)
+
+
+def extract_insurance_batch(texts: Iterable[str], **kwargs) -> Iterator[Dict[str, Any]]:
+    """Stream insurance carrier, member ID and group number records for texts."""
+    return BatchExtractor(kind="insurance", **kwargs).extract(texts)
+
+
+def read_transcripts(path: str) -> Iterator[Tuple[Any, str]]:
+    """Yield (id, text) pairs from a JSONL file with a "text" field, or one message per line."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(line)
+                yield item.get("id", line_number), item.get("text", "")
+            else:
+                yield line_number, line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract patient and insurance fields from transcripts')
+    parser.add_argument('input', help='Transcript file (.jsonl with a "text" field, or one message per line)')
+    parser.add_argument('--output', default='-', help='Output JSONL file (default: stdout)')
+    parser.add_argument('--kind', choices=KINDS, default='all', help='Which fields to extract')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Messages per worker task')
+    args = parser.parse_args()
+
+    ids: collections.deque = collections.deque()
+
+    def texts():
+        for message_id, text in read_transcripts(args.input):
+            ids.append(message_id)
+            yield text
+
+    extractor = BatchExtractor(kind=args.kind, workers=args.workers, chunk_size=args.chunk_size)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    count = 0
+
+    try:
+        for record in extractor.extract(texts()):
+            out.write(json.dumps({"id": ids.popleft(), **record}) + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Extracted {count:,} messages in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f} msgs/sec)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,128 @@
-import requests
-import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
+import bisect
 import json
+import os
+import threading
+import zlib
+from utils.lazy_import import lazy_import
+from utils.database import data_generations, with_data_lock, write_data_file
+from utils.tracing import traced
+
+pd = lazy_import("pandas")
+
+class AvailabilityIndex:
+    """Confirmed bookings per doctor and location, reloaded only when appointments.xlsx changes.
+    
+    A change is noticed through the file's generation (bumped by every write made
+    through write_data_file, in any process in multi-process mode) or its stat.
+    """
+    
+    def __init__(self, appointments_file: str = "data/appointments.xlsx"):
+        self.appointments_file = appointments_file
+        self._signature = None
+        # (doctor, location) -> bookings sorted by start: ([starts], [(start, end)], longest booking)
+        self._bookings: Dict[Tuple[str, str], Tuple[List[datetime], List[Tuple[datetime, datetime]], timedelta]] = {}
+        self._etags: Dict[Tuple[str, str], str] = {}
+        self._reload_lock = threading.Lock()
+    
+    def is_available(self, doctor: str, location: str, start: datetime, duration: int, exact: bool = False) -> bool:
+        """Check a slot against the confirmed bookings without reading the file again.
+        
+        ``exact=True`` rereads the shared generation counter first; use it under data_lock before booking.
+        """
+        self._refresh(exact)
+        starts, intervals, longest = self._bookings.get((doctor.lower(), location.lower()), ([], [], timedelta(0)))
+        end = start + timedelta(minutes=int(duration))
+        # Only bookings starting within `longest` before the slot can reach into it
+        first = bisect.bisect_left(starts, start - longest)
+        last = bisect.bisect_left(starts, end)
+        return not any(booked_end > start for _, booked_end in intervals[first:last])
+    
+    def etag(self, doctor: str, location: str, exact: bool = False) -> str:
+        """Version of one doctor's bookings at one location; it changes whenever they do."""
+        self._refresh(exact)
+        return self._etags.get((doctor.lower(), location.lower()), "0")
+    
+    def invalidate(self):
+        """Force a reload on next use (call after writing appointments.xlsx)."""
+        self._signature = None
+    
+    def _stat(self, exact: bool = False) -> Tuple:
+        generation = data_generations.get(os.path.basename(self.appointments_file), exact=exact)
+        try:
+            stat = os.stat(self.appointments_file)
+            return (generation, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return ("missing",)
+    
+    def _refresh(self, exact: bool = False):
+        if self._stat(exact) == self._signature:
+            return
+        
+        # No data_lock: the file is replaced atomically, and taking the stat before the read means a
+        # write landing in between only costs one more reload
+        with self._reload_lock:
+            signature = self._stat(exact)
+            if signature == self._signature:
+                return
+            self._bookings, self._etags = self._load() if signature != ("missing",) else ({}, {})
+            self._signature = signature
+    
+    @traced("AvailabilityIndex.load", category="io")
+    def _load(self):
+        grouped: Dict[Tuple[str, str], List[Tuple[datetime, datetime]]] = {}
+        try:
+            appointments_df = pd.read_excel(self.appointments_file)
+            appointments_df = appointments_df[appointments_df['status'] == 'confirmed']
+            for doctor, location, start, duration in zip(appointments_df['doctor'], appointments_df['location'],
+                                                         pd.to_datetime(appointments_df['datetime']),
+                                                         appointments_df['duration']):
+                start = start.to_pydatetime()
+                minutes = int(duration) if pd.notna(duration) else 60
+                grouped.setdefault((str(doctor).lower(), str(location).lower()), []).append(
+                    (start, start + timedelta(minutes=minutes)))
+        
+        except Exception as e:
+            print(f"Error loading appointments for availability: {e}")
+        
+        bookings, etags = {}, {}
+        for key, intervals in grouped.items():
+            intervals.sort()
+            longest = max(end - start for start, end in intervals)
+            bookings[key] = ([start for start, _ in intervals], intervals, longest)
+            etags[key] = f"{len(intervals)}-{zlib.crc32(repr(intervals).encode()):08x}"
+        return bookings, etags
+
+
+_availability_index = None
+_availability_index_lock = threading.Lock()
+
+
+def get_availability_index() -> AvailabilityIndex:
+    """Return the shared availability index."""
+    global _availability_index
+    with _availability_index_lock:
+        if _availability_index is None:
+            _availability_index = AvailabilityIndex()
+        return _availability_index
+
 
 class CalendarIntegration:
     """Integration with calendar systems (Calendly simulation)."""
     
-    def __init__(self):
-        self.doctors_schedule_file = "data/doctors_schedule.xlsx"
+    def __init__(self, data_dir: str = "data"):
+        self.doctors_schedule_file = os.path.join(data_dir, "doctors_schedule.xlsx")
+        self.appointments_file = os.path.join(data_dir, "appointments.xlsx")
+        # The shared index covers the default data directory; any other directory gets its own
+        self.availability = get_availability_index() if data_dir == "data" else AvailabilityIndex(self.appointments_file)
         self._initialize_doctors_schedule()
     
+    @with_data_lock
     def _initialize_doctors_schedule(self):
         """Initialize doctors schedule if not exists."""
         
-        import os
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(os.path.dirname(self.doctors_schedule_file) or ".", exist_ok=True)
         
         if not os.path.exists(self.doctors_schedule_file):
             # Create sample doctor schedules
@@ -40,8 +147,9 @@ class CalendarIntegration:
             ]
             
             schedule_df = pd.DataFrame(doctors)
-            schedule_df.to_excel(self.doctors_schedule_file, index=False)
+            write_data_file(schedule_df, self.doctors_schedule_file)
     
+    @traced(category="io")
     def get_available_slots(self, doctor: str, location: str, duration: int, days_ahead: int = 14) -> List[Dict]:
         """Get available appointment slots for a doctor."""
         
@@ -99,46 +207,32 @@ class CalendarIntegration:
     
     def _is_slot_available(self, doctor: str, location: str, datetime_slot: datetime, duration: int) -> bool:
         """Check if a specific time slot is available."""
-        
-        try:
-            # Load existing appointments
-            appointments_df = pd.read_excel("data/appointments.xlsx")
-            
-            if appointments_df.empty:
-                return True
-            
-            # Convert datetime strings back to datetime objects for comparison
-            appointments_df['datetime'] = pd.to_datetime(appointments_df['datetime'])
-            
-            # Check for conflicts
-            slot_end = datetime_slot + timedelta(minutes=duration)
-            
-            conflicts = appointments_df[
-                (appointments_df['doctor'].str.lower() == doctor.lower()) &
-                (appointments_df['location'].str.lower() == location.lower()) &
-                (appointments_df['status'] == 'confirmed') &
-                (
-                    # Overlap conditions
-                    (appointments_df['datetime'] < slot_end) &
-                    (appointments_df['datetime'] + pd.to_timedelta(appointments_df['duration'], unit='m') > datetime_slot)
-                )
-            ]
-            
-            return conflicts.empty
-        
-        except Exception as e:
-            print(f"Error checking slot availability: {e}")
-            return True  # Assume available if error
+        return self.availability.is_available(doctor, location, datetime_slot, duration)
+    
+    def get_availability_etag(self, doctor: str, location: str) -> str:
+        """Version of the doctor's bookings at this location, stored with slots shown to a patient."""
+        return self.availability.etag(doctor, location)
     
-    def book_appointment(self, selected_slot: Dict, appointment_details: Dict) -> bool:
-        """Book an appointment slot."""
+    @with_data_lock
+    def book_appointment(self, selected_slot: Dict, appointment_details: Dict, availability_etag: Optional[str] = None) -> bool:
+        """Book an appointment slot.
+        
+        The slot is rechecked against current bookings unless ``availability_etag``
+        shows the doctor's bookings are unchanged since the slot was offered.
+        """
         
         try:
-            # In a real system, this would make an API call to Calendly
-            # For simulation, we'll just mark the slot as booked
+            doctor = appointment_details["doctor"]
+            location = appointment_details["location"]
+            duration = appointment_details.get("duration") or selected_slot.get("duration", 60)
+            
+            # Read the shared generation exactly: another process may have booked a moment ago
+            if availability_etag is None or availability_etag != self.availability.etag(doctor, location, exact=True):
+                if not self.availability.is_available(doctor, location, selected_slot['datetime'], duration, exact=True):
+                    return False
             
+            # In a real system, this would make an API call to Calendly
             # The appointment will be saved to the database by the calling function
-            # Here we simulate a successful booking
             return True
         
         except Exception as e:
@@ -181,24 +275,46 @@ class CalendarIntegration:
             print(f"Error getting doctor availability: {e}")
             return {"available": False, "message": "Error checking availability."}
     
+    @traced(category="io")
+    @with_data_lock
     def cancel_appointment(self, appointment_id: str) -> bool:
         """Cancel an appointment."""
         
         try:
-            appointments_df = pd.read_excel("data/appointments.xlsx")
+            appointments_df = pd.read_excel(self.appointments_file)
             appointments_df.loc[appointments_df['appointment_id'] == appointment_id, 'status'] = 'cancelled'
-            appointments_df.to_excel("data/appointments.xlsx", index=False)
+            write_data_file(appointments_df, self.appointments_file)
             return True
         
         except Exception as e:
             print(f"Error cancelling appointment: {e}")
             return False
     
+    @traced(category="io")
+    @with_data_lock
+    def cancel_appointments(self, appointment_ids: List[str]) -> bool:
+        """Cancel several appointments in one write."""
+        
+        if not appointment_ids:
+            return True
+        
+        try:
+            appointments_df = pd.read_excel(self.appointments_file)
+            appointments_df.loc[appointments_df['appointment_id'].isin(appointment_ids), 'status'] = 'cancelled'
+            write_data_file(appointments_df, self.appointments_file)
+            return True
+        
+        except Exception as e:
+            print(f"Error cancelling appointments: {e}")
+            return False
+    
+    @traced(category="io")
+    @with_data_lock
     def reschedule_appointment(self, appointment_id: str, new_datetime: datetime) -> bool:
         """Reschedule an existing appointment."""
         
         try:
-            appointments_df = pd.read_excel("data/appointments.xlsx")
+            appointments_df = pd.read_excel(self.appointments_file)
             
             # Find the appointment
             appointment_idx = appointments_df[appointments_df['appointment_id'] == appointment_id].index
@@ -208,7 +324,7 @@ class CalendarIntegration:
             
             # Update the datetime
             appointments_df.loc[appointment_idx[0], 'datetime'] = new_datetime.isoformat()
-            appointments_df.to_excel("data/appointments.xlsx", index=False)
+            write_data_file(appointments_df, self.appointments_file)
             
             return True
         
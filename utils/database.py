@@ -1,25 +1,71 @@
-import pandas as pd
 import uuid
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from datetime import datetime
+import functools
 import os
+import threading
+import config
+from utils.file_lock import FileLock, GenerationCounter, atomic_write
+from utils.lazy_import import lazy_import
+from utils.tracing import traced
+
+pd = lazy_import("pandas")
+
+# Serializes read-modify-writes of the shared data files between threads of one process, and between
+# processes too in multi-process mode. Plain reads go without it: write_data_file replaces files atomically,
+# so a reader always sees one whole version
+data_lock = FileLock(config.DATA_LOCK_FILE) if config.MULTIPROCESS_DATA else threading.RLock()
+
+# Change counters per data file, bumped by write_data_file; caches compare them to know when to reload
+data_generations = GenerationCounter(config.DATA_GENERATION_FILE if config.MULTIPROCESS_DATA else None)
+
+# Called with each reminder saved by this process (the reminder dispatcher registers here)
+reminder_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+# Called with (reminders file, rows) after this process saves reminders or writes their statuses; each row has
+# the reminder's reminder_id, appointment_id, patient_id, reminder_datetime and status (the SMS router registers here)
+reminder_status_listeners: List[Callable[[str, List[Dict[str, str]]], None]] = []
+
+# Called with (patients file, record) for each patient created by this process
+patient_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+def with_data_lock(method):
+    """Run the method while holding data_lock."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with data_lock:
+            return method(*args, **kwargs)
+    return wrapper
+
+def write_data_file(df, path: str):
+    """Replace a data file with the DataFrame (CSV or Excel by extension) and bump its generation.
+    
+    Call while holding data_lock. The file is written beside its destination and renamed into
+    place, so a reader in another process sees either the old or the new file, never part of one.
+    """
+    if path.endswith(".csv"):
+        atomic_write(path, lambda temp_path: df.to_csv(temp_path, index=False))
+    else:
+        atomic_write(path, lambda temp_path: df.to_excel(temp_path, index=False))
+    data_generations.bump(os.path.basename(path))
 
 class Database:
     """Mock database class for managing patient and appointment data."""
     
-    def __init__(self):
-        self.patients_file = "data/patients.csv"
-        self.appointments_file = "data/appointments.xlsx"
-        self.reminders_file = "data/reminders.csv"
+    def __init__(self, data_dir: str = "data"):
+        self.patients_file = os.path.join(data_dir, "patients.csv")
+        self.appointments_file = os.path.join(data_dir, "appointments.xlsx")
+        self.reminders_file = os.path.join(data_dir, "reminders.csv")
         
         # Initialize data files if they don't exist
         self._initialize_data_files()
     
+    @with_data_lock
     def _initialize_data_files(self):
         """Initialize data files with headers if they don't exist."""
         
         # Create data directory if it doesn't exist
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(os.path.dirname(self.patients_file) or ".", exist_ok=True)
         
         # Initialize patients file
         if not os.path.exists(self.patients_file):
@@ -28,7 +74,7 @@ class Database:
                 'preferred_doctor', 'location', 'first_visit', 'usual_doctor',
                 'insurance_carrier', 'member_id', 'group_number'
             ])
-            patients_df.to_csv(self.patients_file, index=False)
+            write_data_file(patients_df, self.patients_file)
         
         # Initialize appointments file
         if not os.path.exists(self.appointments_file):
@@ -36,7 +82,7 @@ class Database:
                 'appointment_id', 'patient_id', 'doctor', 'datetime',
                 'duration', 'location', 'status', 'created_at'
             ])
-            appointments_df.to_excel(self.appointments_file, index=False)
+            write_data_file(appointments_df, self.appointments_file)
         
         # Initialize reminders file
         if not os.path.exists(self.reminders_file):
@@ -44,8 +90,9 @@ class Database:
                 'reminder_id', 'appointment_id', 'patient_id', 'reminder_datetime',
                 'days_before', 'type', 'status', 'response'
             ])
-            reminders_df.to_csv(self.reminders_file, index=False)
+            write_data_file(reminders_df, self.reminders_file)
     
+    @traced(category="io")
     def search_patient(self, name: str, dob: str) -> List[Dict]:
         """Search for a patient by name and date of birth."""
         
@@ -70,6 +117,8 @@ class Database:
             print(f"Error searching patient: {e}")
             return []
     
+    @traced(category="io")
+    @with_data_lock
     def create_patient_record(self, patient_data: Dict[str, Any]) -> str:
         """Create a new patient record."""
         
@@ -93,7 +142,10 @@ class Database:
         try:
             patients_df = pd.read_csv(self.patients_file)
             patients_df = pd.concat([patients_df, pd.DataFrame([new_record])], ignore_index=True)
-            patients_df.to_csv(self.patients_file, index=False)
+            write_data_file(patients_df, self.patients_file)
+            
+            for listener in patient_listeners:
+                listener(self.patients_file, new_record)
             
             return patient_id
         
@@ -101,6 +153,24 @@ class Database:
             print(f"Error creating patient record: {e}")
             return None
     
+    @traced(category="io")
+    @with_data_lock
+    def find_or_create_patient(self, patient_data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Return (patient record, created), creating a record only when no patient matches.
+        
+        The search and the insert run under one lock, so a retried or concurrent lookup
+        for the same patient cannot add them twice.
+        """
+        
+        matches = self.search_patient(patient_data.get("name"), patient_data.get("date_of_birth"))
+        if matches:
+            return matches[0], False
+        
+        patient_id = self.create_patient_record(patient_data)
+        return {**patient_data, "patient_id": patient_id}, True
+    
+    @traced(category="io")
+    @with_data_lock
     def save_appointment(self, appointment_data: Dict[str, Any]) -> bool:
         """Save appointment to database."""
         
@@ -119,7 +189,7 @@ class Database:
             }
             
             appointments_df = pd.concat([appointments_df, pd.DataFrame([new_appointment])], ignore_index=True)
-            appointments_df.to_excel(self.appointments_file, index=False)
+            write_data_file(appointments_df, self.appointments_file)
             
             return True
         
@@ -127,6 +197,7 @@ class Database:
             print(f"Error saving appointment: {e}")
             return False
     
+    @traced(category="io")
     def get_appointment(self, appointment_id: str) -> Dict:
         """Get appointment by ID."""
         
@@ -147,6 +218,19 @@ class Database:
             print(f"Error getting appointment: {e}")
             return {}
     
+    @traced(category="io")
+    def get_appointments(self, appointment_ids: List[str]) -> List[Dict]:
+        """Get several appointments by ID with one read (fields as stored, datetimes not parsed)."""
+        
+        try:
+            appointments_df = pd.read_excel(self.appointments_file)
+            return appointments_df[appointments_df['appointment_id'].isin(appointment_ids)].to_dict('records')
+        
+        except Exception as e:
+            print(f"Error getting appointments: {e}")
+            return []
+    
+    @traced(category="io")
     def get_patient(self, patient_id: str) -> Dict:
         """Get patient by ID."""
         
@@ -163,6 +247,51 @@ class Database:
             print(f"Error getting patient: {e}")
             return {}
     
+    @traced(category="io")
+    def get_reminder_details(self, reminders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Join reminders to their appointments and patients, reading each file once.
+        
+        Returns {"reminder", "appointment", "patient"} per reminder, in order, with the
+        appointment and patient shaped as get_appointment and get_patient return them
+        ({} when not found).
+        """
+        
+        details = [{"reminder": reminder, "appointment": {}, "patient": {}} for reminder in reminders]
+        if not reminders:
+            return details
+        
+        try:
+            appointments_df = pd.read_excel(self.appointments_file, dtype={'appointment_id': str, 'patient_id': str})
+            patients_df = pd.read_csv(self.patients_file, dtype={'patient_id': str})
+        except Exception as e:
+            print(f"Error getting reminder details: {e}")
+            return details
+        
+        requested = pd.DataFrame({
+            'appointment_id': [str(reminder['appointment_id']) for reminder in reminders],
+            'patient_id': [str(reminder['patient_id']) for reminder in reminders]
+        })
+        appointments_df = appointments_df.drop_duplicates('appointment_id').add_prefix('appointment.')
+        patients_df = patients_df.drop_duplicates('patient_id').add_prefix('patient.')
+        joined = requested.merge(appointments_df, how='left', left_on='appointment_id', right_on='appointment.appointment_id') \
+                          .merge(patients_df, how='left', left_on='patient_id', right_on='patient.patient_id')
+        for column in ('appointment.datetime', 'appointment.created_at'):
+            joined[column] = pd.to_datetime(joined[column], format='ISO8601', errors='coerce').astype(object)
+        
+        appointment_columns = [column for column in joined.columns if column.startswith('appointment.')]
+        patient_columns = [column for column in joined.columns if column.startswith('patient.')]
+        # An appointment whose time does not parse is treated as missing, as get_appointment would fail on it
+        found_appointments = (joined['appointment.appointment_id'].notna() & joined['appointment.datetime'].notna()).tolist()
+        found_patients = joined['patient.patient_id'].notna().tolist()
+        for detail, row, has_appointment, has_patient in zip(details, joined.to_dict('records'), found_appointments, found_patients):
+            if has_appointment:
+                detail["appointment"] = {column[len('appointment.'):]: row[column] for column in appointment_columns}
+            if has_patient:
+                detail["patient"] = {column[len('patient.'):]: row[column] for column in patient_columns}
+        
+        return details
+    
+    @traced(category="io")
     def get_patient_appointments(self, patient_id: str) -> List[Dict]:
         """Get all appointments for a patient."""
         
@@ -183,6 +312,8 @@ class Database:
             print(f"Error getting patient appointments: {e}")
             return []
     
+    @traced(category="io")
+    @with_data_lock
     def save_reminder(self, reminder_data: Dict[str, Any]) -> bool:
         """Save reminder to database."""
         
@@ -201,7 +332,11 @@ class Database:
             }
             
             reminders_df = pd.concat([reminders_df, pd.DataFrame([new_reminder])], ignore_index=True)
-            reminders_df.to_csv(self.reminders_file, index=False)
+            write_data_file(reminders_df, self.reminders_file)
+            self._notify_status_listeners(reminders_df, [reminder_data['reminder_id']])
+            
+            for listener in reminder_listeners:
+                listener(reminder_data)
             
             return True
         
@@ -209,19 +344,44 @@ class Database:
             print(f"Error saving reminder: {e}")
             return False
     
+    @traced(category="io")
+    @with_data_lock
     def update_reminder_status(self, reminder_id: str, status: str) -> bool:
         """Update reminder status."""
         
         try:
             reminders_df = pd.read_csv(self.reminders_file)
             reminders_df.loc[reminders_df['reminder_id'] == reminder_id, 'status'] = status
-            reminders_df.to_csv(self.reminders_file, index=False)
+            write_data_file(reminders_df, self.reminders_file)
+            self._notify_status_listeners(reminders_df, [reminder_id])
             return True
         
         except Exception as e:
             print(f"Error updating reminder status: {e}")
             return False
     
+    @traced(category="io")
+    @with_data_lock
+    def update_reminder_statuses(self, statuses: Dict[str, str]) -> bool:
+        """Update the status of many reminders (reminder ID -> status) in one write."""
+        
+        if not statuses:
+            return True
+        
+        try:
+            reminders_df = pd.read_csv(self.reminders_file, dtype={'reminder_id': str})
+            new_status = reminders_df['reminder_id'].map(statuses)
+            reminders_df['status'] = new_status.where(new_status.notna(), reminders_df['status'])
+            write_data_file(reminders_df, self.reminders_file)
+            self._notify_status_listeners(reminders_df, statuses)
+            return True
+        
+        except Exception as e:
+            print(f"Error updating reminder statuses: {e}")
+            return False
+    
+    @traced(category="io")
+    @with_data_lock
     def update_reminder_response(self, reminder_id: str, status: str, response: str) -> bool:
         """Update reminder response."""
         
@@ -229,13 +389,52 @@ class Database:
             reminders_df = pd.read_csv(self.reminders_file)
             reminders_df.loc[reminders_df['reminder_id'] == reminder_id, 'status'] = status
             reminders_df.loc[reminders_df['reminder_id'] == reminder_id, 'response'] = response
-            reminders_df.to_csv(self.reminders_file, index=False)
+            write_data_file(reminders_df, self.reminders_file)
+            self._notify_status_listeners(reminders_df, [reminder_id])
             return True
         
         except Exception as e:
             print(f"Error updating reminder response: {e}")
             return False
     
+    @traced(category="io")
+    @with_data_lock
+    def update_reminder_responses(self, responses: Dict[str, Tuple[str, str]]) -> bool:
+        """Record many replies (reminder ID -> (status, response text)) in one write."""
+        
+        if not responses:
+            return True
+        
+        try:
+            reminders_df = pd.read_csv(self.reminders_file, dtype={'reminder_id': str, 'status': str, 'response': str})
+            matched = reminders_df['reminder_id'].isin(responses.keys())
+            reminders_df.loc[matched, 'status'] = reminders_df.loc[matched, 'reminder_id'].map(lambda rid: responses[rid][0])
+            reminders_df.loc[matched, 'response'] = reminders_df.loc[matched, 'reminder_id'].map(lambda rid: responses[rid][1])
+            write_data_file(reminders_df, self.reminders_file)
+            self._notify_status_listeners(reminders_df, responses)
+            return True
+        
+        except Exception as e:
+            print(f"Error updating reminder responses: {e}")
+            return False
+    
+    def _notify_status_listeners(self, reminders_df, reminder_ids):
+        """Pass the rows of reminders whose status was just written to reminder_status_listeners."""
+        
+        if not reminder_status_listeners:
+            return
+        
+        changed = reminders_df[reminders_df['reminder_id'].astype(str).isin([str(rid) for rid in reminder_ids])]
+        rows = [
+            {"reminder_id": str(reminder_id), "appointment_id": str(appointment_id), "patient_id": str(patient_id),
+             "reminder_datetime": str(due), "status": str(status)}
+            for reminder_id, appointment_id, patient_id, due, status in zip(
+                changed['reminder_id'], changed['appointment_id'], changed['patient_id'],
+                changed['reminder_datetime'], changed['status'])
+        ]
+        for listener in reminder_status_listeners:
+            listener(self.reminders_file, rows)
+    
     def generate_appointment_id(self) -> str:
         """Generate a unique appointment ID."""
         return f"APT{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:6].upper()}"
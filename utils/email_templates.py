@@ -0,0 +1,226 @@
+"""
+Precompiled email templates and a cached intake-form attachment.
+
+EmailService used to build every message from scratch: an f-string render
+of the whole HTML body (static CSS included) and a fresh read and base64
+encoding of the intake form PDF for each confirmation. Here each template is
+split once into its static text and its named slots, so rendering is a
+single join of the pieces with the slot values dropped in. The intake form
+is encoded once and kept in memory; its size and mtime are checked on each
+use and it is re-read only when the file has changed (or appeared, or gone).
+Multipart messages get a random boundary up front, because otherwise the
+email generator compiles a fresh regular expression for every message it
+serializes just to pick one.
+"""
+
+from email.mime.base import MIMEBase
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import os
+import threading
+import uuid
+import config
+
+
+class EmailTemplate:
+    """A ``str.format``-style template compiled once into static text and named slots."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                self._parts.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Unsupported template field: {{{field}}}")
+            self._slots.append((len(self._parts), field))
+            self._parts.append("")
+        self.fields = frozenset(field for _, field in self._slots)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Fill the slots from ``values``; a missing value raises KeyError."""
+        parts = self._parts.copy()
+        for position, field in self._slots:
+            parts[position] = str(values[field])
+        return "".join(parts)
+
+
+class CachedAttachment:
+    """A file attachment encoded once and re-read only when the file changes on disk."""
+
+    def __init__(self, path: str, filename: str, maintype: str = "application", subtype: str = "octet-stream"):
+        self.path = path
+        self.filename = filename
+        self.maintype = maintype
+        self.subtype = subtype
+        self.loads = 0
+        self._signature = None
+        self._payload: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def part(self) -> Optional[MIMEBase]:
+        """A new MIME part carrying the cached payload, or None if the file does not exist."""
+        payload = self._current_payload()
+        if payload is None:
+            return None
+        part = MIMEBase(self.maintype, self.subtype, name=self.filename)
+        part["Content-Transfer-Encoding"] = "base64"
+        part["Content-Disposition"] = f'attachment; filename="{self.filename}"'
+        part.set_payload(payload)
+        return part
+
+    def _current_payload(self) -> Optional[str]:
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+
+        with self._lock:
+            if signature != self._signature:
+                self._payload = self._load() if signature is not None else None
+                self._signature = signature
+            return self._payload
+
+    def _load(self) -> Optional[str]:
+        try:
+            with open(self.path, "rb") as attachment:
+                data = attachment.read()
+        except OSError as e:
+            print(f"Error reading attachment {self.path}: {e}")
+            return None
+        self.loads += 1
+        # Wrapped at 76 characters, as email.encoders.encode_base64 would
+        return base64.encodebytes(data).decode("ascii")
+
+
+def multipart_boundary() -> str:
+    """A random MIME boundary that cannot realistically occur in a message body."""
+    return "===============" + uuid.uuid4().hex + "=="
+
+
+CONFIRMATION_TEMPLATE = EmailTemplate("""
+        <html>
+        <head>
+            <style>
+                .container {{ font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; }}
+                .header {{ background-color: #2c5aa0; color: white; padding: 20px; text-align: center; }}
+                .content {{ padding: 20px; }}
+                .appointment-details {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
+                .important {{ background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0; }}
+                .footer {{ background-color: #6c757d; color: white; padding: 15px; text-align: center; font-size: 12px; }}
+                ul {{ padding-left: 20px; }}
+                li {{ margin: 5px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>🏥 Appointment Confirmed!</h1>
+                </div>
+                
+                <div class="content">
+                    <p>Dear {name},</p>
+                    
+                    <p>Your appointment has been successfully scheduled. Here are your details:</p>
+                    
+                    <div class="appointment-details">
+                        <h3>📅 Appointment Details</h3>
+                        <ul>
+                            <li><strong>Date:</strong> {appointment_date}</li>
+                            <li><strong>Time:</strong> {appointment_time}</li>
+                            <li><strong>Doctor:</strong> Dr. {doctor}</li>
+                            <li><strong>Duration:</strong> {duration} minutes</li>
+                            <li><strong>Location:</strong> {location}</li>
+                            <li><strong>Appointment ID:</strong> {appointment_id}</li>
+                        </ul>
+                    </div>
+                    
+                    <div class="appointment-details">
+                        <h3>🏥 Insurance Information</h3>
+                        <ul>
+                            <li><strong>Carrier:</strong> {insurance_carrier}</li>
+                            <li><strong>Member ID:</strong> {member_id}</li>
+                            <li><strong>Group Number:</strong> {group_number}</li>
+                        </ul>
+                    </div>
+                    
+                    <div class="important">
+                        <h3>📋 Important Reminders</h3>
+                        <ul>
+                            <li>Please arrive 15 minutes early for check-in</li>
+                            <li>Bring a valid photo ID</li>
+                            <li>Bring your insurance card</li>
+                            <li>Complete the attached intake forms before your visit</li>
+                            <li>Bring a list of current medications</li>
+                        </ul>
+                    </div>
+                    
+                    <p><strong>📎 Attached Documents:</strong></p>
+                    <ul>
+                        <li>Patient Intake Form - Please complete and bring with you</li>
+                    </ul>
+                    
+                    <p><strong>📞 Need to make changes?</strong><br>
+                    Contact us at least 24 hours in advance to reschedule or cancel your appointment.</p>
+                    
+                    <p>We look forward to seeing you!</p>
+                    
+                    <p>Best regards,<br>
+                    The Medical Scheduling Team</p>
+                </div>
+                
+                <div class="footer">
+                    <p>This is an automated message. Please do not reply to this email.</p>
+                    <p>© 2025 AI Medical Scheduling System</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """)
+
+# Wrapper for plain-text reminder messages (newlines already converted to <br>)
+REMINDER_TEMPLATE = EmailTemplate("""
+        <html>
+        <head></head>
+        <body>
+            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                {html_message}
+            </div>
+        </body>
+        </html>
+        """)
+
+FORM_REMINDER_TEMPLATE = EmailTemplate("""
+        <html>
+        <head></head>
+        <body style="font-family: Arial, sans-serif;">
+            <div style="max-width: 600px; margin: 0 auto;">
+                <h2>📋 Intake Forms Reminder</h2>
+                <p>Dear {patient_name},</p>
+                <p>We hope you're looking forward to your upcoming appointment on <strong>{appointment_date}</strong>.</p>
+                <p>To help us provide you with the best care possible, please remember to complete your intake forms before your visit.</p>
+                <p>If you haven't received the forms or need assistance, please contact us immediately.</p>
+                <p>Thank you for your attention to this matter.</p>
+                <p>Best regards,<br>The Medical Team</p>
+            </div>
+        </body>
+        </html>
+        """)
+
+
+_intake_form = None
+_intake_form_lock = threading.Lock()
+
+
+def get_intake_form() -> CachedAttachment:
+    """Return the shared cached intake form attachment."""
+    global _intake_form
+    with _intake_form_lock:
+        if _intake_form is None:
+            _intake_form = CachedAttachment(config.INTAKE_FORM_PDF, "Patient_Intake_Form.pdf")
+        return _intake_form
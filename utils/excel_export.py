@@ -1,7 +1,10 @@
-import pandas as pd
 from typing import Dict, Any
 from datetime import datetime
 import os
+from utils.lazy_import import lazy_import
+from utils.tracing import traced
+
+pd = lazy_import("pandas")
 
 class ExcelExporter:
     """Excel export functionality for appointment data and reports."""
@@ -10,6 +13,7 @@ class ExcelExporter:
         self.export_directory = "exports"
         os.makedirs(self.export_directory, exist_ok=True)
     
+    @traced(category="io")
     def export_appointment(self, patient_data: Dict[str, Any], appointment_data: Dict[str, Any], insurance_data: Dict[str, Any]) -> str:
         """Export single appointment to Excel for admin review."""
         
@@ -0,0 +1,201 @@
+"""
+Cross-process coordination for the shared data files.
+
+The CSV and Excel files under data/ are rewritten in full on every change,
+so several processes (Streamlit sessions, API workers) mutating them at
+once lose updates or leave half-written workbooks behind. This module
+provides the three pieces the multi-process mode (MULTIPROCESS_DATA=true)
+is built from:
+
+* ``FileLock``: an advisory lock on a lock file (fcntl.flock, or
+  msvcrt.locking on Windows) that is also reentrant and thread-safe within
+  a process, so it can stand in for the in-process data_lock.
+* ``atomic_write``: write a file next to its destination and rename it
+  into place, so readers never see a partial file even without the lock.
+* ``GenerationCounter``: per-file change counters. Every writer bumps the
+  counter for the file it changed; caches remember the generation they were
+  built at and rebuild when it moves. In multi-process mode the counters
+  live in a small shared file (replaced atomically, so checking for
+  changes is one os.stat), otherwise in memory.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Read once at import: os.umask can only be read by setting it, which is not thread-safe later on
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class FileLock:
+    """Reentrant lock held across threads of this process and across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self._pid = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                self._lock_file()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                self._unlock_file()
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def _open(self):
+        # A forked child shares its parent's open file description, and with it the lock; reopen instead
+        if self._file is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a+b")
+            self._pid = os.getpid()
+        return self._file
+
+    def _lock_file(self):
+        lock_file = self._open()
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            return
+        lock_file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after about 10 seconds; keep waiting like flock does
+                time.sleep(0.05)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path: str, write: Callable[[str], None]):
+    """Call write(temp_path) for a temp file beside path, then rename it over path."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    base, extension = os.path.splitext(os.path.basename(path))
+    # Keep the extension: pandas picks the CSV/Excel writer from it
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{base}.", suffix=extension)
+    os.close(fd)
+    try:
+        write(temp_path)
+        # mkstemp creates the file 0600; give it the destination's mode (or the usual new-file mode)
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class GenerationCounter:
+    """Per-file change counters, shared through a file when ``path`` is set."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._signature: Optional[Tuple] = None
+        # Recent generations produced by this process, per file
+        self._own: Dict[str, "OrderedDict[int, None]"] = {}
+
+    def get(self, name: str, exact: bool = False) -> int:
+        """Current generation of one data file (0 until it is first changed).
+
+        By default a shared counter file is only re-read when its stat changes;
+        ``exact=True`` always re-reads it (use under data_lock before a write
+        that depends on the answer).
+        """
+        with self._lock:
+            if self.path is not None:
+                self._reload(force=exact)
+            return self._counters.get(name, 0)
+
+    def bump(self, name: str) -> int:
+        """Record a change to a data file; call while holding data_lock. Returns the new generation."""
+        with self._lock:
+            if self.path is not None:
+                self._reload(force=True)
+            counters = dict(self._counters)
+            counters[name] = counters.get(name, 0) + 1
+            if self.path is not None:
+                atomic_write(self.path, lambda temp_path: _write_json(temp_path, counters))
+                self._signature = _stat_signature(self.path)
+            self._counters = counters
+            own = self._own.setdefault(name, OrderedDict())
+            own[counters[name]] = None
+            if len(own) > 1024:
+                own.popitem(last=False)
+            return counters[name]
+
+    def changed_elsewhere(self, name: str, since: int) -> bool:
+        """Whether another process changed the file after generation ``since``."""
+        current = self.get(name)
+        with self._lock:
+            own = self._own.get(name, {})
+            return any(generation not in own for generation in range(since + 1, current + 1))
+
+    def _reload(self, force: bool = False):
+        signature = _stat_signature(self.path)
+        if signature == self._signature and not force:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._counters = json.load(f)
+        except (OSError, ValueError):
+            self._counters = {}
+        self._signature = signature
+
+
+def _stat_signature(path: str) -> Optional[Tuple]:
+    # Every bump renames a new file into place, so the inode usually changes even when mtime and size don't
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _write_json(path: str, value):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
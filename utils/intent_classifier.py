@@ -0,0 +1,108 @@
+"""
+Lightweight intent classifier for short conversational turns.
+
+Many turns are trivial ("yes", "option 3", "cancel") and do not need an LLM
+round trip. The classifier walks the message tokens once through a phrase
+trie built from the same phrase lists the mock LLM and reminder responses
+use, and only labels a message when every token is a known keyword, number
+or filler word. Anything else is reported as ``open`` and left to the LLM.
+"""
+
+from typing import Any, Dict, Optional
+import re
+
+CONFIRM = "confirm"
+DENY = "deny"
+SELECT = "select"
+CANCEL = "cancel"
+RESTART = "restart"
+OPEN = "open"
+
+# Messages longer than this are treated as open-ended
+MAX_TRIVIAL_WORDS = 8
+
+_PHRASES = {
+    CONFIRM: [
+        "yes", "yeah", "yep", "y", "sure", "confirm", "confirmed", "correct", "right", "ok", "okay",
+        "that works", "sounds good", "looks good", "will be there", "attending", "perfect", "great"
+    ],
+    DENY: ["no", "nope", "n", "not really", "can't", "cannot", "none of those", "neither"],
+    CANCEL: ["cancel", "cancel it", "cancel that", "never mind", "nevermind", "forget it", "stop"],
+    RESTART: ["restart", "start over", "start again", "begin again", "reset", "new appointment"],
+    SELECT: ["option", "number", "slot", "choice", "#"],
+    "filler": [
+        "please", "the", "one", "i'll", "i", "will", "take", "want", "like", "would", "go", "with",
+        "for", "me", "is", "fine", "that", "it", "thanks", "thank", "you", "let's", "lets", "and", "a"
+    ]
+}
+
+_ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+    "1st": 1, "2nd": 2, "3rd": 3, "4th": 4, "5th": 5, "6th": 6
+}
+
+# Later intents win when a message mixes keywords ("no, cancel" -> cancel)
+_PRIORITY = [CONFIRM, DENY, SELECT, CANCEL, RESTART]
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+|#")
+
+
+def _build_trie() -> Dict[str, Any]:
+    """Compile the phrase lists into a token trie; leaves carry the category."""
+    trie: Dict[str, Any] = {}
+    for category, phrases in _PHRASES.items():
+        for phrase in phrases:
+            node = trie
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node.setdefault(None, category)
+    return trie
+
+
+_TRIE = _build_trie()
+
+
+def classify_intent(text: str) -> Dict[str, Any]:
+    """Classify a short message, returning its intent and any selected slot number."""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if not tokens or len(tokens) > MAX_TRIVIAL_WORDS:
+        return {"intent": OPEN, "slot_number": None}
+
+    found = set()
+    slot_number: Optional[int] = None
+    position = 0
+
+    while position < len(tokens):
+        token = tokens[position]
+
+        if token.isdigit() or token in _ORDINALS:
+            if slot_number is not None:
+                return {"intent": OPEN, "slot_number": None}
+            slot_number = int(token) if token.isdigit() else _ORDINALS[token]
+            found.add(SELECT)
+            position += 1
+            continue
+
+        # Longest phrase match starting at this token
+        node, category, length = _TRIE, None, 0
+        for offset, candidate in enumerate(tokens[position:]):
+            node = node.get(candidate)
+            if node is None:
+                break
+            if None in node:
+                category, length = node[None], offset + 1
+
+        if category is None:
+            return {"intent": OPEN, "slot_number": None}
+        if category != "filler":
+            found.add(category)
+        position += length
+
+    if SELECT in found and slot_number is None:
+        found.discard(SELECT)
+
+    for intent in reversed(_PRIORITY):
+        if intent in found:
+            return {"intent": intent, "slot_number": slot_number if intent == SELECT else None}
+
+    return {"intent": OPEN, "slot_number": None}
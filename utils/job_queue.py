@@ -0,0 +1,318 @@
+"""
+Durable local job queue for side effects that should not block a reply.
+
+Jobs are rows in a SQLite database, so anything enqueued survives a restart.
+Worker threads claim due jobs under a lease (a job whose worker died is
+picked up again once the lease expires), run the registered handler and
+record the outcome. While a handler runs, a heartbeat thread keeps renewing
+its lease, so a slow job is never taken over and run a second time. A
+failing handler is retried with exponential backoff until ``max_attempts``
+is reached. Every job may carry an idempotency key: enqueueing the same key
+twice returns the existing job instead of running the side effect again.
+Jobs can also be tagged with a group (for example an appointment ID) so the
+UI can show the status of everything a booking triggered. A handler raises
+PermanentJobError for a failure that no retry can fix, and the job fails at
+once.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import random
+import sqlite3
+import threading
+import time
+import config
+from utils.serialization import dumps, loads
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (for example, an invalid address)."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT UNIQUE,
+    job_group TEXT,
+    job_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    next_run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_run_at);
+CREATE INDEX IF NOT EXISTS jobs_group ON jobs (job_group);
+"""
+
+
+class JobQueue:
+    """SQLite-backed job queue with worker threads, retries and idempotency keys."""
+
+    def __init__(self, db_path: str = config.JOB_QUEUE_DB, workers: int = config.JOB_QUEUE_WORKERS,
+                 max_attempts: int = config.JOB_MAX_ATTEMPTS, backoff_seconds: float = config.JOB_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = 300.0, lease_seconds: float = config.JOB_LEASE_SECONDS,
+                 poll_interval: float = 0.5):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self._handlers: Dict[str, Callable[[Any], Any]] = {}
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        # Jobs whose handler is running in this process; the heartbeat renews their leases
+        self._running: Dict[int, None] = {}
+        self._running_lock = threading.Lock()
+        self._heartbeat = None
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite serializes writers across threads and processes."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def register(self, job_type: str, handler: Callable[[Any], Any]):
+        """Register the function that runs jobs of this type (raise to signal failure)."""
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type: str, payload: Any, idempotency_key: str = None, group: str = None) -> int:
+        """Persist a job and return its ID (the existing job's ID if the key was seen before)."""
+        return self.enqueue_many([(job_type, payload, idempotency_key, group)])[0]
+
+    def enqueue_many(self, jobs: List[Tuple[str, Any, Optional[str], Optional[str]]]) -> List[int]:
+        """Persist (job_type, payload, idempotency_key, group) jobs in one transaction; returns their IDs."""
+        now = time.time()
+        connection = self._connection()
+        job_ids = []
+        inserted = False
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for job_type, payload, idempotency_key, group in jobs:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO jobs (idempotency_key, job_group, job_type, payload, status, max_attempts, "
+                    "next_run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (idempotency_key, group, job_type, dumps(payload), PENDING, self.max_attempts, now, now, now)
+                )
+                if cursor.rowcount:
+                    job_ids.append(cursor.lastrowid)
+                    inserted = True
+                else:
+                    job_ids.append(connection.execute(
+                        "SELECT job_id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+                    ).fetchone()["job_id"])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        if inserted:
+            with self._wakeup:
+                # Workers may only take some job types, so wake them all
+                self._wakeup.notify_all()
+        return job_ids
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._stopping = False
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker threads; jobs they have not claimed stay queued."""
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_pending(self, job_types: Tuple[str, ...] = None) -> int:
+        """Run every job that is currently due (of the given types) in the calling thread; returns the number run."""
+        count = 0
+        while True:
+            job = self._claim(job_types)
+            if job is None:
+                return count
+            self._run(job)
+            count += 1
+
+    def _worker_loop(self, job_types: Tuple[str, ...] = None):
+        while not self._stopping:
+            job = self._claim(job_types)
+            if job is not None:
+                self._run(job)
+                continue
+            with self._wakeup:
+                if not self._stopping:
+                    self._wakeup.wait(self.poll_interval)
+
+    def _claim(self, job_types: Tuple[str, ...] = None) -> Optional[sqlite3.Row]:
+        """Atomically lease the next due job (or one whose previous lease expired), optionally of the given types."""
+        now = time.time()
+        type_filter = f" AND job_type IN ({', '.join('?' * len(job_types))})" if job_types else ""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE ((status = ? AND next_run_at <= ?) OR (status = ? AND locked_until < ?))"
+                f"{type_filter} ORDER BY next_run_at LIMIT 1",
+                (PENDING, now, RUNNING, now, *(job_types or ()))
+            ).fetchone()
+            if job is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_until = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (RUNNING, now + self.lease_seconds, now, job["job_id"])
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return job
+
+    def _run(self, job: sqlite3.Row):
+        """Run a claimed job and record success, a scheduled retry, or final failure."""
+        attempts = job["attempts"] + 1
+        handler = self._handlers.get(job["job_type"])
+
+        self._ensure_heartbeat()
+        with self._running_lock:
+            self._running[job["job_id"]] = None
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type '{job['job_type']}'")
+            result = handler(loads(job["payload"]))
+        except Exception as e:
+            print(f"Job {job['job_id']} ({job['job_type']}) attempt {attempts} failed: {e}")
+            self._record_failure(job, attempts, e)
+            return
+        finally:
+            with self._running_lock:
+                self._running.pop(job["job_id"], None)
+
+        self._update(job["job_id"], status=SUCCEEDED, result=dumps(result), locked_until=None, last_error=None)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat is not None:
+            return
+        with self._running_lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        """Push the lease of every running job forward, a few times per lease period."""
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._running_lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            now = time.time()
+            try:
+                self._connection().execute(
+                    f"UPDATE jobs SET locked_until = ? WHERE status = ? AND job_id IN ({', '.join('?' * len(job_ids))})",
+                    (now + self.lease_seconds, RUNNING, *job_ids)
+                )
+            except sqlite3.Error as e:
+                print(f"Error renewing job leases: {e}")
+
+    def _record_failure(self, job: sqlite3.Row, attempts: int, error: Exception):
+        if attempts >= job["max_attempts"] or isinstance(error, PermanentJobError):
+            self._give_up(job, attempts, str(error))
+            return
+
+        # Exponential backoff with jitter so retries of a shared outage spread out
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        self._update(job["job_id"], status=PENDING, last_error=str(error), locked_until=None,
+                     next_run_at=time.time() + delay)
+
+    def _give_up(self, job: sqlite3.Row, attempts: int, error: str):
+        """Mark a job failed for good."""
+        self._update(job["job_id"], status=FAILED, last_error=error, locked_until=None)
+
+    def _update(self, job_id: int, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connection().execute(
+            f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id)
+        )
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Return a job's status, attempts, last error and result."""
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_group_status(self, group: str) -> Dict[str, str]:
+        """Return {job_type: status} for every job tagged with the group."""
+        rows = self._connection().execute(
+            "SELECT job_type, status FROM jobs WHERE job_group = ? ORDER BY job_id", (group,)
+        ).fetchall()
+        return {row["job_type"]: row["status"] for row in rows}
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        stats = {PENDING: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        stats.update({row["status"]: row["count"] for row in rows})
+        return stats
+
+    def wait_for(self, job_ids: List[int], timeout: float = 10.0) -> bool:
+        """Block until the jobs have succeeded or failed; returns False on timeout."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(self.get_job(job_id)["status"] in (SUCCEEDED, FAILED) for job_id in job_ids):
+                return True
+            time.sleep(0.05)
+        return False
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = loads(job["payload"])
+        job["result"] = loads(job["result"])
+        return job
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the shared, started job queue."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+            _job_queue.start()
+        return _job_queue
@@ -0,0 +1,87 @@
+"""
+Deferred imports and on-first-use construction.
+
+Startup used to import pandas, langchain, twilio and openpyxl and build every
+agent and service before the first message arrived. ``lazy_import`` returns
+a module stand-in that imports the real module on first attribute access,
+and ``lazy_component`` is a descriptor that builds an attribute (an agent, a
+service, an LLM client) the first time it is read, under a lock so
+concurrent first uses build it once. Assigning the attribute directly (as
+tests do) still works and wins over the factory.
+"""
+
+from typing import Any, Callable
+import importlib
+import sys
+import threading
+import types
+
+_import_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """Module stand-in that imports the real module on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _import_lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Return the module if it is already imported, otherwise a LazyModule for it."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+class lazy_component:
+    """Descriptor that builds an instance attribute on first access.
+
+    Usage::
+
+        class ReminderAgent:
+            db = lazy_component(lambda self: Database())
+    """
+
+    def __init__(self, factory: Callable[[Any], Any]):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.name = None
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+
+        with self.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.factory(instance)
+            return instance.__dict__[self.name]
@@ -0,0 +1,133 @@
+"""
+Request coalescing for LLM calls.
+
+Agents call ``self.llm(messages)`` one conversation turn at a time. Under load
+many sessions do this concurrently, so the coalescer gathers calls that arrive
+within a short window and dispatches them as one batch, then fans the results
+back out to the waiting callers.
+
+The collector thread only gathers calls; each batch runs on a small executor,
+so several batches can be in flight and a slow provider never stalls the
+collection of the next one. LangChain's ``generate()`` answers a list of
+prompts one after another, so models that have ``batch()`` (every LangChain
+Runnable) are called through it instead, which sends the prompts
+concurrently. Other models (the mocks) get one ``generate()`` call.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+import queue
+import threading
+import time
+
+
+class LLMRequestCoalescer:
+    """Wraps a chat model and batches concurrent single calls into generate()."""
+
+    def __init__(self, llm, max_batch_size: int = 16, max_wait_ms: float = 5.0, max_concurrent_batches: int = 8):
+        self.llm = llm
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._worker = None
+        self._executor = None
+        # Taken by the collector before handing a batch over; while every slot is busy, calls keep queueing into the next batch
+        self._slots = threading.BoundedSemaphore(self.max_concurrent_batches)
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "max_batch_size_seen": 0}
+
+    def __call__(self, messages):
+        """Submit a single call and block until its batch has been answered."""
+        return self.submit(messages).result()
+
+    def submit(self, messages) -> Future:
+        """Queue a single call; the returned future resolves to the AI message."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((messages, future))
+        return future
+
+    def generate(self, messages, **kwargs):
+        """Explicit batch calls bypass the coalescing window."""
+        return self.llm.generate(messages, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return counters describing how well calls are being coalesced."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _ensure_worker(self):
+        """Start the collector thread and the batch executor on first use."""
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                                    thread_name_prefix="llm-batch")
+                self._worker = threading.Thread(target=self._run, name="llm-coalescer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """Collect calls until the batch is full or the wait window closes."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._slots.acquire()
+            try:
+                self._executor.submit(self._dispatch, batch)
+            except BaseException:
+                self._slots.release()
+                raise
+
+    def _dispatch(self, batch: List[Tuple[Any, Future]]):
+        """Run one batch on the executor and resolve every future."""
+        try:
+            self._call_llm(batch)
+        finally:
+            self._slots.release()
+
+    def _call_llm(self, batch: List[Tuple[Any, Future]]):
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], len(batch))
+
+        if hasattr(self.llm, "batch"):
+            try:
+                results = self.llm.batch([messages for messages, _ in batch], return_exceptions=True)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            return
+
+        try:
+            result = self.llm.generate([messages for messages, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), generations in zip(batch, result.generations):
+            future.set_result(generations[0].message)
+
+        for _, future in batch[len(result.generations):]:
+            future.set_exception(RuntimeError("LLM returned fewer generations than requests in the batch"))
@@ -0,0 +1,76 @@
+"""
+Factory for the chat model used by the agents.
+
+Centralizes the DEMO_MODE switch and builds one shared client stack per
+model: the provider client, optionally wrapped in a request coalescer that
+batches calls across sessions, wrapped in the resilience layer whose circuit
+breaker is therefore shared by every agent talking to that model.
+"""
+
+from typing import Dict, Tuple
+import threading
+import config
+
+_shared_clients: Dict[Tuple[str, float], object] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def create_llm(llm_model: str = config.LLM_MODEL, temperature: float = config.LLM_TEMPERATURE):
+    """Return the chat model an agent should use for ``self.llm``."""
+    if not (config.LLM_BATCHING_ENABLED or config.LLM_RESILIENCE_ENABLED):
+        return _create_base_llm(llm_model, temperature)
+
+    key = (llm_model, temperature)
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            _shared_clients[key] = _create_shared_llm(llm_model, temperature)
+        return _shared_clients[key]
+
+
+def _create_shared_llm(llm_model: str, temperature: float):
+    """Build the wrapped client stack shared by every agent for this model."""
+    llm = _create_base_llm(llm_model, temperature)
+
+    if config.LLM_BATCHING_ENABLED:
+        from utils.llm_batcher import LLMRequestCoalescer
+
+        llm = LLMRequestCoalescer(
+            llm,
+            max_batch_size=config.LLM_BATCH_MAX_SIZE,
+            max_wait_ms=config.LLM_BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=config.LLM_BATCH_MAX_CONCURRENT
+        )
+
+    if config.LLM_RESILIENCE_ENABLED:
+        from utils.llm_resilience import ResilientLLM, CircuitBreaker
+
+        llm = ResilientLLM(
+            llm,
+            timeout=config.LLM_TIMEOUT_SECONDS,
+            max_retries=config.LLM_MAX_RETRIES,
+            hedging=config.LLM_HEDGING_ENABLED,
+            hedge_min_samples=config.LLM_HEDGE_MIN_SAMPLES,
+            breaker=CircuitBreaker(
+                failure_threshold=config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=config.LLM_CIRCUIT_RESET_SECONDS
+            )
+        )
+
+    return llm
+
+
+def _create_base_llm(llm_model: str, temperature: float):
+    """Create the underlying provider client (mock in demo mode)."""
+    if config.DEMO_MODE:
+        from utils.mock_llm import MockChatOpenAI, LatencyModel
+        return MockChatOpenAI(
+            model=llm_model,
+            temperature=temperature,
+            seed=config.MOCK_LLM_SEED,
+            latency_model=LatencyModel.from_config()
+        )
+
+    from langchain_openai import ChatOpenAI
+    if config.OPENAI_BASE_URL:
+        return ChatOpenAI(model=llm_model, temperature=temperature, base_url=config.OPENAI_BASE_URL)
+    return ChatOpenAI(model=llm_model, temperature=temperature)
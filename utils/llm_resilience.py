@@ -0,0 +1,185 @@
+"""
+Resilience layer for agent LLM calls.
+
+Wraps ``self.llm`` with a per-call deadline, bounded retries, an optional
+hedged second request fired after the observed p95 latency, and a circuit
+breaker. When the breaker is open (or the deadline is exhausted) callers get
+an ``LLMUnavailableError`` immediately so agents can answer from their
+template responses instead of stalling the conversation turn.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from typing import Any, Dict, Optional
+import threading
+import time
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM cannot answer within its deadline or the breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open trial request."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current breaker state, moving from open to half-open once the timeout passes."""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be attempted right now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold or on a failed trial."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+
+class ResilientLLM:
+    """Chat model wrapper adding deadlines, retries, hedging and a circuit breaker."""
+
+    def __init__(self, llm, timeout: float = 20.0, max_retries: int = 1, hedging: bool = False,
+                 hedge_min_samples: int = 20, breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = 32, latency_window: int = 200):
+        self.llm = llm
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "hedges": 0, "timeouts": 0, "failures": 0, "short_circuited": 0}
+
+    def __call__(self, messages):
+        """Call the LLM within the deadline, raising LLMUnavailableError on failure."""
+        self._count("calls")
+        deadline = time.monotonic() + self.timeout
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow_request():
+                self._count("short_circuited")
+                raise LLMUnavailableError("LLM circuit breaker is open") from last_error
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self._count("retries")
+
+            try:
+                response = self._call_once(messages, remaining)
+            except Exception as e:
+                last_error = e
+                self.breaker.record_failure()
+                continue
+
+            self.breaker.record_success()
+            return response
+
+        self._count("failures")
+        raise LLMUnavailableError(f"LLM call failed: {last_error}") from last_error
+
+    def generate(self, messages, **kwargs):
+        """Explicit batch calls are passed through unchanged."""
+        return self.llm.generate(messages, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return call counters, the current hedge delay and breaker state."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["p95_latency"] = self._p95_latency()
+        stats["breaker_state"] = self.breaker.state
+        return stats
+
+    def _call_once(self, messages, timeout: float):
+        """Run one attempt, firing a hedged duplicate if the first is slower than p95."""
+        futures = [self._executor.submit(self._timed_call, messages)]
+        start = time.monotonic()
+
+        hedge_delay = self._p95_latency() if self.hedging else None
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                self._count("hedges")
+                futures.append(self._executor.submit(self._timed_call, messages))
+
+        first_error = None
+        pending = set(futures)
+        while pending:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                first_error = first_error or future.exception()
+
+        if first_error is not None and not pending:
+            raise first_error
+
+        self._count("timeouts")
+        raise TimeoutError(f"LLM call exceeded {timeout:.2f}s deadline")
+
+    def _timed_call(self, messages):
+        start = time.monotonic()
+        response = self.llm(messages)
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        return response
+
+    def _p95_latency(self) -> Optional[float]:
+        """p95 of recent successful call latencies, or None until enough samples exist."""
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
@@ -1,14 +1,35 @@
 """
 Mock LLM implementation for demo purposes when OpenAI API is not available.
+
+MockChatOpenAI doubles as a benchmarking stand-in: responses are drawn from a
+seedable RNG, calls can sleep according to a LatencyModel (time to first
+token, per-token rate and tail outliers), and every message carries simulated
+token usage. MockOpenAIServer exposes the same model over the OpenAI chat
+completions wire format so the real ChatOpenAI client path can be load-tested
+without network access::
+
+    python -m utils.mock_llm --port 8001 --seed 42
 """
 
-from typing import List, Dict, Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional
+import argparse
+import json
 import random
+import threading
+import time
+from utils.prompt_builder import count_tokens
 
 class MockMessage:
     """Mock message response."""
-    def __init__(self, content: str):
+    def __init__(self, content: str, usage_metadata: Optional[Dict[str, int]] = None):
         self.content = content
+        self.usage_metadata = usage_metadata or {}
+        self.response_metadata = {"token_usage": {
+            "prompt_tokens": self.usage_metadata.get("input_tokens", 0),
+            "completion_tokens": self.usage_metadata.get("output_tokens", 0),
+            "total_tokens": self.usage_metadata.get("total_tokens", 0)
+        }}
 
 class MockChatGeneration:
     """Mock chat generation."""
@@ -20,24 +41,116 @@ class MockGenerationResult:
     def __init__(self, generations: List[List[MockChatGeneration]]):
         self.generations = generations
 
+class LatencyModel:
+    """Latency distribution for simulated LLM calls.
+    
+    A call takes time-to-first-token (with gaussian jitter) plus a per-token
+    generation time; with ``tail_probability`` the whole call is multiplied by
+    ``tail_multiplier`` to model slow outliers.
+    """
+    
+    def __init__(self, ttft_ms: float = 0.0, ttft_jitter_ms: float = 0.0, per_token_ms: float = 0.0,
+                 tail_probability: float = 0.0, tail_multiplier: float = 1.0):
+        self.ttft_ms = ttft_ms
+        self.ttft_jitter_ms = ttft_jitter_ms
+        self.per_token_ms = per_token_ms
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+    
+    @classmethod
+    def from_config(cls) -> "LatencyModel":
+        """Build the latency model from the MOCK_LLM_* settings."""
+        import config
+        return cls(
+            ttft_ms=config.MOCK_LLM_TTFT_MS,
+            ttft_jitter_ms=config.MOCK_LLM_TTFT_JITTER_MS,
+            per_token_ms=config.MOCK_LLM_PER_TOKEN_MS,
+            tail_probability=config.MOCK_LLM_TAIL_PROBABILITY,
+            tail_multiplier=config.MOCK_LLM_TAIL_MULTIPLIER
+        )
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttft_ms > 0 or self.per_token_ms > 0
+    
+    def sample(self, completion_tokens: int, rng: random.Random) -> Dict[str, float]:
+        """Sample time to first token and per-token delay, in seconds."""
+        ttft = max(0.0, rng.gauss(self.ttft_ms, self.ttft_jitter_ms)) if self.ttft_jitter_ms else self.ttft_ms
+        per_token = self.per_token_ms
+        
+        if self.tail_probability and rng.random() < self.tail_probability:
+            ttft *= self.tail_multiplier
+            per_token *= self.tail_multiplier
+        
+        return {
+            "ttft": ttft / 1000.0,
+            "per_token": per_token / 1000.0,
+            "total": (ttft + per_token * completion_tokens) / 1000.0
+        }
+
 class MockChatOpenAI:
     """Mock implementation of ChatOpenAI for demo purposes."""
     
-    def __init__(self, model: str = "mock", temperature: float = 0.1, **kwargs):
+    def __init__(self, model: str = "mock", temperature: float = 0.1, seed: Optional[int] = None,
+                 latency_model: Optional[LatencyModel] = None, **kwargs):
         self.model = model
         self.temperature = temperature
+        self.latency_model = latency_model or LatencyModel()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
         
     def __call__(self, messages) -> MockMessage:
         """Mock the LLM call with predefined responses."""
-        return self._generate_mock_response(messages)
+        response = self._generate_mock_response(messages)
+        self._simulate_latency([response])
+        return response
     
     def generate(self, messages, **kwargs) -> MockGenerationResult:
-        """Mock the generate method."""
-        generations = []
-        for message_list in messages:
-            response = self._generate_mock_response(message_list)
-            generations.append([MockChatGeneration(message=response)])
-        return MockGenerationResult(generations=generations)
+        """Mock the generate method; a batch takes as long as its slowest member."""
+        responses = [self._generate_mock_response(message_list) for message_list in messages]
+        self._simulate_latency(responses)
+        return MockGenerationResult(generations=[[MockChatGeneration(message=response)] for response in responses])
+    
+    def sample_latency(self, completion_tokens: int) -> Dict[str, float]:
+        """Sample the latency of one call from the seeded RNG."""
+        with self._rng_lock:
+            return self.latency_model.sample(completion_tokens, self._rng)
+    
+    def _simulate_latency(self, responses: List[MockMessage]):
+        """Sleep for the sampled latency of the slowest response."""
+        if not self.latency_model.enabled:
+            return
+        delay = max(self.sample_latency(response.usage_metadata["output_tokens"])["total"] for response in responses)
+        time.sleep(delay)
+    
+    def _with_usage(self, messages, content: str) -> MockMessage:
+        """Wrap content in a message carrying simulated token usage."""
+        prompt_tokens = sum(count_tokens(self._content_of(message)) for message in self._as_list(messages))
+        completion_tokens = count_tokens(content)
+        
+        with self._rng_lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        
+        return MockMessage(content=content, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        })
+    
+    @staticmethod
+    def _as_list(messages) -> List[Any]:
+        if isinstance(messages, (str, MockMessage)) or hasattr(messages, 'content'):
+            return [messages]
+        return list(messages)
+    
+    @staticmethod
+    def _content_of(message) -> str:
+        if hasattr(message, 'content'):
+            return str(message.content)
+        return str(message)
     
     def _generate_mock_response(self, messages) -> MockMessage:
         """Generate appropriate mock responses based on the context."""
@@ -123,4 +236,206 @@ class MockChatOpenAI:
                 "Let me help you with that. Could you be more specific about what you're looking for?"
             ]
         
-        return MockMessage(content=random.choice(responses))
+        with self._rng_lock:
+            content = self._rng.choice(responses)
+        return self._with_usage(messages, content)
+
+class FaultInjectingChatModel:
+    """LLM stand-in that injects latency and failures, for resilience testing."""
+    
+    def __init__(self, llm=None, latency=0.0, failure_rate: float = 0.0, seed: int = None):
+        self.llm = llm or MockChatOpenAI()
+        # latency is either a fixed number of seconds or a callable returning one per call
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        
+    def __call__(self, messages) -> MockMessage:
+        """Sleep for the configured latency, then fail or answer."""
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+            should_fail = self._rng.random() < self.failure_rate
+        
+        delay = self.latency(call_number) if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        
+        if should_fail:
+            raise ConnectionError("Injected LLM failure")
+        
+        return self.llm(messages)
+    
+    def generate(self, messages, **kwargs) -> MockGenerationResult:
+        """Batch variant that applies the same faults to each message list."""
+        return MockGenerationResult(generations=[
+            [MockChatGeneration(message=self(message_list))] for message_list in messages
+        ])
+
+class MockOpenAIServer:
+    """Local HTTP server speaking the OpenAI chat completions wire format.
+    
+    Point ChatOpenAI at it with ``base_url=server.base_url`` (or the
+    OPENAI_BASE_URL setting) to exercise the real client path offline.
+    Supports ``POST /v1/chat/completions`` (including ``stream: true``) and
+    ``GET /v1/models``.
+    """
+    
+    def __init__(self, llm: Optional[MockChatOpenAI] = None, host: str = "127.0.0.1", port: int = 0):
+        self.llm = llm or MockChatOpenAI()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+        self._completion_ids = 0
+        self._ids_lock = threading.Lock()
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def start(self) -> "MockOpenAIServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+    
+    def serve_forever(self):
+        """Serve requests on the current thread until interrupted."""
+        self.httpd.serve_forever()
+    
+    def stop(self):
+        """Shut the server down and release the port."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def complete(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a chat completions request body (without simulating latency)."""
+        messages = [MockMessage(content=str(message.get("content") or "")) for message in request.get("messages", [])]
+        response = self.llm._generate_mock_response(messages)
+        usage = response.usage_metadata
+        
+        return {
+            "id": f"chatcmpl-mock-{self._next_id()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", self.llm.model),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": response.content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": usage["input_tokens"],
+                "completion_tokens": usage["output_tokens"],
+                "total_tokens": usage["total_tokens"]
+            }
+        }
+    
+    def _next_id(self) -> int:
+        with self._ids_lock:
+            self._completion_ids += 1
+            return self._completion_ids
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                if self.path.rstrip("/") in ("/v1/models", "/models"):
+                    self._send_json(200, {"object": "list", "data": [
+                        {"id": server.llm.model, "object": "model", "owned_by": "mock"}
+                    ]})
+                else:
+                    self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            
+            def do_POST(self):
+                if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+                    return
+                
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                    return
+                
+                completion = server.complete(request)
+                latency = server.llm.sample_latency(completion["usage"]["completion_tokens"])
+                
+                if request.get("stream"):
+                    self._stream(completion, latency)
+                else:
+                    time.sleep(latency["total"])
+                    self._send_json(200, completion)
+            
+            def _stream(self, completion: Dict[str, Any], latency: Dict[str, float]):
+                """Send the completion as server-sent event chunks, one per word."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                
+                content = completion["choices"][0]["message"]["content"]
+                words = content.split(" ")
+                time.sleep(latency["ttft"])
+                
+                for i, word in enumerate(words):
+                    delta = {"content": word if i == 0 else " " + word}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    self._send_chunk(completion, delta, None)
+                    time.sleep(latency["per_token"])
+                
+                self._send_chunk(completion, {}, "stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+            
+            def _send_chunk(self, completion: Dict[str, Any], delta: Dict[str, Any], finish_reason):
+                chunk = {
+                    "id": completion["id"],
+                    "object": "chat.completion.chunk",
+                    "created": completion["created"],
+                    "model": completion["model"],
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve the mock LLM over the OpenAI chat completions API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8001, help='Port to listen on')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for deterministic responses and latencies')
+    
+    args = parser.parse_args()
+    
+    mock_server = MockOpenAIServer(
+        MockChatOpenAI(seed=args.seed, latency_model=LatencyModel.from_config()),
+        host=args.host,
+        port=args.port
+    )
+    print(f"Mock OpenAI API listening on {mock_server.base_url}")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -0,0 +1,221 @@
+"""
+Local SMTP stand-in for testing and benchmarking EmailService offline.
+
+Speaks enough ESMTP for smtplib: EHLO/HELO (advertising PIPELINING and
+AUTH PLAIN), AUTH, MAIL, RCPT, DATA, RSET, NOOP and QUIT, one thread per
+connection. Accepted messages are recorded. ``latency`` simulates the
+network round trip: the server waits that long before answering whenever
+the client has stopped sending and is waiting for a reply, so a pipelined
+batch of commands pays it once. ``disconnect_all`` drops every open
+session, to exercise reconnects, and ``drop_after_data`` makes the server
+accept that many messages but hang up before replying to them (the
+ambiguous failure a client must not retry). ``pipelining = False`` stops
+advertising PIPELINING. STARTTLS is not offered; use the pool
+with ``starttls=False`` against it::
+
+    python -m utils.mock_smtp --port 8025 --latency 0.02
+"""
+
+from collections import Counter
+from typing import List, Optional, Tuple
+import argparse
+import base64
+import select
+import socket
+import socketserver
+import threading
+import time
+
+
+class MockSMTPServer:
+    """Threaded ESMTP server that records the messages it accepts."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 credentials: Optional[Tuple[str, str]] = None):
+        self.latency = latency
+        self.credentials = credentials
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self.stats = Counter()
+        self.pipelining = True
+        self.drop_after_data = 0
+        self._lock = threading.Lock()
+        self._sessions: List[socket.socket] = []
+        self._thread = None
+
+        self.tcp_server = socketserver.ThreadingTCPServer((host, port), self._make_handler(), bind_and_activate=False)
+        self.tcp_server.daemon_threads = True
+        self.tcp_server.allow_reuse_address = True
+        self.tcp_server.server_bind()
+        self.tcp_server.server_activate()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.tcp_server.server_address[:2]
+
+    def start(self) -> "MockSMTPServer":
+        """Serve connections on a background thread."""
+        self._thread = threading.Thread(target=self.tcp_server.serve_forever, name="mock-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve connections on the current thread until interrupted."""
+        self.tcp_server.serve_forever()
+
+    def stop(self):
+        """Shut the server down, drop open sessions and release the port."""
+        self.tcp_server.shutdown()
+        self.disconnect_all()
+        self.tcp_server.server_close()
+
+    def disconnect_all(self):
+        """Close every open client session without a goodbye, as a server restart would."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            try:
+                session.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+
+            def handle(self):
+                with server._lock:
+                    server._sessions.append(self.request)
+                server._count("connections")
+                # Pipelined replies go out as separate small writes; don't let Nagle hold them back
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.buffer = b""
+                self.authenticated = server.credentials is None
+                self.reset()
+                try:
+                    self.reply("220 mock-smtp ESMTP ready")
+                    while True:
+                        line = self.readline()
+                        if line is None:
+                            return
+                        if not self.command(line.decode("utf-8", "replace").strip()):
+                            return
+                except OSError:
+                    return
+                finally:
+                    with server._lock:
+                        if self.request in server._sessions:
+                            server._sessions.remove(self.request)
+
+            def reset(self):
+                self.mail_from = None
+                self.recipients = []
+
+            def command(self, line: str) -> bool:
+                verb, _, argument = line.partition(" ")
+                verb = verb.upper()
+                server._count(verb.lower() or "empty")
+
+                if verb == "EHLO":
+                    extensions = ["250-PIPELINING"] if server.pipelining else []
+                    self.reply("250-mock-smtp", *extensions, "250-AUTH PLAIN", "250-8BITMIME", "250 SIZE 10485760")
+                elif verb == "HELO":
+                    self.reply("250 mock-smtp")
+                elif verb == "AUTH":
+                    self.authenticated = self.check_auth(argument)
+                    self.reply("235 2.7.0 Authentication successful" if self.authenticated
+                               else "535 5.7.8 Authentication credentials invalid")
+                elif verb == "MAIL":
+                    if not self.authenticated:
+                        self.reply("530 5.7.0 Authentication required")
+                    else:
+                        self.mail_from = argument.partition(":")[2].strip().strip("<>")
+                        self.reply("250 2.1.0 OK")
+                elif verb == "RCPT":
+                    if self.mail_from is None:
+                        self.reply("503 5.5.1 MAIL first")
+                    else:
+                        self.recipients.append(argument.partition(":")[2].strip().strip("<>"))
+                        self.reply("250 2.1.5 OK")
+                elif verb == "DATA":
+                    if not self.recipients:
+                        self.reply("503 5.5.1 RCPT first")
+                    else:
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        self.receive_data()
+                elif verb == "RSET":
+                    self.reset()
+                    self.reply("250 2.0.0 OK")
+                elif verb == "NOOP":
+                    self.reply("250 2.0.0 OK")
+                elif verb == "QUIT":
+                    self.reply("221 2.0.0 Bye")
+                    return False
+                else:
+                    self.reply("502 5.5.2 Command not recognized")
+                return True
+
+            def check_auth(self, argument: str) -> bool:
+                mechanism, _, initial = argument.partition(" ")
+                if mechanism.upper() != "PLAIN" or not initial:
+                    return False
+                try:
+                    _, user, password = base64.b64decode(initial).decode("utf-8").split("\0")
+                except ValueError:
+                    return False
+                return server.credentials is None or (user, password) == tuple(server.credentials)
+
+            def receive_data(self):
+                lines = []
+                while True:
+                    line = self.readline()
+                    if line is None:
+                        raise OSError("connection closed during DATA")
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                with server._lock:
+                    server.messages.append((self.mail_from, list(self.recipients), b"".join(lines)))
+                    server.stats["messages"] += 1
+                    drop = server.drop_after_data > 0
+                    server.drop_after_data -= drop
+                if drop:
+                    raise OSError("dropping the connection before the reply")
+                self.reset()
+                self.reply("250 2.0.0 OK queued")
+
+            def readline(self) -> Optional[bytes]:
+                while b"\n" not in self.buffer:
+                    chunk = self.request.recv(65536)
+                    if not chunk:
+                        return None
+                    self.buffer += chunk
+                line, _, self.buffer = self.buffer.partition(b"\n")
+                return line + b"\n"
+
+            def reply(self, *lines: str):
+                # A client waiting on this reply has nothing more in flight: charge it a round trip
+                if server.latency and b"\n" not in self.buffer and not select.select([self.request], [], [], 0)[0]:
+                    time.sleep(server.latency)
+                self.request.sendall("".join(line + "\r\n" for line in lines).encode("utf-8"))
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve a local SMTP stand-in')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8025, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated round trip in seconds')
+    args = parser.parse_args()
+
+    mock_server = MockSMTPServer(args.host, args.port, args.latency)
+    print(f"Mock SMTP server listening on {args.host}:{mock_server.address[1]}")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Twilio Messages REST API, for offline SMS benchmarks.
+
+Accepts ``POST /2010-04-01/Accounts/<sid>/Messages.json`` (form-encoded To,
+From and Body) and answers like Twilio: 201 with a message resource. It can
+simulate a per-account messages-per-second limit (requests over it get a
+429 with Twilio error 20429), a fixed response latency with jitter, and a
+share of 500 errors. Every accepted message is recorded, so a benchmark can
+check that nothing was delivered twice. Point SMSService at it with
+``api_base_url=server.base_url`` (or the TWILIO_API_BASE_URL setting)::
+
+    python -m utils.mock_twilio --port 8002 --rate 10 --latency 0.08
+"""
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from utils.rate_limiter import TokenBucket
+
+
+class MockTwilioServer:
+    """Twilio-compatible message endpoint with configurable rate limit, latency and error rate."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, rate_per_second: Optional[float] = None,
+                 latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limiter = TokenBucket(rate_per_second) if rate_per_second else None
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.messages: List[Tuple[str, str]] = []
+        self.stats = Counter()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockTwilioServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-twilio", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve requests on the current thread until interrupted."""
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Shut the server down and release the port."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def delivered_twice(self) -> int:
+        """Number of (number, text) pairs accepted more than once."""
+        with self._lock:
+            return sum(1 for count in Counter(self.messages).values() if count > 1)
+
+    def handle_message(self, account_sid: str, form: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Decide the response to one message request: (status, JSON body)."""
+        if not form.get("To") or not form.get("Body"):
+            return 400, {"code": 21602, "message": "A 'To' number and a 'Body' are required", "status": 400}
+
+        with self._lock:
+            fail = self._rng.random() < self.error_rate
+            jitter = self._rng.uniform(0.5, 1.5)
+        if self.latency:
+            time.sleep(self.latency * jitter)
+
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            self._count("throttled")
+            return 429, {"code": 20429, "message": "Too Many Requests", "status": 429}
+        if fail:
+            self._count("errors")
+            return 500, {"code": 20500, "message": "Internal Server Error", "status": 500}
+
+        with self._lock:
+            self.messages.append((form["To"], form["Body"]))
+            self.stats["accepted"] += 1
+        return 201, {
+            "sid": "SM" + uuid.uuid4().hex,
+            "account_sid": account_sid,
+            "to": form["To"],
+            "from": form.get("From"),
+            "body": form["Body"],
+            "status": "queued",
+            "num_segments": str(len(form["Body"]) // 160 + 1)
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                parts = [part for part in self.path.split("?")[0].split("/") if part]
+                if len(parts) != 4 or parts[:2] != ["2010-04-01", "Accounts"] or parts[3] != "Messages.json":
+                    self._send_json(404, {"code": 20404, "message": "Not found", "status": 404})
+                    return
+                form = {key: values[0] for key, values in parse_qs(raw).items()}
+                self._send_json(*server.handle_message(parts[2], form))
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Twilio Messages API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8002, help='Port to listen on')
+    parser.add_argument('--rate', type=float, default=None, help='Messages per second before answering 429')
+    parser.add_argument('--latency', type=float, default=0.08, help='Mean response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latency jitter and errors')
+    args = parser.parse_args()
+
+    mock_server = MockTwilioServer(args.host, args.port, args.rate, args.latency, args.error_rate, args.seed)
+    print(f"Mock Twilio API listening on {mock_server.base_url}")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -0,0 +1,283 @@
+"""
+Durable outbox for outbound email and SMS.
+
+Booking confirmations and reminders used to be sent inline: the caller
+waited on SMTP or Twilio, and a failure was printed and lost. Now they are
+written to the outbox and the caller moves on. The outbox is a JobQueue
+(its own SQLite file) with one job type per channel, drained by a separate
+pool of worker threads per channel, so a slow SMTP server cannot hold up
+SMS and the number of concurrent sends matches what each provider allows.
+Failed sends are retried with exponential backoff. A send holds its job's
+lease for longer than one delivery can take (two SMTP attempts with their
+timeouts, plus the wait for a pooled connection), and the lease is renewed
+while it runs, so no second worker picks up a slow send and sends it again. A message that keeps
+failing, or that fails in a way no retry can fix (a refused address, an
+invalid phone number), is moved to the dead_letters table. Dead letters can
+be replayed once the cause is fixed::
+
+    python -m utils.outbox stats
+    python -m utils.outbox dead --channel email
+    python -m utils.outbox replay --ids 12 15     # or --all [--channel sms]
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import sqlite3
+import threading
+import time
+import config
+from utils.job_queue import JobQueue, PermanentJobError, PENDING
+from utils.lazy_import import lazy_component, lazy_import
+from utils.serialization import loads
+
+smtplib = lazy_import("smtplib")
+
+EMAIL = "email"
+SMS = "sms"
+
+_DEAD_LETTER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    dead_letter_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    idempotency_key TEXT,
+    job_group TEXT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL,
+    replayed_at REAL
+);
+CREATE INDEX IF NOT EXISTS dead_letters_open ON dead_letters (replayed_at, channel);
+"""
+
+
+def _email_error_is_permanent(error: Exception) -> bool:
+    """5xx replies are permanent, except a failed login (a configuration problem worth retrying once fixed).
+
+    So is a send that may already have been accepted: it is dead-lettered for a person to check
+    rather than sent again.
+    """
+    from utils.smtp_pool import DeliveryUncertain
+    if isinstance(error, DeliveryUncertain):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return (isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+            and not isinstance(error, smtplib.SMTPAuthenticationError))
+
+
+class Outbox(JobQueue):
+    """Persistent queue of outbound messages with per-channel workers and a dead-letter table."""
+
+    # Built on first delivery so enqueueing never imports the provider clients
+    email_service = lazy_component(lambda self: _email_service())
+    sms_service = lazy_component(lambda self: _sms_service())
+
+    def __init__(self, db_path: str = config.OUTBOX_DB, channel_workers: Optional[Dict[str, int]] = None,
+                 max_attempts: int = config.OUTBOX_MAX_ATTEMPTS, backoff_seconds: float = config.OUTBOX_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = config.OUTBOX_MAX_BACKOFF_SECONDS, poll_interval: float = 0.5,
+                 lease_seconds: float = config.OUTBOX_LEASE_SECONDS, email_service=None, sms_service=None):
+        if channel_workers is None:
+            channel_workers = {EMAIL: config.OUTBOX_EMAIL_WORKERS, SMS: config.OUTBOX_SMS_WORKERS}
+        self.channel_workers = channel_workers
+        super().__init__(db_path, workers=sum(channel_workers.values()), max_attempts=max_attempts,
+                         backoff_seconds=backoff_seconds, max_backoff_seconds=max_backoff_seconds,
+                         lease_seconds=lease_seconds, poll_interval=poll_interval)
+        self._connection().executescript(_DEAD_LETTER_SCHEMA)
+
+        if email_service is not None:
+            self.email_service = email_service
+        if sms_service is not None:
+            self.sms_service = sms_service
+        self.register(EMAIL, self._deliver_email)
+        self.register(SMS, self._deliver_sms)
+
+    def enqueue_email(self, kind: str, fields: Dict[str, Any], idempotency_key: str = None, group: str = None) -> int:
+        """Queue an email built by EmailService.build_message(kind, fields); returns the job ID."""
+        return self.enqueue(EMAIL, {"kind": kind, "fields": fields}, idempotency_key=idempotency_key, group=group)
+
+    def enqueue_sms(self, phone: str, message: str, idempotency_key: str = None, group: str = None) -> int:
+        """Queue a text message; returns the job ID."""
+        return self.enqueue(SMS, {"phone": phone, "message": message}, idempotency_key=idempotency_key, group=group)
+
+    def enqueue_reminders(self, reminders: List[Dict[str, Any]]) -> List[int]:
+        """Queue the email and SMS of each reminder in one transaction.
+
+        Each item is {"reminder_id", "appointment_id", "email": {to_email, subject, message},
+        "sms": {phone, message}}; the reminder ID keys both messages, so queueing a reminder
+        twice sends it once. The jobs are grouped as "<appointment_id>:reminders", apart from
+        the booking's confirmation email. Returns the job IDs, email and SMS alternating.
+        """
+        jobs = []
+        for reminder in reminders:
+            reminder_id, appointment_id = reminder["reminder_id"], reminder.get("appointment_id")
+            group = f"{appointment_id}:reminders" if appointment_id else None
+            jobs.append((EMAIL, {"kind": "reminder", "fields": reminder["email"]}, f"{reminder_id}:email", group))
+            jobs.append((SMS, reminder["sms"], f"{reminder_id}:sms", group))
+        return self.enqueue_many(jobs)
+
+    def start(self):
+        """Start each channel's worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._stopping = False
+        for channel, count in self.channel_workers.items():
+            for index in range(count):
+                thread = threading.Thread(target=self._worker_loop, args=((channel,),),
+                                          name=f"outbox-{channel}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def get_dead_letters(self, channel: str = None, include_replayed: bool = False) -> List[Dict[str, Any]]:
+        """Return dead letters, oldest first (by default only those not yet replayed)."""
+        query = "SELECT * FROM dead_letters WHERE 1 = 1"
+        params: List[Any] = []
+        if not include_replayed:
+            query += " AND replayed_at IS NULL"
+        if channel:
+            query += " AND channel = ?"
+            params.append(channel)
+        rows = self._connection().execute(query + " ORDER BY dead_letter_id", params).fetchall()
+        return [dict(row, payload=loads(row["payload"])) for row in rows]
+
+    def replay(self, dead_letter_ids: List[int] = None, channel: str = None) -> int:
+        """Queue dead letters for another full round of attempts; returns how many were replayed.
+
+        With no IDs, every open dead letter (of the channel, if given) is replayed.
+        """
+        letters = self.get_dead_letters(channel)
+        if dead_letter_ids is not None:
+            wanted = set(dead_letter_ids)
+            letters = [letter for letter in letters if letter["dead_letter_id"] in wanted]
+        if not letters:
+            return 0
+
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for letter in letters:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, next_run_at = ?, locked_until = NULL, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (PENDING, now, now, letter["job_id"])
+                )
+                connection.execute("UPDATE dead_letters SET replayed_at = ? WHERE dead_letter_id = ?",
+                                   (now, letter["dead_letter_id"]))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return len(letters)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the number of messages in each status, plus open dead letters."""
+        stats = super().get_stats()
+        stats["dead_letters"] = self._connection().execute(
+            "SELECT COUNT(*) FROM dead_letters WHERE replayed_at IS NULL"
+        ).fetchone()[0]
+        return stats
+
+    def _give_up(self, job: sqlite3.Row, attempts: int, error: str):
+        """Fail the job and record it as a dead letter, in one transaction."""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            super()._give_up(job, attempts, error)
+            connection.execute(
+                "INSERT INTO dead_letters (job_id, channel, idempotency_key, job_group, payload, attempts, error, "
+                "failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], job["job_type"], job["idempotency_key"], job["job_group"], job["payload"],
+                 attempts, error, now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _deliver_email(self, payload: Dict[str, Any]) -> bool:
+        msg = self.email_service.build_message(payload["kind"], payload["fields"])
+        try:
+            self.email_service.deliver(msg)
+        except Exception as e:
+            if _email_error_is_permanent(e):
+                raise PermanentJobError(str(e)) from e
+            raise
+        return True
+
+    def _deliver_sms(self, payload: Dict[str, Any]) -> str:
+        from utils.sms_service import SMSDeliveryError
+        try:
+            return self.sms_service.send_once(payload["phone"], payload["message"])
+        except SMSDeliveryError as e:
+            if not e.retryable:
+                raise PermanentJobError(str(e)) from e
+            raise
+
+
+def _email_service():
+    from utils.email_service import EmailService
+    return EmailService()
+
+
+def _sms_service():
+    from utils.sms_service import SMSService
+    return SMSService()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Return the shared, started outbox."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+            _outbox.start()
+        return _outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the outbox and replay dead-lettered messages')
+    parser.add_argument('command', choices=['stats', 'dead', 'replay'], help='What to do')
+    parser.add_argument('--db', default=config.OUTBOX_DB, help='Outbox database')
+    parser.add_argument('--channel', choices=[EMAIL, SMS], default=None, help='Only this channel')
+    parser.add_argument('--ids', type=int, nargs='+', default=None, help='Dead letter IDs to replay')
+    parser.add_argument('--all', action='store_true', help='Replay every open dead letter')
+    parser.add_argument('--drain', action='store_true', help='After replaying, send the due messages in this process')
+    args = parser.parse_args()
+
+    outbox = Outbox(db_path=args.db)
+
+    if args.command == 'stats':
+        for status, count in outbox.get_stats().items():
+            print(f"{status:<14} {count:>8}")
+        return
+
+    if args.command == 'dead':
+        letters = outbox.get_dead_letters(args.channel)
+        print(f"{'id':>6} {'channel':<7} {'attempts':>8} {'failed at':<19}  error")
+        for letter in letters:
+            failed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(letter["failed_at"]))
+            print(f"{letter['dead_letter_id']:>6} {letter['channel']:<7} {letter['attempts']:>8} {failed_at:<19}  "
+                  f"{letter['error']}")
+        print(f"{len(letters)} open dead letters")
+        return
+
+    if args.ids is None and not args.all:
+        parser.error("replay needs --ids or --all")
+    replayed = outbox.replay(args.ids, args.channel)
+    print(f"Replayed {replayed} dead letters")
+    if args.drain:
+        print(f"Sent {outbox.run_pending((args.channel,) if args.channel else None)} messages")
+
+
+if __name__ == "__main__":
+    main()
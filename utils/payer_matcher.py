@@ -0,0 +1,206 @@
+"""
+Insurance payer matching for free-text messages.
+
+Payer aliases are loaded from a data file and compiled into an Aho–Corasick
+automaton, so a message is scanned once regardless of how many payers the
+clinic accepts; the leftmost, longest alias on word boundaries wins. When no
+alias appears verbatim, a symmetric-delete index proposes candidates for
+misspellings ("bluecross", "untied healthcare") that are confirmed to be one
+edit (insertion, deletion, substitution or adjacent swap) away.
+"""
+
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import csv
+import os
+import re
+import threading
+import config
+
+# Used when the payers file is missing (the carriers the agent originally knew)
+DEFAULT_PAYERS = {
+    "aetna": "Aetna", "anthem": "Anthem", "blue cross": "Blue Cross Blue Shield",
+    "blue shield": "Blue Shield of California", "cigna": "Cigna", "humana": "Humana",
+    "kaiser": "Kaiser Permanente", "united healthcare": "United Healthcare", "uhc": "United Healthcare",
+    "medicare": "Medicare", "medicaid": "Medicaid"
+}
+
+# Aliases shorter than this only match exactly ("humana" is not "human")
+FUZZY_MIN_LENGTH = 8
+
+_SEPARATORS = re.compile(r"[^a-z0-9&]+")
+
+
+def normalize_payer_text(text: str) -> str:
+    """Lowercase text and collapse punctuation and whitespace runs to single spaces."""
+    return _SEPARATORS.sub(" ", text.lower()).strip()
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher over a goto/failure automaton."""
+
+    def __init__(self, patterns: Dict[str, str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((len(pattern), value))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        """Breadth-first pass linking each state to its longest proper suffix state."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield (start, end, value) for every pattern occurrence in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield position + 1 - length, position + 1, value
+
+
+class PayerMatcher:
+    """Exact (Aho–Corasick) and fuzzy (symmetric delete) payer lookup."""
+
+    def __init__(self, aliases: Dict[str, str]):
+        self.aliases = {normalize_payer_text(alias): carrier for alias, carrier in aliases.items()}
+        self.aliases.pop("", None)
+        self._automaton = AhoCorasick(self.aliases)
+        self._max_alias_words = max((alias.count(" ") + 1 for alias in self.aliases), default=0)
+
+        # Fuzzy indexes over aliases with spaces removed, so "bluecross" finds "blue cross".
+        # Each fuzzy-eligible alias is also filed under every single-character deletion
+        # (symmetric delete), so candidate lookup is a few dict probes at any list size.
+        self._compact: Dict[str, str] = {}
+        self._deletes: Dict[str, Set[str]] = {}
+        self._prefixes: Set[str] = set()
+        self._suffixes: Set[str] = set()
+        for alias, carrier in self.aliases.items():
+            compact = alias.replace(" ", "")
+            self._compact.setdefault(compact, carrier)
+            if len(compact) >= FUZZY_MIN_LENGTH:
+                for variant in self._variants(compact):
+                    self._deletes.setdefault(variant, set()).add(compact)
+                self._prefixes.add(compact[:3])
+                self._suffixes.add(compact[-3:])
+        self._max_compact_length = max((len(compact) for compact in self._compact), default=0)
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the carrier for the best payer mentioned in text, if any."""
+        normalized = normalize_payer_text(text)
+        return self.match_exact(normalized) or self.match_fuzzy(normalized)
+
+    def match_exact(self, normalized: str) -> Optional[str]:
+        """Leftmost-longest alias occurrence that starts and ends on word boundaries."""
+        best = None
+        for start, end, carrier in self._automaton.iter_matches(normalized):
+            if start > 0 and normalized[start - 1] != " ":
+                continue
+            if end < len(normalized) and normalized[end] != " ":
+                continue
+            if best is None or start < best[0] or (start == best[0] and end > best[1]):
+                best = (start, end, carrier)
+        return best[2] if best else None
+
+    def match_fuzzy(self, normalized: str) -> Optional[str]:
+        """Leftmost word window that is an alias without spaces or one edit away from one."""
+        words = normalized.split()
+
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + self._max_alias_words, len(words)) + 1):
+                window = "".join(words[start:end])
+                if len(window) > self._max_compact_length + 1:
+                    break
+                if window in self._compact:
+                    return self._compact[window]
+                # One edit to a name this long leaves its first or last three characters intact
+                if len(window) < FUZZY_MIN_LENGTH or (
+                        window[:3] not in self._prefixes and window[-3:] not in self._suffixes):
+                    continue
+
+                candidates = set()
+                for variant in self._variants(window):
+                    candidates.update(self._deletes.get(variant, ()))
+                for candidate in sorted(candidates):
+                    if _within_one_edit(window, candidate):
+                        return self._compact[candidate]
+
+        return None
+
+    @staticmethod
+    def _variants(text: str) -> List[str]:
+        """The text itself plus every single-character deletion of it."""
+        return [text] + [text[:i] + text[i + 1:] for i in range(len(text))]
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True when a and b differ by one insertion, deletion, substitution or adjacent swap."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    a_rest, b_rest = a[prefix:], b[prefix:]
+
+    if len(a) == len(b):
+        return a_rest[1:] == b_rest[1:] or (a_rest[:2] == b_rest[1::-1] and a_rest[2:] == b_rest[2:])
+    if len(a) > len(b):
+        return a_rest[1:] == b_rest
+    return a_rest == b_rest[1:]
+
+
+def load_payer_aliases(payers_file: str = config.INSURANCE_PAYERS_CSV) -> Dict[str, str]:
+    """Read alias -> carrier pairs from the payers CSV."""
+    if not os.path.exists(payers_file):
+        return dict(DEFAULT_PAYERS)
+
+    try:
+        with open(payers_file, newline="", encoding="utf-8") as f:
+            return {row["alias"]: row["carrier"] for row in csv.DictReader(f) if row.get("alias")}
+    except Exception as e:
+        print(f"Error loading insurance payers: {e}")
+        return dict(DEFAULT_PAYERS)
+
+
+_payer_matcher = None
+_payer_matcher_key = None
+_payer_matcher_lock = threading.Lock()
+
+
+def get_payer_matcher(payers_file: str = config.INSURANCE_PAYERS_CSV) -> PayerMatcher:
+    """Return a shared matcher, recompiled only when the payers file changes."""
+    global _payer_matcher, _payer_matcher_key
+
+    try:
+        stat = os.stat(payers_file)
+        key = (payers_file, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (payers_file, None, None)
+
+    with _payer_matcher_lock:
+        if _payer_matcher is None or _payer_matcher_key != key:
+            _payer_matcher = PayerMatcher(load_payer_aliases(payers_file))
+            _payer_matcher_key = key
+        return _payer_matcher
@@ -0,0 +1,163 @@
+"""
+Speculative availability prefetching.
+
+Once the lookup step knows the patient's doctor, location and appointment
+duration, the next scheduling turn will ask CalendarIntegration for exactly
+those slots. The orchestrator hands that query to the AvailabilityPrefetcher,
+which runs it on a background thread while the patient reads the reply, and
+SchedulingAgent picks up the result instead of scanning the calendar itself.
+
+Results are shared by every session asking for the same doctor, location
+and duration, and expire after ``ttl_seconds``. A booking made through this
+process only takes slots away, so it is recorded and the overlapping slots
+are filtered out of cached and in-flight results instead of throwing the
+scan away; a cancellation frees slots, so it drops the cached results and
+discards any scan that was already running. In multi-process mode a result
+is also dropped once another process has written appointments.xlsx since
+its scan started.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+import config
+from utils.database import data_generations
+
+APPOINTMENTS = "appointments.xlsx"
+
+Key = Tuple[str, str, int, int]
+DoctorLocation = Tuple[str, str]
+
+
+class AvailabilityPrefetcher:
+    """Computes available slots ahead of the scheduling turn on background threads."""
+
+    def __init__(self, calendar_factory: Callable[[], Any] = None, workers: int = config.PREFETCH_WORKERS,
+                 ttl_seconds: float = config.PREFETCH_TTL_SECONDS):
+        if calendar_factory is None:
+            from utils.calendar_integration import CalendarIntegration
+            calendar_factory = CalendarIntegration
+
+        self.calendar_factory = calendar_factory
+        self.ttl_seconds = ttl_seconds
+        self._calendar = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="availability-prefetch")
+        self._lock = threading.Lock()
+        # key -> (scan future, submitted at, booking sequence number and appointments generation at submission)
+        self._entries: Dict[Key, Tuple[Future, float, int, int]] = {}
+        self._generations: Dict[DoctorLocation, int] = {}
+        # (doctor, location) -> [(sequence number, recorded at, start, end)] of bookings since recent scans
+        self._bookings: Dict[DoctorLocation, List[Tuple[int, float, datetime, datetime]]] = {}
+        self._booking_seq = 0
+        self._stats = {"prefetches": 0, "hits": 0, "misses": 0, "invalidations": 0, "discarded": 0}
+
+    @staticmethod
+    def _key(doctor: str, location: str, duration: int, days_ahead: int) -> Key:
+        return (str(doctor).lower(), str(location).lower(), int(duration), int(days_ahead))
+
+    @staticmethod
+    def _doctor_location(doctor: str, location: str) -> DoctorLocation:
+        return (str(doctor).lower(), str(location).lower())
+
+    def prefetch(self, doctor: str, location: str, duration: int, days_ahead: int = 14):
+        """Start computing slots for the query unless a fresh result is already cached or in flight."""
+        if not doctor or not location:
+            return
+
+        key = self._key(doctor, location, duration, days_ahead)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry):
+                return
+            generation = self._generations.get(key[:2], 0)
+            future = self._executor.submit(self._scan, key, doctor, location, duration, days_ahead, generation)
+            self._entries[key] = (future, time.monotonic(), self._booking_seq, data_generations.get(APPOINTMENTS))
+            self._stats["prefetches"] += 1
+
+    def get(self, doctor: str, location: str, duration: int, days_ahead: int = 14,
+            timeout: float = None) -> Optional[List[Dict[str, Any]]]:
+        """Return prefetched slots for the query (waiting for an in-flight scan), or None on a miss."""
+        key = self._key(doctor, location, duration, days_ahead)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry) or data_generations.changed_elsewhere(APPOINTMENTS, entry[3]):
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+
+        try:
+            slots = entry[0].result(timeout=timeout)
+        except Exception:
+            slots = None
+
+        with self._lock:
+            if slots is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            booked = [(start, end) for seq, _, start, end in self._bookings.get(key[:2], []) if seq >= entry[2]]
+        
+        # Callers get their own slot dicts; the cached list is shared between sessions
+        duration = timedelta(minutes=key[2])
+        return [dict(slot) for slot in slots
+                if not any(slot["datetime"] < end and start < slot["datetime"] + duration for start, end in booked)]
+
+    def record_booking(self, doctor: str, location: str, start: datetime, duration: int):
+        """Hide slots overlapping a new booking from cached and in-flight results."""
+        doctor_location = self._doctor_location(doctor, location)
+        now = time.monotonic()
+        with self._lock:
+            bookings = [booking for booking in self._bookings.get(doctor_location, [])
+                        if now - booking[1] <= self.ttl_seconds]
+            bookings.append((self._booking_seq, now, start, start + timedelta(minutes=int(duration))))
+            self._bookings[doctor_location] = bookings
+            self._booking_seq += 1
+
+    def invalidate(self, doctor: str, location: str):
+        """Drop cached results for a doctor and location after slots were freed."""
+        doctor_location = self._doctor_location(doctor, location)
+        with self._lock:
+            self._generations[doctor_location] = self._generations.get(doctor_location, 0) + 1
+            for key in [key for key in self._entries if key[:2] == doctor_location]:
+                del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "cached": len(self._entries)}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _expired(self, entry: Tuple[Future, float, int, int]) -> bool:
+        return time.monotonic() - entry[1] > self.ttl_seconds
+
+    def _scan(self, key: Key, doctor: str, location: str, duration: int, days_ahead: int,
+              generation: int) -> Optional[List[Dict[str, Any]]]:
+        if self._calendar is None:
+            self._calendar = self.calendar_factory()
+        slots = self._calendar.get_available_slots(doctor=doctor, location=location, duration=duration,
+                                                   days_ahead=days_ahead)
+
+        with self._lock:
+            if self._generations.get(key[:2], 0) != generation:
+                # A cancellation landed while scanning; this result may be missing the freed slot.
+                # invalidate() already dropped the entry, and a newer scan may have taken its key.
+                self._stats["discarded"] += 1
+                return None
+        return slots
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_availability_prefetcher() -> AvailabilityPrefetcher:
+    """Return the shared availability prefetcher."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = AvailabilityPrefetcher()
+        return _prefetcher
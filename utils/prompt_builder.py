@@ -0,0 +1,73 @@
+"""
+Compact system prompts for the conversational agents.
+
+Agents used to interpolate the whole collected-data dict into their system
+prompt, so the prompt grew with every field gathered. A CompactPrompt keeps
+the instructions as a fixed prefix (compiled once per agent class, so
+provider-side prompt caching can reuse it) and appends a short, field-ordered
+summary of the key facts collected so far and the fields still missing.
+"""
+
+from typing import Any, Dict, List, Tuple
+import re
+import textwrap
+import threading
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_prompt_stats: Dict[str, Dict[str, int]] = {}
+_prompt_stats_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in text (words plus punctuation)."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def get_prompt_stats() -> Dict[str, Dict[str, Any]]:
+    """Return per-agent prompt token counters."""
+    with _prompt_stats_lock:
+        stats = {agent: dict(counters) for agent, counters in _prompt_stats.items()}
+
+    for counters in stats.values():
+        counters["avg_prompt_tokens"] = counters["prompt_tokens"] / counters["prompts"] if counters["prompts"] else 0.0
+    return stats
+
+
+def reset_prompt_stats():
+    """Clear all prompt token counters."""
+    with _prompt_stats_lock:
+        _prompt_stats.clear()
+
+
+class CompactPrompt:
+    """A static instruction prefix followed by a compact collected/missing summary."""
+
+    def __init__(self, agent_name: str, instructions: str, fields: List[Tuple[str, str]]):
+        self.agent_name = agent_name
+        self.prefix = textwrap.dedent(instructions).strip()
+        self.fields = list(fields)
+        self.prefix_tokens = count_tokens(self.prefix)
+
+    def render(self, collected: Dict[str, Any]) -> str:
+        """Render the prompt for the current collected data and record its size."""
+        known = [f"{label}: {collected[field]}" for field, label in self.fields if collected.get(field)]
+        missing = [label for field, label in self.fields if not collected.get(field)]
+
+        summary = "Collected: " + ("; ".join(known) if known else "none") + "\n" + \
+                  "Missing: " + (", ".join(missing) if missing else "none")
+        prompt = self.prefix + "\n\n" + summary
+
+        self._record(summary)
+        return prompt
+
+    def _record(self, summary: str):
+        """Accumulate token counts for this agent."""
+        summary_tokens = count_tokens(summary)
+        with _prompt_stats_lock:
+            counters = _prompt_stats.setdefault(self.agent_name, {
+                "prompts": 0, "prompt_tokens": 0, "prefix_tokens": self.prefix_tokens, "summary_tokens": 0
+            })
+            counters["prompts"] += 1
+            counters["summary_tokens"] += summary_tokens
+            counters["prompt_tokens"] += self.prefix_tokens + summary_tokens
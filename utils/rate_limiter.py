@@ -0,0 +1,48 @@
+"""
+Token-bucket rate limiting for outbound provider calls (SMS, email).
+
+``acquire`` reserves a token and sleeps until it is due, so concurrent
+senders are spaced evenly at the configured rate (after an initial burst of
+``capacity``) in the order they asked, without holding the lock while they
+wait. ``try_acquire`` is the non-blocking form, for servers that reject
+requests over their limit instead of queueing them.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Allows ``rate`` operations per second on average, with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the seconds waited."""
+        with self._lock:
+            self._refill()
+            # Tokens may go negative: each waiter reserves its place in the queue
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self) -> bool:
+        """Take one token if one is available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
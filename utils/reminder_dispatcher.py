@@ -0,0 +1,289 @@
+"""
+Long-running dispatcher that sends appointment reminders when they fall due.
+
+Pending reminders (status "scheduled" in data/reminders.csv) are loaded once
+into a min-heap keyed by reminder time. The dispatcher thread sleeps until
+the earliest one is due, takes every due reminder off the heap (up to
+``batch_size`` at a time) and hands the batch to a pool of sender threads,
+so CPU use does not grow with the number of pending reminders: loading is
+one heapify, and each reminder costs one push and one pop.
+
+Reminders saved by this process reach the dispatcher through
+``database.reminder_listeners`` as soon as they are written, so nothing
+polls the CSV. A dispatcher running as its own process (``python -m
+utils.reminder_dispatcher``) cannot be notified that way; it instead stats
+reminders.csv every ``rescan_seconds`` and reloads it only when it changed.
+
+Usage:
+    python -m utils.reminder_dispatcher --workers 4
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import heapq
+import os
+import threading
+import time
+import config
+from utils import database
+from utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Dispatched reminder IDs remembered so a reload of the CSV does not queue them again
+RECENT_DISPATCHES_KEPT = 100000
+
+
+def _timestamp_us(value: datetime) -> int:
+    """Microseconds since the epoch for a naive local datetime (the format reminders are stored in)."""
+    return (value - EPOCH) // MICROSECOND
+
+
+class ReminderDispatcher:
+    """Sends due reminders in batches, from a min-heap ordered by reminder time."""
+
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]] = None,
+                 workers: int = config.REMINDER_WORKERS, batch_size: int = config.REMINDER_BATCH_SIZE,
+                 reminders_file: str = "data/reminders.csv", rescan_seconds: Optional[float] = None,
+                 clock: Callable[[], datetime] = datetime.now):
+        if send_batch is None:
+            from agents.reminder_agent import ReminderAgent
+            agent = ReminderAgent()
+            send_batch = agent.send_due_reminders
+
+        self.send_batch = send_batch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.reminders_file = reminders_file
+        self.rescan_seconds = rescan_seconds
+        self.clock = clock
+
+        # (due, reminder_id, appointment_id, patient_id, type); entries whose due no longer matches
+        # _pending (cancelled or rescheduled reminders) are skipped when they reach the top
+        self._heap: List[Tuple[int, str, str, str, str]] = []
+        self._pending: Dict[str, int] = {}
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+        # Bounds batches queued for the senders, so a slow sender holds reminders on the heap instead
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._file_signature = None
+        self._stats = {"loaded": 0, "added": 0, "dispatched": 0, "sent": 0, "failed": 0, "batches": 0, "skipped": 0}
+
+    def load(self) -> int:
+        """Queue every scheduled reminder in the reminders file; returns how many were new or moved."""
+        if not os.path.exists(self.reminders_file):
+            return 0
+        # Stat before reading: the file is replaced atomically, so a write in between just means another load
+        self._file_signature = self._signature()
+        df = pd.read_csv(self.reminders_file, dtype=str,
+                         usecols=["reminder_id", "appointment_id", "patient_id", "reminder_datetime", "type", "status"])
+
+        df = df[df["status"] == "scheduled"]
+        due = pd.to_datetime(df["reminder_datetime"], format="ISO8601", errors="coerce")
+        df = df[due.notna()]
+        due_us = ((due[due.notna()] - pd.Timestamp(EPOCH)) // pd.Timedelta(microseconds=1)).tolist()
+        types = [None if value != value else value for value in df["type"].tolist()]
+        rows = zip(due_us, df["reminder_id"].tolist(), df["appointment_id"].tolist(), df["patient_id"].tolist(), types)
+
+        with self._condition:
+            added = 0
+            for entry in rows:
+                if self._pending.get(entry[1]) == entry[0] or entry[1] in self._recent:
+                    continue
+                self._pending[entry[1]] = entry[0]
+                self._heap.append(entry)
+                added += 1
+            # One O(n) heapify instead of a push per row
+            heapq.heapify(self._heap)
+            self._stats["loaded"] += added
+            self._condition.notify()
+        return added
+
+    def add(self, reminder_data: Dict[str, Any]):
+        """Queue one reminder (a dict as saved by ReminderAgent); re-adding an ID moves it."""
+        due = _timestamp_us(reminder_data["reminder_datetime"])
+        reminder_id = reminder_data["reminder_id"]
+        with self._condition:
+            self._pending[reminder_id] = due
+            self._recent.pop(reminder_id, None)
+            heapq.heappush(self._heap, (due, reminder_id, reminder_data["appointment_id"],
+                                        reminder_data.get("patient_id"), reminder_data.get("type")))
+            self._stats["added"] += 1
+            self._compact()
+            # Wake the dispatcher only if this reminder is due before the one it is waiting for
+            if self._heap[0][1] == reminder_id:
+                self._condition.notify()
+
+    def cancel(self, reminder_id: str) -> bool:
+        """Drop a pending reminder; returns False if it is not pending."""
+        with self._condition:
+            return self._pending.pop(reminder_id, None) is not None
+
+    def start(self) -> "ReminderDispatcher":
+        """Start dispatching on a background thread and subscribe to newly saved reminders."""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reminder-send")
+        database.reminder_listeners.append(self.add)
+        self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        """Stop dispatching; with ``wait`` the batches already handed to senders finish first."""
+        if self.add in database.reminder_listeners:
+            database.reminder_listeners.remove(self.add)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            next_due = self._next_due()
+            return {
+                **self._stats,
+                "pending": len(self._pending),
+                "heap_size": len(self._heap),
+                "next_due": (EPOCH + timedelta(microseconds=next_due)).isoformat() if next_due is not None else None
+            }
+
+    def _run(self):
+        next_rescan = time.monotonic() + self.rescan_seconds if self.rescan_seconds else None
+        while True:
+            if next_rescan is not None and time.monotonic() >= next_rescan:
+                if self._signature() != self._file_signature:
+                    self.load()
+                next_rescan = time.monotonic() + self.rescan_seconds
+
+            with self._condition:
+                if self._stopping:
+                    return
+                batch = self._take_due()
+                if not batch:
+                    self._condition.wait(self._seconds_to_wait(next_rescan))
+                    continue
+
+            self._dispatch(batch)
+
+    def _take_due(self) -> List[Dict[str, Any]]:
+        """Pop up to batch_size due reminders (call with the condition held)."""
+        now = _timestamp_us(self.clock())
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            due, reminder_id, appointment_id, patient_id, reminder_type = heapq.heappop(self._heap)
+            if self._pending.get(reminder_id) != due:
+                self._stats["skipped"] += 1
+                continue
+            del self._pending[reminder_id]
+            self._recent[reminder_id] = None
+            if len(self._recent) > RECENT_DISPATCHES_KEPT:
+                self._recent.popitem(last=False)
+            batch.append({
+                "reminder_id": reminder_id,
+                "appointment_id": appointment_id,
+                "patient_id": patient_id,
+                "reminder_datetime": EPOCH + timedelta(microseconds=due),
+                "type": reminder_type or "standard"
+            })
+        return batch
+
+    def _seconds_to_wait(self, next_rescan: Optional[float]) -> Optional[float]:
+        timeout = None
+        next_due = self._next_due()
+        if next_due is not None:
+            timeout = max(0.0, (next_due - _timestamp_us(self.clock())) / 1e6)
+        if next_rescan is not None:
+            until_rescan = max(0.0, next_rescan - time.monotonic())
+            timeout = until_rescan if timeout is None else min(timeout, until_rescan)
+        return timeout
+
+    def _next_due(self) -> Optional[int]:
+        # Drop stale entries so the dispatcher does not wake up for a cancelled reminder
+        while self._heap and self._pending.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+            self._stats["skipped"] += 1
+        return self._heap[0][0] if self._heap else None
+
+    def _dispatch(self, batch: List[Dict[str, Any]]):
+        """Split the batch across the sender threads."""
+        chunk_size = -(-len(batch) // self.workers)
+        for start in range(0, len(batch), chunk_size):
+            self._slots.acquire()
+            self._executor.submit(self._send, batch[start:start + chunk_size])
+        with self._condition:
+            self._stats["dispatched"] += len(batch)
+            self._stats["batches"] += 1
+
+    def _send(self, reminders: List[Dict[str, Any]]):
+        try:
+            results = self.send_batch(reminders)
+            sent = sum(1 for result in results if result.get("success"))
+        except Exception as e:
+            print(f"Error sending reminders: {e}")
+            sent = 0
+        finally:
+            self._slots.release()
+        with self._condition:
+            self._stats["sent"] += sent
+            self._stats["failed"] += len(reminders) - sent
+
+    def _compact(self):
+        # Rebuild once stale entries outnumber live ones, so cancellations cannot grow the heap without bound
+        if len(self._heap) > 2 * len(self._pending) + 1024:
+            self._heap = [entry for entry in self._heap if self._pending.get(entry[1]) == entry[0]]
+            heapq.heapify(self._heap)
+
+    def _signature(self) -> Optional[Tuple]:
+        try:
+            stat = os.stat(self.reminders_file)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_reminder_dispatcher() -> ReminderDispatcher:
+    """Return the shared reminder dispatcher, loaded and started on first use."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = ReminderDispatcher()
+            _dispatcher.load()
+            _dispatcher.start()
+        return _dispatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send appointment reminders as they fall due')
+    parser.add_argument('--workers', type=int, default=config.REMINDER_WORKERS, help='Sender threads')
+    parser.add_argument('--batch-size', type=int, default=config.REMINDER_BATCH_SIZE, help='Most reminders per wakeup')
+    parser.add_argument('--rescan-seconds', type=float, default=config.REMINDER_RESCAN_SECONDS,
+                        help='How often to check reminders.csv for reminders saved by other processes')
+    args = parser.parse_args()
+
+    dispatcher = ReminderDispatcher(workers=args.workers, batch_size=args.batch_size, rescan_seconds=args.rescan_seconds)
+    print(f"Loaded {dispatcher.load()} pending reminders")
+    dispatcher.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        dispatcher.stop()
+        print(f"Stopped: {dispatcher.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+JSON encoding shared by the persistent stores (job queue, session store).
+
+Conversation data carries appointment datetimes; they are written as
+``{"__datetime__": "<iso>"}`` so they come back as datetime objects.
+"""
+
+from datetime import datetime
+from typing import Any, Optional
+import json
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    return str(obj)
+
+
+def _object_hook(obj: dict) -> Any:
+    if set(obj) == {"__datetime__"}:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def dumps(value: Any) -> str:
+    """Encode value as JSON, keeping datetimes round-trippable."""
+    return json.dumps(value, default=_default)
+
+
+def loads(text: Optional[str]) -> Any:
+    """Decode JSON written by dumps (None stays None)."""
+    if text is None:
+        return None
+    return json.loads(text, object_hook=_object_hook)
@@ -0,0 +1,204 @@
+"""
+Serializable conversation state and the session store that holds it.
+
+A ConversationState is everything a conversation needs between turns: the
+current step, the patient, appointment and insurance data collected so far,
+the slots last offered to the patient and the replies to the most recent
+turns (keyed by turn ID, so a resubmitted turn gets its original reply). It
+is a small plain record, so one stateless SchedulingOrchestrator can serve
+every session and the state can live outside the web worker.
+
+SessionStore keeps recently active sessions in an in-memory LRU and writes
+every update through to SQLite; sessions evicted from memory (or lost with a
+restarted worker) are reloaded from disk on their next turn. When several
+processes share the database (multi-process mode), a cached session is
+checked against the row's update time before use, so a turn served by
+another process is never answered from a stale copy.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+import config
+from utils.serialization import dumps, loads
+
+
+class ConversationState:
+    """Per-session conversation state passed to and returned by the orchestrator."""
+
+    def __init__(self, current_step: str = "greeting", patient_info: Dict[str, Any] = None,
+                 appointment_info: Dict[str, Any] = None, insurance_info: Dict[str, Any] = None,
+                 slot_offer: Dict[str, Any] = None, turn_results: Dict[str, Dict[str, Any]] = None):
+        self.current_step = current_step
+        self.patient_info = dict(patient_info or {})
+        self.appointment_info = dict(appointment_info or {})
+        self.insurance_info = dict(insurance_info or {})
+        # Slots as numbered in the last scheduling reply, with the availability etag they were read at
+        self.slot_offer = dict(slot_offer or {})
+        # Turn ID -> reply for the last few turns, oldest first; kept across reset() like the session itself
+        self.turn_results = dict(turn_results or {})
+
+    def reset(self):
+        """Start over at the greeting step with no collected data (recent turn results are kept)."""
+        self.current_step = "greeting"
+        self.patient_info = {}
+        self.appointment_info = {}
+        self.insurance_info = {}
+        self.slot_offer = {}
+
+    def copy(self) -> "ConversationState":
+        """Return a copy whose data dicts can be updated without touching this state."""
+        return ConversationState(self.current_step, self.patient_info, self.appointment_info, self.insurance_info,
+                                 self.slot_offer, self.turn_results)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "current_step": self.current_step,
+            "patient_info": self.patient_info,
+            "appointment_info": self.appointment_info,
+            "insurance_info": self.insurance_info,
+            "slot_offer": self.slot_offer,
+            "turn_results": self.turn_results
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationState":
+        return cls(
+            current_step=data.get("current_step", "greeting"),
+            patient_info=data.get("patient_info"),
+            appointment_info=data.get("appointment_info"),
+            insurance_info=data.get("insurance_info"),
+            slot_offer=data.get("slot_offer"),
+            turn_results=data.get("turn_results")
+        )
+
+    def remember_turn(self, turn_id: str, response: Dict[str, Any], keep: int = config.TURN_RESULTS_KEPT):
+        """Store the reply to a turn, keeping only the ``keep`` most recent."""
+        self.turn_results[turn_id] = response
+        for old_turn_id in list(self.turn_results)[:-keep]:
+            del self.turn_results[old_turn_id]
+
+    def __eq__(self, other):
+        return isinstance(other, ConversationState) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"ConversationState(current_step={self.current_step!r})"
+
+
+class SessionStore:
+    """Session ID -> ConversationState, with an in-memory LRU over a SQLite tier."""
+
+    def __init__(self, db_path: str = config.SESSION_DB, capacity: int = config.SESSION_CACHE_SIZE,
+                 ttl_seconds: float = config.SESSION_TTL_SECONDS, shared: bool = config.MULTIPROCESS_DATA):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+
+        # session_id -> (state, updated_at of the row it matches)
+        self._cache: "OrderedDict[str, Tuple[ConversationState, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_loads": 0, "misses": 0, "evictions": 0, "writes": 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def get(self, session_id: str) -> Optional[ConversationState]:
+        """Return the session's state, loading it from disk if it is not in memory."""
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None and self.shared and self._updated_at(session_id) != cached[1]:
+                # Another process has written this session since we cached it
+                cached = None
+            if cached is not None:
+                self._cache.move_to_end(session_id)
+                self._stats["hits"] += 1
+                return cached[0].copy()
+
+            row = self._db.execute(
+                "SELECT state, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+                self._stats["misses"] += 1
+                return None
+
+            state = ConversationState.from_dict(loads(row[0]))
+            self._stats["disk_loads"] += 1
+            self._remember(session_id, state, row[1])
+            return state.copy()
+
+    def get_or_create(self, session_id: str) -> ConversationState:
+        """Return the session's state, or a fresh one for a new session."""
+        return self.get(session_id) or ConversationState()
+
+    def put(self, session_id: str, state: ConversationState):
+        """Store the session's state in memory and write it through to disk."""
+        state = state.copy()
+        updated_at = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, dumps(state.to_dict()), updated_at)
+            )
+            self._stats["writes"] += 1
+            self._remember(session_id, state, updated_at)
+
+    def delete(self, session_id: str):
+        """Forget a session entirely."""
+        with self._lock:
+            self._cache.pop(session_id, None)
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self) -> int:
+        """Delete sessions idle for longer than the TTL; returns the number removed."""
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,)
+            )]
+            for session_id in expired:
+                self._cache.pop(session_id, None)
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+        return len(expired)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return cache hit/miss counters and the number of sessions held in memory."""
+        with self._lock:
+            return {**self._stats, "in_memory": len(self._cache)}
+
+    def _updated_at(self, session_id: str) -> Optional[float]:
+        row = self._db.execute("SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def _remember(self, session_id: str, state: ConversationState, updated_at: float):
+        """Insert into the LRU, evicting the least recently used sessions (already on disk)."""
+        self._cache[session_id] = (state, updated_at)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Return the shared session store."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
@@ -0,0 +1,324 @@
+"""
+Routes inbound SMS replies to the reminders they answer.
+
+A patient's reply ("YES", "cancel", "done") carries only their phone number,
+so the router keeps an index from normalized number to the patient's open
+reminders (status "sent": delivered and not yet answered), built from
+reminders.csv joined to patients.csv. A reply resolves with one dictionary
+lookup to the appointment of the most recently sent reminder, and every open
+reminder of that appointment takes the reply's status. "cancel" also cancels
+the appointment, which frees its calendar slot (and drops cached availability
+scans for the doctor, so the slot can be offered again at once). A reply that only might mean
+cancel ("No problem, see you then") is answered with a request to reply
+CANCEL and leaves the reminders open.
+
+Replies are answered at once, but their writes are batched: status updates
+and cancellations collect in memory and a background thread writes them with
+one reminders.csv write and one appointments.xlsx write every
+``flush_seconds`` (or as soon as ``batch_size`` replies are waiting), so a
+burst of webhook calls costs a few file writes instead of one per message.
+Once started, the router keeps the index current in place: reminders this
+process marks sent (or answers) and patients it creates reach it through the
+database's listeners, at the cost of a list insert each. The index is rebuilt
+from the files only on first use, or when they were changed outside those
+listeners (by another process, or by hand).
+"""
+
+from typing import Any, Dict, List, Tuple
+import base64
+import bisect
+import hashlib
+import hmac
+import os
+import threading
+import config
+from utils import database
+from utils.database import Database, data_generations, data_lock
+from utils.lazy_import import lazy_component, lazy_import
+from utils.prefetch import get_availability_prefetcher
+from utils.sms_service import SMSService, normalize_phone
+
+pd = lazy_import("pandas")
+
+REMINDERS = "reminders.csv"
+PATIENTS = "patients.csv"
+
+# SMSService.process_sms_response type -> (reminder status, reply texted back)
+RESPONSES = {
+    "confirmed": ("confirmed", "Thank you for confirming your appointment! We look forward to seeing you."),
+    "cancelled": ("cancelled", "Your appointment has been cancelled. Please call us to reschedule when convenient."),
+    "reschedule_requested": ("reschedule_requested", "We'll call you to find a new time for your appointment."),
+    "forms_completed": ("forms_completed", "Great! Thank you for completing your forms."),
+    "other": ("responded", "Thank you for your response. If you need assistance, please call us."),
+    # Leaves the reminder open, so the follow-up CANCEL or YES still finds it
+    "possible_cancellation": (None, "Would you like to cancel your appointment? Reply CANCEL to confirm, or YES to keep it."),
+}
+UNKNOWN_NUMBER_REPLY = "We couldn't find an upcoming appointment for this number. Please call the clinic."
+
+# (reminder_datetime ISO string, reminder_id, appointment_id), oldest first per number
+OpenReminder = Tuple[str, str, str]
+
+
+def twilio_signature(auth_token: str, url: str, params: Dict[str, str]) -> str:
+    """The X-Twilio-Signature Twilio sends with a webhook: HMAC-SHA1 of the URL and the sorted form fields."""
+    payload = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    digest = hmac.new(auth_token.encode("utf-8"), payload.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+class InboundSMSRouter:
+    """Resolves replies to open reminders by phone number and writes their outcome in batches."""
+
+    db = lazy_component(lambda self: Database())
+    calendar = lazy_component(lambda self: _calendar())
+    sms_service = lazy_component(lambda self: SMSService())
+    prefetcher = lazy_component(lambda self: get_availability_prefetcher() if config.PREFETCH_ENABLED else None)
+
+    def __init__(self, flush_seconds: float = config.SMS_ROUTER_FLUSH_SECONDS,
+                 batch_size: int = config.SMS_ROUTER_BATCH_SIZE):
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._by_phone: Dict[str, List[OpenReminder]] = {}
+        # patient_id -> normalized phone, for placing reminders sent after the index was built
+        self._phones: Dict[str, str] = {}
+        self._signature = None
+        # Written by the next flush; a reload must not bring these reminders back in the meantime
+        self._pending_responses: Dict[str, Tuple[str, str]] = {}
+        self._pending_cancellations: Dict[str, None] = {}
+
+        self._flush_wanted = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._stats = {"received": 0, "matched": 0, "unmatched": 0, "cancelled": 0, "flushes": 0, "reloads": 0,
+                       "updates": 0}
+
+    def handle(self, from_phone: str, message: str) -> Dict[str, Any]:
+        """Resolve one reply and queue its status update; returns the outcome and the text to send back."""
+        classified = self.sms_service.process_sms_response(from_phone, message)
+        phone = normalize_phone(from_phone)
+        self._refresh()
+
+        with self._lock:
+            self._stats["received"] += 1
+            open_reminders = self._by_phone.get(phone)
+            if not open_reminders:
+                self._stats["unmatched"] += 1
+                return {**classified, "matched": False, "status": None, "appointment_id": None,
+                        "reminder_ids": [], "reply": UNKNOWN_NUMBER_REPLY}
+
+            # The reply answers the most recently sent reminder, and with it the rest of that appointment's
+            appointment_id = open_reminders[-1][2]
+            status, reply = RESPONSES[classified["response_type"]]
+            if status is None:
+                return {**classified, "matched": True, "status": None, "appointment_id": appointment_id,
+                        "reminder_ids": [], "reply": reply}
+            answered = [reminder_id for _, reminder_id, appointment in open_reminders if appointment == appointment_id]
+            remaining = [reminder for reminder in open_reminders if reminder[2] != appointment_id]
+            if remaining:
+                self._by_phone[phone] = remaining
+            else:
+                del self._by_phone[phone]
+
+            for reminder_id in answered:
+                self._pending_responses[reminder_id] = (status, message)
+            if status == "cancelled":
+                self._pending_cancellations[appointment_id] = None
+                self._stats["cancelled"] += 1
+            self._stats["matched"] += 1
+            backlog = len(self._pending_responses)
+
+        if self._thread is None:
+            self.flush()
+        elif backlog >= self.batch_size:
+            self._flush_wanted.set()
+
+        return {**classified, "matched": True, "status": status, "appointment_id": appointment_id,
+                "reminder_ids": answered, "reply": reply}
+
+    def flush(self) -> int:
+        """Write the queued reminder statuses and cancellations; returns the number of reminders written."""
+        with self._flush_lock, data_lock:
+            with self._lock:
+                responses, self._pending_responses = self._pending_responses, {}
+                cancellations, self._pending_cancellations = list(self._pending_cancellations), {}
+            if not responses and not cancellations:
+                return 0
+
+            index_current = self._stat() == self._signature
+            written = self.calendar.cancel_appointments(cancellations) and self.db.update_reminder_responses(responses)
+            if not written:
+                # Keep them for the next flush (newer replies for the same reminder win)
+                with self._lock:
+                    for reminder_id, response in responses.items():
+                        self._pending_responses.setdefault(reminder_id, response)
+                    for appointment_id in cancellations:
+                        self._pending_cancellations[appointment_id] = None
+                return 0
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                if index_current:
+                    # Nobody else wrote in between, and the index already reflects this write
+                    self._signature = self._stat()
+
+            if cancellations and self.prefetcher is not None:
+                # A cached scan taken before the cancellation would keep the freed slots hidden
+                freed = {(appointment['doctor'], appointment['location'])
+                         for appointment in self.db.get_appointments(cancellations)}
+                for doctor, location in freed:
+                    self.prefetcher.invalidate(doctor, location)
+            return len(responses)
+
+    def start(self):
+        """Write replies from a background thread every flush_seconds (otherwise each reply is written at once)."""
+        if self._thread is not None:
+            return
+        database.reminder_status_listeners.append(self._on_reminder_statuses)
+        database.patient_listeners.append(self._on_patient)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._flush_loop, name="sms-router-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background writer and write whatever is still queued."""
+        if self._on_reminder_statuses in database.reminder_status_listeners:
+            database.reminder_status_listeners.remove(self._on_reminder_statuses)
+        if self._on_patient in database.patient_listeners:
+            database.patient_listeners.remove(self._on_patient)
+        if self._thread is not None:
+            self._stopping = True
+            self._flush_wanted.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "open_reminders": sum(len(reminders) for reminders in self._by_phone.values()),
+                    "pending_writes": len(self._pending_responses)}
+
+    def _flush_loop(self):
+        while not self._stopping:
+            self._flush_wanted.wait(self.flush_seconds)
+            self._flush_wanted.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing SMS replies: {e}")
+
+    def _on_reminder_statuses(self, reminders_file: str, rows: List[Dict[str, str]]):
+        """Move reminders whose status this process just wrote into or out of the index (data_lock is held)."""
+        if reminders_file != self.db.reminders_file:
+            return
+        with self._lock:
+            for row in rows:
+                phone = self._phones.get(row["patient_id"])
+                if not phone:
+                    continue
+                reminders = [reminder for reminder in self._by_phone.get(phone, []) if reminder[1] != row["reminder_id"]]
+                if row["status"] == "sent" and row["reminder_id"] not in self._pending_responses:
+                    bisect.insort(reminders, (row["reminder_datetime"], row["reminder_id"], row["appointment_id"]))
+                if reminders:
+                    self._by_phone[phone] = reminders
+                else:
+                    self._by_phone.pop(phone, None)
+            self._stats["updates"] += 1
+            self._advance(REMINDERS)
+
+    def _on_patient(self, patients_file: str, record: Dict[str, Any]):
+        """Remember the phone number of a patient this process just created (data_lock is held)."""
+        if patients_file != self.db.patients_file:
+            return
+        with self._lock:
+            phone = normalize_phone(record.get("phone"))
+            if phone:
+                self._phones[str(record["patient_id"])] = phone
+            self._advance(PATIENTS)
+
+    def _advance(self, name: str):
+        # If the index was current before this process's write to `name`, it is current after it too; any
+        # other change in between (another process, the other file) leaves it stale for _refresh to rebuild
+        if self._signature is None:
+            return
+        signature = self._stat()
+        changed = 0 if name == REMINDERS else 1
+        unchanged = 1 - changed
+        if (self._signature[changed] == signature[changed] - 1
+                and self._signature[unchanged] == signature[unchanged]
+                and self._signature[2 + unchanged] == signature[2 + unchanged]):
+            self._signature = signature
+
+    def _stat(self) -> Tuple:
+        signature = [data_generations.get(REMINDERS), data_generations.get(PATIENTS)]
+        for path in (self.db.reminders_file, self.db.patients_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh(self):
+        if self._stat() == self._signature:
+            return
+
+        # Writers hold data_lock too, so the files can't change between the stat and the read
+        with data_lock:
+            signature = self._stat()
+            if signature == self._signature:
+                return
+            index, phones = self._load()
+            with self._lock:
+                answered = self._pending_responses
+                if answered:
+                    index = {phone: [reminder for reminder in reminders if reminder[1] not in answered]
+                             for phone, reminders in index.items()}
+                self._by_phone = {phone: reminders for phone, reminders in index.items() if reminders}
+                self._phones = phones
+                self._signature = signature
+                self._stats["reloads"] += 1
+
+    def _load(self) -> Tuple[Dict[str, List[OpenReminder]], Dict[str, str]]:
+        try:
+            reminders_df = pd.read_csv(self.db.reminders_file, dtype=str)
+            patients_df = pd.read_csv(self.db.patients_file, dtype=str, usecols=['patient_id', 'phone'])
+        except Exception as e:
+            print(f"Error loading open reminders: {e}")
+            return {}, {}
+
+        patients_df = patients_df.drop_duplicates('patient_id')
+        patients_df['phone'] = patients_df['phone'].map(normalize_phone)
+        patients_df = patients_df[patients_df['phone'] != '']
+        phones = dict(zip(patients_df['patient_id'], patients_df['phone']))
+
+        reminders_df = reminders_df[reminders_df['status'] == 'sent']
+        joined = reminders_df.merge(patients_df, on='patient_id', how='inner')
+        joined = joined.sort_values('reminder_datetime', kind='stable')
+
+        index: Dict[str, List[OpenReminder]] = {}
+        for phone, due, reminder_id, appointment_id in zip(joined['phone'], joined['reminder_datetime'],
+                                                           joined['reminder_id'], joined['appointment_id']):
+            index.setdefault(phone, []).append((due, reminder_id, appointment_id))
+        return index, phones
+
+
+def _calendar():
+    from utils.calendar_integration import CalendarIntegration
+    return CalendarIntegration()
+
+
+_sms_router = None
+_sms_router_lock = threading.Lock()
+
+
+def get_sms_router() -> InboundSMSRouter:
+    """Return the shared inbound SMS router, writing replies in the background."""
+    global _sms_router
+    with _sms_router_lock:
+        if _sms_router is None:
+            _sms_router = InboundSMSRouter()
+            _sms_router.start()
+        return _sms_router
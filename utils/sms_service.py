@@ -1,55 +1,275 @@
-from twilio.rest import Client
-from typing import Dict, Any
+"""
+SMS delivery through Twilio.
+
+Single messages go out as they are requested. ``send_bulk_stream`` sends a
+list concurrently on a thread pool, spaced by a token bucket set to the
+sending number's messages-per-second limit. Repeats of the same message to
+the same number are sent once. 429 and 5xx responses are retried with
+jittered exponential backoff, as are connection failures that happen
+before the request is written. A failure after that point (the connection
+dropped or timed out while waiting for the reply) is not retried: Twilio
+may already have accepted the message, and a retry would text the patient
+twice. Each result is yielded as soon as it is known. With TWILIO_API_BASE_URL set, messages are posted straight to that
+Twilio-compatible REST endpoint (such as utils.mock_twilio) instead of
+going through the twilio package.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import urlencode, urlparse
+import base64
+import http.client
+import json
+import random
+import re
+import select
+import threading
+import time
 import config
+from utils.lazy_import import lazy_import
+from utils.rate_limiter import TokenBucket
+
+twilio_rest = lazy_import("twilio.rest")
+requests = lazy_import("requests")
+
+
+def normalize_phone(phone: str) -> str:
+    """E.164 form of a US or international number ("+15551234567"), or "" if it cannot be one."""
+    
+    if not phone:
+        return ""
+    
+    # Remove all non-digit characters
+    digits_only = ''.join(filter(str.isdigit, str(phone)))
+    
+    # Add country code if missing
+    if len(digits_only) == 10:
+        return f"+1{digits_only}"
+    elif len(digits_only) == 11 and digits_only.startswith('1'):
+        return f"+{digits_only}"
+    elif len(digits_only) > 11:
+        return f"+{digits_only}"
+    else:
+        return ""
+
+
+class SMSDeliveryError(Exception):
+    """The provider refused or failed a message; ``status`` is the HTTP status when there was one.
+    
+    ``maybe_sent`` marks a failure after the request went out without a reply coming back,
+    when the provider may have accepted the message anyway.
+    """
+    
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None,
+                 maybe_sent: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.maybe_sent = maybe_sent
+    
+    @property
+    def retryable(self) -> bool:
+        # Throttling, provider errors and connection failures before sending are worth another try
+        if self.maybe_sent:
+            return False
+        return self.status is None or self.status == 429 or self.status >= 500
+
 
 class SMSService:
     """SMS service for sending appointment reminders via Twilio."""
     
-    def __init__(self):
+    def __init__(self, workers: int = config.SMS_WORKERS, rate_per_second: float = config.SMS_RATE_PER_SECOND,
+                 max_retries: int = config.SMS_MAX_RETRIES, backoff_seconds: float = config.SMS_BACKOFF_SECONDS,
+                 api_base_url: Optional[str] = config.TWILIO_API_BASE_URL):
         self.account_sid = config.TWILIO_ACCOUNT_SID
         self.auth_token = config.TWILIO_AUTH_TOKEN
         self.from_number = "+1234567890"  # Replace with your Twilio number
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.api_base_url = api_base_url
+        self.rate_limiter = TokenBucket(rate_per_second)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._connections = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"sent": 0, "failed": 0, "retries": 0, "duplicates": 0}
         
         # Initialize Twilio client if credentials are available
-        if self.account_sid and self.auth_token:
+        self.client = None
+        if self.account_sid and self.auth_token and not api_base_url:
             try:
-                self.client = Client(self.account_sid, self.auth_token)
+                self.client = twilio_rest.Client(self.account_sid, self.auth_token)
             except Exception as e:
                 print(f"Error initializing Twilio client: {e}")
                 self.client = None
-        else:
-            self.client = None
     
     def send_reminder_sms(self, to_phone: str, message: str) -> bool:
         """Send SMS reminder to patient."""
         
-        try:
-            # Clean phone number format
-            clean_phone = self._clean_phone_number(to_phone)
-            
+        # Clean phone number format
+        clean_phone = self._clean_phone_number(to_phone)
+        
+        if not clean_phone:
+            print("Invalid phone number format")
+            return False
+        
+        result = self._send_with_retries(clean_phone, message)
+        if not result["success"]:
+            print(f"Error sending SMS: {result['error']}")
+        return result["success"]
+    
+    def send_bulk_stream(self, reminder_list: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Send {"phone", "message"} items concurrently, yielding a result per item as each one finishes.
+        
+        Results are {"index", "phone", "success", "sid", "attempts", "error", "duplicate"}, where
+        index is the item's position in reminder_list. An item repeating an earlier item's number
+        and text is not sent again and gets a copy of that item's result with duplicate=True.
+        """
+        
+        # (number, text) -> indexes of the items sharing it; the first one is sent
+        groups: Dict[tuple, List[int]] = {}
+        for index, reminder in enumerate(reminder_list):
+            clean_phone = self._clean_phone_number(reminder.get('phone'))
             if not clean_phone:
-                print("Invalid phone number format")
-                return False
-            
-            if self.client:
+                yield self._result(index, reminder.get('phone'), False, error="Invalid phone number format")
+                continue
+            groups.setdefault((clean_phone, reminder.get('message', '')), []).append(index)
+        
+        if not groups:
+            return
+        
+        executor = self._get_executor()
+        futures = {executor.submit(self._send_with_retries, phone, message): (phone, indexes)
+                   for (phone, message), indexes in groups.items()}
+        for future in as_completed(futures):
+            phone, indexes = futures[future]
+            outcome = future.result()
+            for position, index in enumerate(indexes):
+                if position:
+                    self._count("duplicates")
+                yield self._result(index, phone, outcome["success"], outcome.get("sid"), outcome["attempts"],
+                                   outcome.get("error"), duplicate=position > 0)
+    
+    def send_once(self, to_phone: str, message: str) -> str:
+        """Make one delivery attempt and return the SID, raising SMSDeliveryError (for callers that retry)."""
+        clean_phone = self._clean_phone_number(to_phone)
+        if not clean_phone:
+            raise SMSDeliveryError("Invalid phone number format", status=400)
+        try:
+            sid = self._deliver(clean_phone, message)
+        except SMSDeliveryError:
+            self._count("failed")
+            raise
+        self._count("sent")
+        return sid
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+    
+    def _send_with_retries(self, phone: str, message: str) -> Dict[str, Any]:
+        """Deliver one message, retrying throttled and failed attempts with jittered exponential backoff."""
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                sid = self._deliver(phone, message)
+                self._count("sent")
+                return {"success": True, "sid": sid, "attempts": attempts}
+            except SMSDeliveryError as e:
+                if not e.retryable or attempts > self.max_retries:
+                    self._count("failed")
+                    return {"success": False, "error": str(e), "attempts": attempts}
+                self._count("retries")
+                delay = self.backoff_seconds * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)
+                time.sleep(max(delay, e.retry_after or 0))
+    
+    def _deliver(self, phone: str, message: str) -> str:
+        """Send one message and return its SID, raising SMSDeliveryError on failure."""
+        if self.api_base_url:
+            self.rate_limiter.acquire()
+            return self._post_message(phone, message)
+        
+        if self.client:
+            self.rate_limiter.acquire()
+            try:
                 # Send actual SMS
                 message_obj = self.client.messages.create(
                     body=message,
                     from_=self.from_number,
-                    to=clean_phone
+                    to=phone
                 )
-                
-                print(f"SMS sent successfully. SID: {message_obj.sid}")
-                return True
-            else:
-                # Simulate SMS sending for demo
-                print(f"SMS would be sent to: {clean_phone}")
-                print(f"Message: {message}")
-                return True
-                
-        except Exception as e:
-            print(f"Error sending SMS: {e}")
-            return False
+            except Exception as e:
+                status = getattr(e, "status", None)
+                # Without a status only a connect timeout is known to have happened before sending
+                maybe_sent = status is None and not isinstance(e, requests.exceptions.ConnectTimeout)
+                raise SMSDeliveryError(str(e), status, maybe_sent=maybe_sent)
+            
+            print(f"SMS sent successfully. SID: {message_obj.sid}")
+            return message_obj.sid
+        
+        # Simulate SMS sending for demo
+        print(f"SMS would be sent to: {phone}")
+        print(f"Message: {message}")
+        return "SIMULATED"
+    
+    def _post_message(self, phone: str, message: str) -> str:
+        """POST to the Twilio Messages REST endpoint at api_base_url over a per-thread keep-alive connection."""
+        url = urlparse(self.api_base_url)
+        account_sid = self.account_sid or "ACmock"
+        credentials = base64.b64encode(f"{account_sid}:{self.auth_token or ''}".encode()).decode()
+        body = urlencode({"To": phone, "From": self.from_number, "Body": message})
+        headers = {"Authorization": f"Basic {credentials}", "Content-Type": "application/x-www-form-urlencoded"}
+        
+        connection = getattr(self._connections, "connection", None)
+        if connection is not None and self._closed_by_server(connection):
+            connection.close()
+            connection = None
+        request_written = False
+        try:
+            if connection is None:
+                connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+                connection = connection_class(url.netloc, timeout=30)
+                self._connections.connection = connection
+            connection.request("POST", f"{url.path.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json",
+                               body=body, headers=headers)
+            request_written = True
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            if connection is not None:
+                connection.close()
+            self._connections.connection = None
+            raise SMSDeliveryError(f"Connection error: {e}", maybe_sent=request_written)
+        
+        if response.status >= 300:
+            retry_after = response.getheader("Retry-After")
+            raise SMSDeliveryError(f"HTTP {response.status}: {payload[:200].decode('utf-8', 'replace')}",
+                                   response.status, float(retry_after) if retry_after else None)
+        return json.loads(payload).get("sid", "")
+    
+    @staticmethod
+    def _closed_by_server(connection: http.client.HTTPConnection) -> bool:
+        """Whether an idle keep-alive connection was closed by the server (it reads as ready: EOF)."""
+        sock = connection.sock
+        return sock is not None and bool(select.select([sock], [], [], 0)[0])
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sms-send")
+            return self._executor
+    
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+    
+    @staticmethod
+    def _result(index: int, phone: str, success: bool, sid: str = None, attempts: int = 0, error: str = None,
+                duplicate: bool = False) -> Dict[str, Any]:
+        return {"index": index, "phone": phone, "success": success, "sid": sid, "attempts": attempts,
+                "error": error, "duplicate": duplicate}
     
     def send_appointment_confirmation_sms(self, patient_phone: str, patient_name: str, appointment_data: Dict[str, Any]) -> bool:
         """Send appointment confirmation SMS."""
@@ -104,45 +324,41 @@ Thank you!
     
     def _clean_phone_number(self, phone: str) -> str:
         """Clean and format phone number for SMS."""
-        
-        if not phone:
-            return ""
-        
-        # Remove all non-digit characters
-        digits_only = ''.join(filter(str.isdigit, phone))
-        
-        # Add country code if missing
-        if len(digits_only) == 10:
-            return f"+1{digits_only}"
-        elif len(digits_only) == 11 and digits_only.startswith('1'):
-            return f"+{digits_only}"
-        elif len(digits_only) > 11:
-            return f"+{digits_only}"
-        else:
-            return ""
+        return normalize_phone(phone)
     
     def process_sms_response(self, from_phone: str, message: str) -> Dict[str, Any]:
         """Process incoming SMS responses from patients."""
         
-        message_lower = message.lower().strip()
+        # Whole words only: "no thank you" must not match the "y" of a yes
+        words = set(re.findall(r"[a-z]+", message.lower()))
+        confirms = bool(words & {'yes', 'confirm', 'confirmed', 'y'})
+        
+        # Determine response type. Only an unambiguous reply cancels: "Yes, no problem" is a yes,
+        # and a "no" inside a longer reply is asked about rather than acted on
+        if 'cancel' in words and confirms:
+            response_type = 'possible_cancellation'
+            status_message = "Unclear cancellation request via SMS"
         
-        # Determine response type
-        if any(word in message_lower for word in ['yes', 'confirm', 'confirmed', 'y']):
+        elif confirms:
             response_type = 'confirmed'
             status_message = "Appointment confirmed via SMS"
         
-        elif any(word in message_lower for word in ['no', 'cancel', 'n']):
+        elif 'cancel' in words or words in ({'no'}, {'n'}):
             response_type = 'cancelled'
             status_message = "Appointment cancelled via SMS"
         
-        elif any(word in message_lower for word in ['reschedule', 'change', 'move']):
+        elif words & {'reschedule', 'change', 'move'}:
             response_type = 'reschedule_requested'
             status_message = "Reschedule requested via SMS"
         
-        elif any(word in message_lower for word in ['completed', 'done', 'filled']):
+        elif words & {'completed', 'done', 'filled'}:
             response_type = 'forms_completed'
             status_message = "Intake forms completed via SMS"
         
+        elif words & {'no', 'n'}:
+            response_type = 'possible_cancellation'
+            status_message = "Unclear cancellation request via SMS"
+        
         else:
             response_type = 'other'
             status_message = "Response received via SMS"
@@ -156,31 +372,28 @@ Thank you!
         }
     
     def send_bulk_reminders(self, reminder_list: list) -> Dict[str, Any]:
-        """Send bulk SMS reminders."""
+        """Send bulk SMS reminders ('results' holds whether each one was sent, in order)."""
         
         results = {
             'total_sent': 0,
             'successful': 0,
             'failed': 0,
-            'errors': []
+            'duplicates': 0,
+            'errors': [],
+            'results': [False] * len(reminder_list)
         }
         
-        for reminder in reminder_list:
-            try:
-                success = self.send_reminder_sms(
-                    reminder['phone'], 
-                    reminder['message']
-                )
-                
+        for result in self.send_bulk_stream(reminder_list):
+            results['results'][result['index']] = result['success']
+            if result['duplicate']:
+                results['duplicates'] += 1
+            else:
                 results['total_sent'] += 1
-                
-                if success:
-                    results['successful'] += 1
-                else:
-                    results['failed'] += 1
-                    
-            except Exception as e:
+            
+            if result['success']:
+                results['successful'] += 1
+            else:
                 results['failed'] += 1
-                results['errors'].append(f"Failed to send to {reminder.get('phone', 'unknown')}: {str(e)}")
+                results['errors'].append(f"Failed to send to {result['phone'] or 'unknown'}: {result['error']}")
         
         return results
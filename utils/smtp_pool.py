@@ -0,0 +1,273 @@
+"""
+Pooled, authenticated SMTP connections for EmailService.
+
+Opening an SMTP connection costs several round trips (greeting, EHLO,
+STARTTLS and its TLS handshake, EHLO again, AUTH) before the first message
+can go out, and EmailService used to pay that for every message. The pool
+keeps up to ``size`` logged-in connections open and lends them out one
+message at a time:
+
+* A connection that has been idle for ``idle_check_seconds`` is checked
+  with NOOP before it is reused. A dead one is replaced.
+* A connection that drops before the message body goes out is discarded,
+  and the message is retried once on a fresh connection. A drop after the
+  body was sent but before the server's reply arrived raises
+  DeliveryUncertain instead: the server may have queued the mail, and a
+  retry could deliver it twice.
+* A connection is retired after ``max_messages`` messages, because many
+  servers cap messages per session.
+* When the server advertises PIPELINING (RFC 2920), MAIL FROM, the RCPT
+  TOs and DATA go out in one write, so a message costs two round trips
+  instead of 3 + one per recipient.
+"""
+
+from contextlib import contextmanager
+from email.message import Message
+from email.utils import getaddresses
+from typing import Dict, Optional
+import queue
+import re
+import threading
+import time
+import config
+from utils.lazy_import import lazy_import
+
+smtplib = lazy_import("smtplib")
+
+
+def _connection_broken(error: BaseException) -> bool:
+    """Whether the error leaves the session unusable (as opposed to the server refusing one message).
+    
+    smtplib's errors subclass OSError, so socket failures are told apart from SMTP replies here.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, (OSError, EOFError)) and not isinstance(error, smtplib.SMTPException)
+
+
+class DeliveryUncertain(Exception):
+    """The session dropped after the message body was sent; the server may or may not have queued it."""
+
+
+class PooledSMTPConnection:
+    """One logged-in SMTP session and its usage counters."""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.messages = 0
+        # Set from the moment the body starts going out until the server's reply to it is read
+        self.awaiting_reply = False
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+
+class SMTPConnectionPool:
+    """Up to ``size`` reusable, authenticated SMTP connections to one server."""
+
+    def __init__(self, host: str = config.EMAIL_HOST, port: int = config.EMAIL_PORT, user: Optional[str] = config.EMAIL_USER,
+                 password: Optional[str] = config.EMAIL_PASSWORD, size: int = config.SMTP_POOL_SIZE,
+                 starttls: bool = config.EMAIL_STARTTLS, idle_check_seconds: float = config.SMTP_IDLE_CHECK_SECONDS,
+                 max_messages: int = config.SMTP_MAX_MESSAGES_PER_CONNECTION, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.starttls = starttls
+        self.idle_check_seconds = idle_check_seconds
+        self.max_messages = max_messages
+        self.timeout = timeout
+
+        # Most recently returned first, so a few warm connections carry light traffic
+        self._idle: "queue.LifoQueue[PooledSMTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats_lock = threading.Lock()
+        self._stats = {"connections_opened": 0, "reused": 0, "health_checks": 0, "reconnects": 0,
+                       "sent": 0, "failed": 0, "uncertain": 0, "pipelined": 0}
+
+    def send(self, msg: Message) -> bool:
+        """Send one message over a pooled connection; returns whether the server accepted it."""
+        try:
+            self.deliver(msg)
+            return True
+        except Exception as e:
+            print(f"Error sending email to {msg['To']}: {e}")
+            return False
+
+    def deliver(self, msg: Message):
+        """Send one message over a pooled connection, raising the SMTP or socket error if it fails."""
+        for attempt in (1, 2):
+            used = None
+            try:
+                with self.connection() as pooled:
+                    used = pooled
+                    self._transmit(pooled, msg)
+                self._count("sent")
+                return
+            except Exception as e:
+                if _connection_broken(e) and used is not None and used.awaiting_reply:
+                    self._count("uncertain")
+                    raise DeliveryUncertain(f"Connection lost after sending the message to {msg['To']}: {e}") from e
+                if _connection_broken(e) and attempt == 1:
+                    # The session dropped (or could not be opened): try once more on a new connection
+                    self._count("reconnects")
+                    continue
+                self._count("failed")
+                raise
+
+    @contextmanager
+    def connection(self):
+        """Borrow a healthy connection; it goes back to the pool unless an error broke it."""
+        self._slots.acquire()
+        pooled = None
+        try:
+            pooled = self._checkout()
+            yield pooled
+        except BaseException as e:
+            if pooled is not None and not _connection_broken(e):
+                # Refused by the server: clear the failed transaction so the next message starts clean
+                try:
+                    pooled.smtp.rset()
+                except Exception:
+                    e = smtplib.SMTPServerDisconnected("RSET failed")
+            if pooled is not None and _connection_broken(e):
+                pooled.smtp.close()
+                pooled = None
+            raise
+        finally:
+            if pooled is not None:
+                pooled.last_used = time.monotonic()
+                if pooled.messages >= self.max_messages:
+                    pooled.close()
+                else:
+                    self._idle.put(pooled)
+            self._slots.release()
+
+    def close(self):
+        """Log out of every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {**self._stats, "idle": self._idle.qsize()}
+
+    def _checkout(self) -> PooledSMTPConnection:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - pooled.last_used < self.idle_check_seconds:
+                self._count("reused")
+                return pooled
+            self._count("health_checks")
+            try:
+                if pooled.smtp.noop()[0] == 250:
+                    self._count("reused")
+                    return pooled
+            except (OSError, EOFError):
+                pass
+            pooled.smtp.close()
+
+    def _connect(self) -> PooledSMTPConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._count("connections_opened")
+        return PooledSMTPConnection(smtp)
+
+    def _transmit(self, pooled: PooledSMTPConnection, msg: Message):
+        smtp = pooled.smtp
+        pooled.messages += 1
+        from_addr = msg["From"] or self.user or ""
+        to_addrs = [address for _, address in getaddresses(msg.get_all("To", []) + msg.get_all("Cc", []))]
+        if not smtp.has_extn("pipelining"):
+            self._transmit_unpipelined(pooled, msg, from_addr, to_addrs)
+            return
+
+        smtp.send(f"MAIL FROM:<{from_addr}>\r\n" + "".join(f"RCPT TO:<{address}>\r\n" for address in to_addrs) + "DATA\r\n")
+        mail_reply = smtp.getreply()
+        rcpt_replies = [smtp.getreply() for _ in to_addrs]
+        data_reply = smtp.getreply()
+
+        if data_reply[0] != 354:
+            if mail_reply[0] != 250:
+                raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], from_addr)
+            refused = {address: reply for address, reply in zip(to_addrs, rcpt_replies) if reply[0] not in (250, 251)}
+            if refused:
+                raise smtplib.SMTPRecipientsRefused(refused)
+            raise smtplib.SMTPDataError(*data_reply)
+
+        pooled.awaiting_reply = True
+        smtp.send(_dot_stuffed(msg) + b".\r\n")
+        code, response = smtp.getreply()
+        pooled.awaiting_reply = False
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+        self._count("pipelined")
+
+    def _transmit_unpipelined(self, pooled: PooledSMTPConnection, msg: Message, from_addr: str, to_addrs):
+        """MAIL, RCPT and DATA one command at a time (what send_message does), tracking when the body is out."""
+        smtp = pooled.smtp
+        code, response = smtp.mail(from_addr)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, response, from_addr)
+        refused = {}
+        for address in to_addrs:
+            code, response = smtp.rcpt(address)
+            if code not in (250, 251):
+                refused[address] = (code, response)
+        if refused:
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        code, response = smtp.docmd("DATA")
+        if code != 354:
+            raise smtplib.SMTPDataError(code, response)
+        pooled.awaiting_reply = True
+        smtp.send(_dot_stuffed(msg) + b".\r\n")
+        code, response = smtp.getreply()
+        pooled.awaiting_reply = False
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+
+def _dot_stuffed(msg: Message) -> bytes:
+    """The message as SMTP DATA: CRLF line endings, leading dots doubled, ending in CRLF."""
+    data = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+    data = re.sub(rb"(?m)^\.", b"..", data)
+    return data if data.endswith(b"\r\n") else data + b"\r\n"
+
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Return the shared SMTP connection pool for the configured server."""
+    global _smtp_pool
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            _smtp_pool = SMTPConnectionPool()
+        return _smtp_pool
@@ -0,0 +1,277 @@
+"""
+Precompiled extraction of structured fields from free-text messages.
+
+The extractors are pure functions of the input text: they never touch an LLM
+client, so the agents and offline batch jobs can share them.
+
+PatientInfoExtractor finds every name, date-of-birth, doctor and location
+anchor in a single ``finditer`` pass over one combined alternation pattern,
+reading each candidate's value with a precompiled anchored match. Doctor and
+location candidates are validated against a gazetteer built from the doctors
+schedule, so "Dr. Johnson at Downtown clinic" yields doctor "Johnson" and
+location "Downtown".
+
+InsuranceInfoExtractor resolves the carrier through the shared payer matcher
+(see utils.payer_matcher) and reads member and group numbers with
+precompiled patterns.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import config
+from utils.payer_matcher import get_payer_matcher
+
+# Words that start a message but are never the first half of a name
+_NON_NAME_WORDS = {"hi", "hello", "hey", "good", "yes", "no", "i", "my", "please", "thanks", "thank"}
+
+# Location keywords in priority order (earlier keywords win)
+_LOCATION_KEYWORDS = ["location", "clinic", "office", "branch"]
+
+_VALUE = re.compile(r"[a-z\s]+")
+_LEADING_NAME = re.compile(r"([a-z][a-z]+)\s+([a-z][a-z]+)")
+
+
+class Gazetteer:
+    """Known doctor and location names used to validate extracted candidates."""
+
+    def __init__(self, doctors: List[str] = None, locations: List[str] = None):
+        self.doctors = {name.lower(): name for name in (doctors or [])}
+        self.locations = {name.lower(): name for name in (locations or [])}
+        self._doctor_pattern = self._compile(self.doctors)
+        self._location_pattern = self._compile(self.locations)
+
+    def match_doctor(self, candidate: str) -> Optional[str]:
+        """Return the known doctor named in the candidate text, if any."""
+        return self._match(candidate, self._doctor_pattern, self.doctors)
+
+    def match_location(self, candidate: str) -> Optional[str]:
+        """Return the known location named in the candidate text, if any."""
+        return self._match(candidate, self._location_pattern, self.locations)
+
+    @staticmethod
+    def _compile(names: Dict[str, str]):
+        if not names:
+            return None
+        alternatives = sorted(names, key=len, reverse=True)
+        return re.compile(r"\b(?:" + "|".join(re.escape(name) for name in alternatives) + r")\b")
+
+    @staticmethod
+    def _match(candidate: str, pattern, names: Dict[str, str]) -> Optional[str]:
+        if pattern is None:
+            return None
+        match = pattern.search(candidate.lower())
+        return names[match.group(0)] if match else None
+
+
+def load_schedule_gazetteer(schedule_file: str = config.DOCTORS_SCHEDULE_XLSX) -> Gazetteer:
+    """Build a gazetteer from the doctor and location columns of the schedule file."""
+    if not os.path.exists(schedule_file):
+        return Gazetteer()
+
+    try:
+        import pandas as pd
+        schedule_df = pd.read_excel(schedule_file)
+        return Gazetteer(
+            doctors=[str(name) for name in schedule_df['doctor'].dropna().unique()],
+            locations=[str(name) for name in schedule_df['location'].dropna().unique()]
+        )
+    except Exception as e:
+        print(f"Error loading schedule gazetteer: {e}")
+        return Gazetteer()
+
+
+class PatientInfoExtractor:
+    """Single-pass extractor for name, date of birth, doctor and location."""
+
+    fields = ["name", "date_of_birth", "preferred_doctor", "location"]
+
+    def __init__(self, gazetteer: Gazetteer = None):
+        self.gazetteer = gazetteer or Gazetteer()
+
+        name_keywords = ["my name is", "i'm", "i am", "name's"]
+        alternatives = [
+            r"(?P<name>\b(?:" + "|".join(name_keywords) + r")\s+)",
+            r"(?P<dob>\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"(?P<doctor>\b(?:doctor|dr\.?)\s+)",
+            r"(?P<location>\b(?P<location_keyword>" + "|".join(_LOCATION_KEYWORDS) + r")[:\s]+)",
+        ]
+        first_chars = {keyword[0] for keyword in name_keywords + _LOCATION_KEYWORDS + ["doctor"]}
+
+        if self.gazetteer.locations:
+            known = sorted(self.gazetteer.locations, key=len, reverse=True)
+            alternatives.append(r"(?P<known_location>\b(?:" + "|".join(re.escape(name) for name in known) + r")\b)")
+            first_chars.update(name[0] for name in known)
+
+        # The leading lookahead lets the regex engine skip positions that cannot start an anchor
+        first_char_class = "".join(re.escape(char) for char in sorted(first_chars))
+        self._anchors = re.compile(r"(?=[" + first_char_class + r"0-9])(?:" + "|".join(alternatives) + ")")
+
+    def extract(self, text: str, existing_data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Return existing_data updated with any fields found in text (existing values win)."""
+        data = dict(existing_data or {})
+        if all(data.get(field) for field in self.fields):
+            return data
+
+        # All extracted values are title-cased, so matching runs on the lowercased text
+        lowered = text.lower()
+        name = dob = None
+        doctors: List[str] = []
+        location_candidates: List[Tuple[int, str]] = []
+        known_location = None
+
+        for match in self._anchors.finditer(lowered):
+            kind = match.lastgroup
+
+            if kind == "dob":
+                dob = dob or match.group("dob")
+            elif kind == "known_location":
+                known_location = known_location or self.gazetteer.locations[match.group("known_location")]
+            else:
+                value = self._read_value(lowered, match.end())
+                if not value:
+                    continue
+                if kind == "name":
+                    name = name or value
+                elif kind == "doctor":
+                    doctors.append(value)
+                else:
+                    priority = _LOCATION_KEYWORDS.index(match.group("location_keyword"))
+                    location_candidates.append((priority, value))
+
+        if not data.get("name"):
+            name = name or self._leading_name(lowered)
+            if name:
+                data["name"] = name.title()
+
+        if dob and not data.get("date_of_birth"):
+            data["date_of_birth"] = dob
+
+        if doctors and not data.get("preferred_doctor"):
+            data["preferred_doctor"] = self._validated(doctors, self.gazetteer.match_doctor)
+
+        if not data.get("location"):
+            location = self._choose_location(location_candidates, known_location)
+            if location:
+                data["location"] = location
+
+        return data
+
+    def _choose_location(self, candidates: List[Tuple[int, str]], known_location: Optional[str]) -> Optional[str]:
+        """Prefer a keyword candidate naming a known location, then any known location mentioned."""
+        ordered = [value for _, value in sorted(candidates, key=lambda candidate: candidate[0])] if candidates else []
+        for value in ordered:
+            match = self.gazetteer.match_location(value)
+            if match:
+                return match
+        if known_location:
+            return known_location
+        return ordered[0].title() if ordered else None
+
+    @staticmethod
+    def _validated(candidates: List[str], matcher) -> str:
+        """Return the first candidate's gazetteer match, else the first raw candidate."""
+        for value in candidates:
+            match = matcher(value)
+            if match:
+                return match
+        return candidates[0].title()
+
+    @staticmethod
+    def _read_value(text: str, position: int) -> str:
+        match = _VALUE.match(text, position)
+        return match.group(0).strip() if match else ""
+
+    @staticmethod
+    def _leading_name(text: str) -> Optional[str]:
+        """A message that opens with two words ("Jane Doe, 01/02/1990") is taken as a name."""
+        match = _LEADING_NAME.match(text)
+        if match and match.group(1) not in _NON_NAME_WORDS:
+            return match.group(0)
+        return None
+
+
+_CARRIER_PATTERNS = [
+    re.compile(r"(?:insurance|carrier|company)\s+(?:is\s+)?([a-zA-Z\s&]+)", re.IGNORECASE),
+    re.compile(r"i have\s+([a-zA-Z\s&]+)\s+insurance", re.IGNORECASE),
+]
+_MEMBER_ID_PATTERNS = [
+    re.compile(r"(?:member\s+id|member\s+number|id\s+number|policy\s+number)[:\s]+(?:is\s+)?([a-zA-Z0-9]+)", re.IGNORECASE),
+    re.compile(r"(?:id|number)[:\s]+(?:is\s+)?([a-zA-Z0-9]{6,})", re.IGNORECASE),
+]
+_GROUP_PATTERNS = [
+    re.compile(r"(?:group\s+number|group\s+id)[:\s]+(?:is\s+)?([a-zA-Z0-9]+)", re.IGNORECASE),
+    re.compile(r"group[:\s]+(?:is\s+)?([a-zA-Z0-9]+)", re.IGNORECASE),
+]
+
+
+class InsuranceInfoExtractor:
+    """Extractor for insurance carrier, member ID and group number."""
+
+    fields = ["insurance_carrier", "member_id", "group_number"]
+
+    def __init__(self, payer_matcher=None):
+        self.payer_matcher = payer_matcher
+
+    def extract(self, text: str, existing_data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Return existing_data updated with any fields found in text (existing values win)."""
+        data = dict(existing_data or {})
+
+        if not data.get("insurance_carrier"):
+            carrier = (self.payer_matcher or get_payer_matcher()).match(text) or self._carrier_phrase(text)
+            if carrier:
+                data["insurance_carrier"] = carrier
+
+        if not data.get("member_id"):
+            member_id = self._first_match(_MEMBER_ID_PATTERNS, text)
+            if member_id:
+                data["member_id"] = member_id
+
+        if not data.get("group_number"):
+            group_number = self._first_match(_GROUP_PATTERNS, text)
+            if group_number:
+                data["group_number"] = group_number
+
+        return data
+
+    @staticmethod
+    def _carrier_phrase(text: str) -> Optional[str]:
+        """Carrier named in a phrase such as "my insurance is ..." when it is not a known payer."""
+        for pattern in _CARRIER_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                carrier = match.group(1).strip()
+                if len(carrier) > 2:  # Avoid capturing single words
+                    return carrier.title()
+        return None
+
+    @staticmethod
+    def _first_match(patterns, text: str) -> Optional[str]:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                return match.group(1)
+        return None
+
+
+_patient_extractor = None
+_patient_extractor_key = None
+_patient_extractor_lock = threading.Lock()
+
+
+def get_patient_extractor(schedule_file: str = config.DOCTORS_SCHEDULE_XLSX) -> PatientInfoExtractor:
+    """Return a shared extractor, rebuilt only when the schedule file changes."""
+    global _patient_extractor, _patient_extractor_key
+
+    try:
+        stat = os.stat(schedule_file)
+        key = (schedule_file, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (schedule_file, None, None)
+
+    with _patient_extractor_lock:
+        if _patient_extractor is None or _patient_extractor_key != key:
+            _patient_extractor = PatientInfoExtractor(load_schedule_gazetteer(schedule_file))
+            _patient_extractor_key = key
+        return _patient_extractor
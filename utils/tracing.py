@@ -0,0 +1,305 @@
+"""
+Lightweight in-process tracing of conversation turns.
+
+``start_trace`` opens the root span of a trace (one per conversation turn)
+and ``span`` / ``traced`` record nested timing spans for step handlers, LLM
+calls and data I/O. Spans opened while no trace is active cost almost
+nothing, so the instrumentation can stay in the hot paths.
+
+Finished traces go to the shared TraceRecorder, which keeps the most recent
+ones in memory, aggregates time per span name (to find slow steps) and,
+when TRACE_LOG is set, appends every trace to a JSONL file. A trace can be
+dumped as a JSON tree or as Chrome trace events, which chrome://tracing,
+Perfetto and speedscope load directly.
+
+Usage:
+    python -m utils.tracing data/traces.jsonl                 # slowest spans
+    python -m utils.tracing data/traces.jsonl --chrome out.json
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+import config
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("name", "category", "start", "end", "attrs", "children")
+
+    def __init__(self, name: str, category: str, attrs: Dict[str, Any] = None):
+        self.name = name
+        self.category = category
+        self.start = time.perf_counter()
+        self.end = None
+        self.attrs = attrs or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def walk(self, depth: int = 0):
+        """Yield (span, depth) for this span and all its descendants."""
+        yield self, depth
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+class Trace:
+    """A finished (or running) tree of spans rooted at one operation."""
+
+    def __init__(self, root: Span):
+        self.root = root
+        self.started_at = time.time()
+        self.thread_id = threading.get_ident()
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the span tree with start offsets and durations in milliseconds."""
+        origin = self.root.start
+
+        def convert(span: Span) -> Dict[str, Any]:
+            return {
+                "name": span.name,
+                "category": span.category,
+                "start_ms": round((span.start - origin) * 1000, 3),
+                "duration_ms": round(span.duration_ms, 3),
+                "attrs": span.attrs,
+                "children": [convert(child) for child in span.children]
+            }
+
+        return {"started_at": self.started_at, "root": convert(self.root)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), default=str)
+
+    def to_chrome_events(self, pid: int = 1) -> List[Dict[str, Any]]:
+        """Return the spans as Chrome trace "complete" events (microsecond timestamps)."""
+        base_us = self.started_at * 1e6
+        origin = self.root.start
+        return [{
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": base_us + (span.start - origin) * 1e6,
+            "dur": span.duration_ms * 1000,
+            "pid": pid,
+            "tid": self.thread_id,
+            "args": span.attrs
+        } for span, _ in self.root.walk()]
+
+    def format(self) -> str:
+        """Return an indented text rendering of the span tree."""
+        return "\n".join(f"{'  ' * depth}{span.name} [{span.category}] {span.duration_ms:.1f} ms"
+                         for span, depth in self.root.walk())
+
+
+def chrome_trace(traces: Iterable[Any]) -> Dict[str, Any]:
+    """Combine traces (Trace objects or their to_dict() form) into one Chrome trace document."""
+    events = []
+    for trace in traces:
+        if isinstance(trace, dict):
+            trace = _trace_from_dict(trace)
+        events.extend(trace.to_chrome_events())
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _trace_from_dict(data: Dict[str, Any]) -> Trace:
+    """Rebuild a Trace from its to_dict() form (durations are kept, clocks are relative)."""
+
+    def convert(node: Dict[str, Any]) -> Span:
+        span = Span(node["name"], node["category"], node.get("attrs"))
+        span.start = node["start_ms"] / 1000
+        span.end = span.start + node["duration_ms"] / 1000
+        span.children = [convert(child) for child in node.get("children", [])]
+        return span
+
+    trace = Trace(convert(data["root"]))
+    trace.started_at = data.get("started_at", 0)
+    return trace
+
+
+class TraceRecorder:
+    """Keeps recent traces, per-span-name totals and an optional JSONL trace log."""
+
+    def __init__(self, capacity: int = config.TRACE_BUFFER_SIZE, log_path: Optional[str] = config.TRACE_LOG):
+        self.log_path = log_path
+        self._recent = deque(maxlen=capacity)
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+        if log_path and os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    def record(self, trace: Trace):
+        line = trace.to_json() if self.log_path else None
+        with self._lock:
+            self._recent.append(trace)
+            _accumulate(self._totals, trace)
+            if line is not None:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def recent(self, limit: int = None) -> List[Trace]:
+        """Return the most recent traces, oldest first."""
+        with self._lock:
+            traces = list(self._recent)
+        return traces[-limit:] if limit else traces
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Return per-span-name count, total, mean and max time, slowest total first."""
+        with self._lock:
+            totals = {name: dict(values) for name, values in self._totals.items()}
+        return _summarize(totals)
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._totals.clear()
+
+
+def _accumulate(totals: Dict[str, Dict[str, float]], trace: Trace):
+    """Add every span of the trace to the per-name count/total/max table."""
+    for node, _ in trace.root.walk():
+        values = totals.setdefault(node.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        duration = node.duration_ms
+        values["count"] += 1
+        values["total_ms"] += duration
+        values["max_ms"] = max(values["max_ms"], duration)
+
+
+def _summarize(totals: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    rows = [{
+        "name": name,
+        "count": int(values["count"]),
+        "total_ms": round(values["total_ms"], 3),
+        "mean_ms": round(values["total_ms"] / values["count"], 3),
+        "max_ms": round(values["max_ms"], 3)
+    } for name, values in totals.items() if values["count"]]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+_trace_recorder = None
+_trace_recorder_lock = threading.Lock()
+
+
+def get_trace_recorder() -> TraceRecorder:
+    """Return the shared trace recorder."""
+    global _trace_recorder
+    with _trace_recorder_lock:
+        if _trace_recorder is None:
+            _trace_recorder = TraceRecorder()
+        return _trace_recorder
+
+
+@contextmanager
+def start_trace(name: str, category: str = "turn", recorder: TraceRecorder = None, **attrs):
+    """Open a trace rooted at this operation and record it when the block exits.
+
+    Yields the Trace (None when tracing is disabled). Inside an already
+    active trace this opens a nested span and yields None.
+    """
+    if not config.TRACING_ENABLED:
+        yield None
+        return
+    if _current_span.get() is not None:
+        with span(name, category, **attrs):
+            yield None
+        return
+
+    root = Span(name, category, attrs)
+    trace = Trace(root)
+    token = _current_span.set(root)
+    try:
+        yield trace
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        (recorder or get_trace_recorder()).record(trace)
+
+
+@contextmanager
+def span(name: str, category: str = "function", **attrs):
+    """Record a child span of the active span (a no-op outside a trace)."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, category, attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def traced(name: str = None, category: str = "function"):
+    """Decorator recording a span named after the function (or ``name``) for each call."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def read_trace_log(path: str) -> Iterable[Dict[str, Any]]:
+    """Yield traces (to_dict() form) from a JSONL trace log."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize or convert a JSONL trace log')
+    parser.add_argument('log', help='Trace log written with TRACE_LOG')
+    parser.add_argument('--chrome', default=None, help='Write a Chrome trace file for chrome://tracing or Perfetto')
+    parser.add_argument('--top', type=int, default=15, help='Spans to list, by total time')
+    args = parser.parse_args()
+
+    traces = list(read_trace_log(args.log))
+    if args.chrome:
+        with open(args.chrome, "w", encoding="utf-8") as f:
+            json.dump(chrome_trace(traces), f)
+        print(f"Wrote {len(traces)} traces to {args.chrome}")
+        return
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for trace in traces:
+        _accumulate(totals, _trace_from_dict(trace))
+
+    print(f"{len(traces)} traces")
+    print(f"{'span':<44} {'count':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}")
+    for row in _summarize(totals)[:args.top]:
+        print(f"{row['name']:<44} {row['count']:>7} {row['total_ms']:>11.1f} {row['mean_ms']:>9.2f} {row['max_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
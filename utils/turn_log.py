@@ -0,0 +1,193 @@
+"""
+Append-only log of conversation turns, and offline replay of the log.
+
+When TURN_LOG is set, the conversation API and the Streamlit app append one
+JSON line per turn: session ID, turn ID, wall-clock time, the step the
+session was at, the patient's message, the step it moved to, how long the
+turn took and whether it was a resubmitted (duplicate) turn. Lines are only
+ever appended, so the file is a per-session history of what was said.
+
+The log is also a workload for performance regression runs: ``replay``
+feeds every logged session's messages, in order, through ConversationAPI
+against a scratch copy of a data directory and compares replayed per-step
+latency with the recorded one. Replay against a snapshot of data/ taken
+before the logged traffic (--data-dir), otherwise returning and new
+patients will not follow the same paths they did when logged.
+
+Usage:
+    python -m utils.turn_log data/turn_log.jsonl                   # per-step latency
+    python -m utils.turn_log data/turn_log.jsonl --replay --data-dir snapshot/data
+"""
+
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import config
+
+
+class TurnLog:
+    """Appends one JSON line per conversation turn (a no-op without a path)."""
+
+    def __init__(self, path: Optional[str] = config.TURN_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def append(self, session_id: str, turn_id: Optional[str], step: str, message: str, next_step: str,
+               duration_ms: float, duplicate: bool = False):
+        if not self.path:
+            return
+        line = json.dumps({
+            "session_id": session_id,
+            "turn_id": turn_id,
+            "ts": time.time(),
+            "step": step,
+            "message": message,
+            "next_step": next_step,
+            "duration_ms": round(duration_ms, 3),
+            "duplicate": duplicate
+        })
+        with self._lock:
+            # One write per line in append mode, so lines from several processes do not interleave
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_turn_log = None
+_turn_log_lock = threading.Lock()
+
+
+def get_turn_log() -> TurnLog:
+    """Return the shared turn log."""
+    global _turn_log
+    with _turn_log_lock:
+        if _turn_log is None:
+            _turn_log = TurnLog()
+        return _turn_log
+
+
+def read_turn_log(path: str) -> Iterable[Dict[str, Any]]:
+    """Yield turn records from a JSONL turn log, oldest first."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def sessions_from_log(records: Iterable[Dict[str, Any]]) -> "OrderedDict[str, List[Dict[str, Any]]]":
+    """Group turns by session in log order, leaving out duplicate submissions."""
+    sessions: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for record in records:
+        if not record.get("duplicate"):
+            sessions.setdefault(record["session_id"], []).append(record)
+    return sessions
+
+
+def step_latencies(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Return turn count and p50/p95/max milliseconds per step."""
+    durations: Dict[str, List[float]] = {}
+    for record in records:
+        durations.setdefault(record["step"], []).append(record["duration_ms"])
+
+    summary = {}
+    for step, values in durations.items():
+        values.sort()
+        summary[step] = {
+            "turns": len(values),
+            "p50_ms": round(values[int(0.50 * (len(values) - 1))], 2),
+            "p95_ms": round(values[int(0.95 * (len(values) - 1))], 2),
+            "max_ms": round(values[-1], 2)
+        }
+    return summary
+
+
+def replay(path: str, data_dir: str = "data", workers: int = 1, limit: int = None) -> List[Dict[str, Any]]:
+    """Replay the logged sessions against a scratch copy of ``data_dir``; returns the replayed turn records.
+
+    Runs in a temporary working directory (session store, job queue and data
+    files all resolve there), so the real data/ is never touched.
+    """
+    sessions = sessions_from_log(read_turn_log(path))
+    if limit:
+        sessions = OrderedDict(list(sessions.items())[:limit])
+
+    data_dir = os.path.abspath(data_dir)
+    workdir = tempfile.mkdtemp(prefix="turn-replay-")
+    # Data files only: the replay starts with no sessions and no queued jobs
+    shutil.copytree(data_dir, os.path.join(workdir, "data"),
+                    ignore=shutil.ignore_patterns("*.db", "*.db-*", "*.jsonl", ".*"))
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from api_server import ConversationAPI, OrchestratorPool
+        from utils.session_store import SessionStore
+
+        api = ConversationAPI(OrchestratorPool(workers), SessionStore(db_path=os.path.join("data", "replay_sessions.db")))
+        replayed = []
+        # Agent output (email/export notices) is noise here
+        with redirect_stdout(io.StringIO()):
+            for session_id, turns in sessions.items():
+                for turn in turns:
+                    step = (api.get_state(session_id) or {"state": {"current_step": "greeting"}})["state"]["current_step"]
+                    start = time.perf_counter()
+                    result = api.send_message(session_id, turn["message"])
+                    replayed.append({
+                        "session_id": session_id,
+                        "step": step,
+                        "next_step": result["state"]["current_step"],
+                        "recorded_next_step": turn["next_step"],
+                        "duration_ms": (time.perf_counter() - start) * 1000
+                    })
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize or replay a JSONL turn log')
+    parser.add_argument('log', help='Turn log written with TURN_LOG')
+    parser.add_argument('--replay', action='store_true', help='Replay the logged sessions and compare latency')
+    parser.add_argument('--data-dir', default='data', help='Data directory to replay against (copied first)')
+    parser.add_argument('--workers', type=int, default=1, help='Orchestrators in the replay worker pool')
+    parser.add_argument('--sessions', type=int, default=None, help='Replay only the first N sessions')
+    args = parser.parse_args()
+
+    recorded = [record for record in read_turn_log(args.log) if not record.get("duplicate")]
+    if args.sessions:
+        keep = set(list(sessions_from_log(recorded))[:args.sessions])
+        recorded = [record for record in recorded if record["session_id"] in keep]
+    recorded_steps = step_latencies(recorded)
+
+    if not args.replay:
+        print(f"{len(recorded)} turns in {len(sessions_from_log(recorded))} sessions")
+        print(f"{'step':<20} {'turns':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for step, row in recorded_steps.items():
+            print(f"{step:<20} {row['turns']:>7} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['max_ms']:>9.2f}")
+        return
+
+    replayed = replay(args.log, args.data_dir, args.workers, args.sessions)
+    replayed_steps = step_latencies(replayed)
+    diverged = sum(1 for record in replayed if record["next_step"] != record["recorded_next_step"])
+
+    print(f"Replayed {len(replayed)} turns; {diverged} moved to a different step than when logged")
+    print(f"{'step':<20} {'turns':>7} {'logged p50':>11} {'replay p50':>11} {'logged p95':>11} {'replay p95':>11}")
+    for step in sorted(set(recorded_steps) | set(replayed_steps)):
+        logged = recorded_steps.get(step, {"turns": 0, "p50_ms": 0.0, "p95_ms": 0.0})
+        now = replayed_steps.get(step, {"turns": 0, "p50_ms": 0.0, "p95_ms": 0.0})
+        print(f"{step:<20} {now['turns']:>7} {logged['p50_ms']:>11.2f} {now['p50_ms']:>11.2f} "
+              f"{logged['p95_ms']:>11.2f} {now['p95_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()